@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import and_
+from src.models.lead import db, Agent, Lead, Interaction
+from .agent_routing import ACTIVE_LEAD_STATUSES
+
+# Statuses whose follow-ups and priority count towards an agent's workload
+OPEN_LEAD_STATUSES = ('new', 'contacted', 'qualified')
+
+AGENT_COUNTERS = ('total', 'new', 'converted', 'active', 'overdue', 'high_priority',
+                  'interactions', 'outbound', 'response_minutes', 'scheduled_today')
+
+# Seconds /agents/performance results are reused (0 disables the cache)
+AGENT_METRICS_TTL = int(os.environ.get("AGENT_METRICS_TTL", 30))
+
+# Periods whose results are kept; the least recently used is dropped beyond this
+AGENT_METRICS_CACHE_SIZE = 16
+
+def compute_agent_metrics(agents: List[Agent], days: int = 30,
+                          now: Optional[datetime] = None) -> Dict[int, Dict[str, Any]]:
+    """
+    Performance and workload metrics for several agents at once.
+
+    Produces the same figures as the per-agent performance and workload
+    endpoints, but with three grouped queries whatever the number of
+    agents: leads by agent/status/priority, interactions in the period by
+    agent (joined to their leads for response times) and today's open
+    scheduled interactions by agent.
+
+    Returns:
+        Dict[int, Dict[str, Any]]: {"agent", "performance", "workload"} per agent id
+    """
+    now = now or datetime.utcnow()
+    start_date = now - timedelta(days=days)
+    agent_ids = [agent.id for agent in agents]
+    if not agent_ids:
+        return {}
+
+    counts = {
+        agent_id: dict(dict.fromkeys(AGENT_COUNTERS, 0), leads_by_status={})
+        for agent_id in agent_ids
+    }
+
+    lead_groups = db.session.query(
+        Lead.assigned_agent_id,
+        Lead.status,
+        Lead.priority,
+        db.func.count(Lead.id),
+        db.func.sum(db.case((Lead.created_at >= start_date, 1), else_=0)),
+        db.func.sum(db.case((Lead.updated_at >= start_date, 1), else_=0)),
+        db.func.sum(db.case((Lead.next_follow_up_at < now, 1), else_=0))
+    ).filter(
+        Lead.assigned_agent_id.in_(agent_ids)
+    ).group_by(Lead.assigned_agent_id, Lead.status, Lead.priority)
+
+    for agent_id, status, priority, count, new, updated, overdue in lead_groups:
+        agent_counts = counts[agent_id]
+        agent_counts['leads_by_status'][status] = agent_counts['leads_by_status'].get(status, 0) + count
+        agent_counts['total'] += count
+        agent_counts['new'] += new or 0
+        if status == 'converted':
+            agent_counts['converted'] += updated or 0
+        if status in ACTIVE_LEAD_STATUSES:
+            agent_counts['active'] += count
+        if status in OPEN_LEAD_STATUSES:
+            agent_counts['overdue'] += overdue or 0
+            if priority == 'high':
+                agent_counts['high_priority'] += count
+
+    # Response time counts every outbound interaction, but only adds the
+    # minutes of those made after the lead was created
+    outbound = Interaction.direction == 'outbound'
+    interaction_groups = db.session.query(
+        Interaction.agent_id,
+        db.func.count(Interaction.id),
+        db.func.sum(db.case((outbound, 1), else_=0)),
+        db.func.sum(db.case(
+            (and_(outbound, Interaction.created_at > Lead.created_at),
+             (db.func.julianday(Interaction.created_at) - db.func.julianday(Lead.created_at)) * 1440),
+            else_=0
+        ))
+    ).outerjoin(Lead, Interaction.lead_id == Lead.id).filter(
+        Interaction.agent_id.in_(agent_ids),
+        Interaction.created_at >= start_date
+    ).group_by(Interaction.agent_id)
+
+    for agent_id, interactions, outbound_count, response_minutes in interaction_groups:
+        counts[agent_id].update(interactions=interactions, outbound=outbound_count or 0,
+                                response_minutes=response_minutes or 0)
+
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    scheduled_groups = db.session.query(
+        Interaction.agent_id,
+        db.func.count(Interaction.id)
+    ).filter(
+        Interaction.agent_id.in_(agent_ids),
+        Interaction.scheduled_at >= today_start,
+        Interaction.scheduled_at < today_start + timedelta(days=1),
+        Interaction.completed_at.is_(None)
+    ).group_by(Interaction.agent_id)
+
+    for agent_id, scheduled in scheduled_groups:
+        counts[agent_id]['scheduled_today'] = scheduled
+
+    metrics = {}
+    for agent in agents:
+        agent_counts = counts[agent.id]
+        avg_response_time = (agent_counts['response_minutes'] / agent_counts['outbound']
+                             if agent_counts['outbound'] else 0)
+        new_leads = agent_counts['new']
+        conversion_rate = (agent_counts['converted'] / new_leads * 100) if new_leads > 0 else 0
+        capacity_percentage = (agent_counts['active'] / agent.max_leads * 100) if agent.max_leads > 0 else 0
+
+        metrics[agent.id] = {
+            'agent': agent.to_dict(current_leads=agent_counts['total']),
+            'performance': {
+                'period_days': days,
+                'leads_by_status': agent_counts['leads_by_status'],
+                'new_leads': new_leads,
+                'interactions': agent_counts['interactions'],
+                'avg_response_time_minutes': round(avg_response_time, 2),
+                'converted_leads': agent_counts['converted'],
+                'conversion_rate': round(conversion_rate, 2)
+            },
+            'workload': {
+                'active_leads': agent_counts['active'],
+                'max_leads': agent.max_leads,
+                'capacity_percentage': round(capacity_percentage, 2),
+                'overdue_followups': agent_counts['overdue'],
+                'scheduled_today': agent_counts['scheduled_today'],
+                'high_priority_leads': agent_counts['high_priority'],
+                'can_take_more_leads': bool(agent.is_active) and agent_counts['active'] < agent.max_leads
+            }
+        }
+    return metrics
+
+_cache: Dict[int, tuple] = OrderedDict()
+_cache_lock = threading.Lock()
+
+def all_agent_metrics(days: int = 30, use_cache: bool = True) -> List[Dict[str, Any]]:
+    """
+    Metrics for every agent, ordered by agent id.
+
+    Results are reused for AGENT_METRICS_TTL seconds per period, so a
+    dashboard loading every agent at once costs one computation.
+    """
+    if use_cache and AGENT_METRICS_TTL > 0:
+        with _cache_lock:
+            cached = _cache.get(days)
+            if cached is not None and time.monotonic() - cached[0] < AGENT_METRICS_TTL:
+                _cache.move_to_end(days)
+                return cached[1]
+
+    agents = Agent.query.order_by(Agent.id).all()
+    metrics = compute_agent_metrics(agents, days)
+    result = [metrics[agent.id] for agent in agents]
+
+    if AGENT_METRICS_TTL > 0:
+        with _cache_lock:
+            _cache[days] = (time.monotonic(), result)
+            _cache.move_to_end(days)
+            while len(_cache) > AGENT_METRICS_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return result
@@ -0,0 +1,228 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Dict, Optional, FrozenSet, Iterable, List, Tuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from src.models.lead import db, Lead, Agent, AgentListValue
+
+# Lead statuses that count against an agent's max_leads
+ACTIVE_LEAD_STATUSES = ('new', 'contacted', 'qualified', 'viewing_scheduled')
+
+# Seconds before the table is rebuilt from the database, to pick up writes
+# made by other worker processes
+ROUTING_TABLE_TTL = int(os.environ.get("AGENT_ROUTING_TTL", 60))
+
+_NO_VALUE = object()
+
+@dataclass
+class RoutingEntry:
+    """Routing state for one agent, with specializations already parsed."""
+    id: int
+    name: str
+    is_active: bool
+    max_leads: int
+    active_leads: int
+    assigned_leads: int
+    conversion_rate: float
+    areas: FrozenSet[str]
+    types: FrozenSet[str]
+
+    def can_take_lead(self) -> bool:
+        return self.is_active and self.active_leads < self.max_leads
+
+class AgentRoutingTable:
+    """
+    In-memory agent routing table for lead assignment.
+
+    Built with two queries (agents, plus a grouped count of assigned and active
+    leads per agent) and then kept current from ORM flushes: lead inserts,
+    assignment changes and status changes adjust the counters in place, while
+    any agent change or rollback marks the table for a rebuild. Routing a lead
+    is then an in-memory scan over the agents with no queries.
+    """
+
+    def __init__(self, ttl_seconds: int = ROUTING_TABLE_TTL):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Optional[Dict[int, RoutingEntry]] = None
+        self._built_at = 0.0
+        self._lock = threading.RLock()
+
+    def entries(self) -> Dict[int, RoutingEntry]:
+        """Get the routing entries keyed by agent id, rebuilding them if stale."""
+        with self._lock:
+            if self._entries is None or time.monotonic() - self._built_at >= self.ttl_seconds:
+                self._entries = self._build()
+                self._built_at = time.monotonic()
+            return self._entries
+
+    def invalidate(self):
+        """Force a rebuild on next use."""
+        with self._lock:
+            self._entries = None
+
+    def find_best_agent(self, lead) -> Optional[RoutingEntry]:
+        """
+        Pick the best available agent for a lead.
+
+        Scoring matches the original rules: +20 for a preferred area match,
+        +15 for a property type match, up to +10 for a light workload and up to
+        +10 for conversion rate. Ties go to the lowest agent id.
+        """
+        return self._pick(sorted(self.entries().values(), key=lambda entry: entry.id),
+                          lead.preferred_areas, lead.property_type)
+
+    def plan_assignments(self, leads: Iterable[tuple]) -> List[Tuple[int, RoutingEntry]]:
+        """
+        Assign a backlog of leads greedily in memory.
+
+        Leads are taken in the given order and each goes to the best scoring
+        agent with capacity left, exactly as find_best_agent would pick after
+        the previous assignments. Capacities are tracked on copies of the
+        routing entries, so the table itself is untouched until the caller has
+        written the assignments and reports them via apply_lead_change.
+
+        Args:
+            leads: (lead_id, preferred_areas list, property_type, status) tuples
+
+        Returns:
+            List[Tuple[int, RoutingEntry]]: (lead_id, agent) for every lead that found an agent
+        """
+        with self._lock:
+            agents = [replace(entry) for entry in sorted(self.entries().values(), key=lambda entry: entry.id)]
+
+        assignments = []
+        for lead_id, preferred_areas, property_type, status in leads:
+            agent = self._pick(agents, preferred_areas, property_type)
+            if agent is None:
+                continue
+
+            agent.assigned_leads += 1
+            agent.active_leads += int(status in ACTIVE_LEAD_STATUSES)
+            assignments.append((lead_id, agent))
+
+        return assignments
+
+    def _pick(self, agents, lead_areas, property_type) -> Optional[RoutingEntry]:
+        best_agent = None
+        best_score = -1
+        for agent in agents:
+            if not agent.can_take_lead():
+                continue
+
+            score = self.score(agent, lead_areas, property_type)
+            if score > best_score:
+                best_score = score
+                best_agent = agent
+
+        return best_agent
+
+    @staticmethod
+    def score(agent: RoutingEntry, lead_areas, property_type) -> float:
+        """Score an agent for a lead's preferred areas and property type."""
+        score = 0
+
+        # Specialization match
+        if lead_areas and any(area in agent.areas for area in lead_areas):
+            score += 20
+        if property_type and property_type in agent.types:
+            score += 15
+
+        # Workload (prefer agents with fewer current leads)
+        score += max(0, 10 - agent.assigned_leads)
+
+        # Performance (conversion rate)
+        score += agent.conversion_rate * 10
+
+        return score
+
+    def apply_lead_change(self, old_agent_id, old_status, new_agent_id, new_status):
+        """Move one lead between agents and/or statuses in the counters."""
+        with self._lock:
+            if self._entries is None:
+                return
+
+            old_active = old_status in ACTIVE_LEAD_STATUSES
+            new_active = new_status in ACTIVE_LEAD_STATUSES
+
+            old_agent = self._entries.get(old_agent_id)
+            if old_agent is not None:
+                old_agent.assigned_leads -= 1
+                old_agent.active_leads -= int(old_active)
+
+            new_agent = self._entries.get(new_agent_id)
+            if new_agent is not None:
+                new_agent.assigned_leads += 1
+                new_agent.active_leads += int(new_active)
+
+    def _build(self) -> Dict[int, RoutingEntry]:
+        counts = {
+            agent_id: (assigned or 0, active or 0)
+            for agent_id, assigned, active in db.session.query(
+                Lead.assigned_agent_id,
+                db.func.count(Lead.id),
+                db.func.sum(db.case((Lead.status.in_(ACTIVE_LEAD_STATUSES), 1), else_=0))
+            ).filter(Lead.assigned_agent_id.isnot(None)).group_by(Lead.assigned_agent_id)
+        }
+
+        entries = {}
+        for agent in Agent.query.all():
+            assigned, active = counts.get(agent.id, (0, 0))
+            entries[agent.id] = RoutingEntry(
+                id=agent.id,
+                name=agent.name,
+                is_active=bool(agent.is_active),
+                max_leads=agent.max_leads or 0,
+                active_leads=active,
+                assigned_leads=assigned,
+                conversion_rate=agent.converted_leads / agent.total_leads if agent.total_leads else 0,
+                areas=frozenset(agent.specialization_areas),
+                types=frozenset(agent.specialization_types)
+            )
+        return entries
+
+routing_table = AgentRoutingTable()
+
+def _attribute_change(state, attribute):
+    """Return (old, new) for a flushed attribute; either is _NO_VALUE when it was never loaded."""
+    history = state.attrs[attribute].history
+    if history.deleted:
+        return history.deleted[0], history.added[0] if history.added else None
+    if history.added:
+        return _NO_VALUE, history.added[0]
+    if history.unchanged:
+        return history.unchanged[0], history.unchanged[0]
+    return _NO_VALUE, _NO_VALUE
+
+@event.listens_for(Session, 'after_flush')
+def _track_lead_changes(session, flush_context):
+    """Keep the routing table in step with flushed lead and agent changes."""
+    for obj in session.new:
+        if isinstance(obj, Lead):
+            routing_table.apply_lead_change(None, None, obj.assigned_agent_id, obj.status)
+        elif isinstance(obj, (Agent, AgentListValue)):
+            routing_table.invalidate()
+
+    for obj in session.deleted:
+        if isinstance(obj, Lead):
+            routing_table.apply_lead_change(obj.assigned_agent_id, obj.status, None, None)
+        elif isinstance(obj, (Agent, AgentListValue)):
+            routing_table.invalidate()
+
+    for obj in session.dirty:
+        if isinstance(obj, (Agent, AgentListValue)):
+            routing_table.invalidate()
+        elif isinstance(obj, Lead):
+            state = inspect(obj)
+            old_agent_id, new_agent_id = _attribute_change(state, 'assigned_agent_id')
+            old_status, new_status = _attribute_change(state, 'status')
+            if old_agent_id is _NO_VALUE or old_status is _NO_VALUE:
+                routing_table.invalidate()
+            elif (old_agent_id, old_status) != (new_agent_id, new_status):
+                routing_table.apply_lead_change(old_agent_id, old_status, new_agent_id, new_status)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_on_rollback(session, previous_transaction):
+    """Counters may include flushed changes that were rolled back."""
+    routing_table.invalidate()
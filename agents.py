@@ -1,18 +1,32 @@
 from flask import Blueprint, request, jsonify
-from src.models.lead import db, Agent, Lead, Interaction
-from datetime import datetime, timedelta
-import json
+from src.models.lead import (db, Agent, Lead, LeadListValue, Interaction, serialize_agents, serialize_leads,
+                             lead_score_expression, LEAD_LIST_OPTIONS)
+from src.services.agent_metrics import all_agent_metrics, compute_agent_metrics
+from src.services.agent_routing import routing_table
+from src.services.analytics_cache import mark_analytics_changed
+from src.services.analytics_rollups import RollupChanges
+from src.routes.leads import paginate_leads_by_cursor
+from datetime import datetime
 
 agents_bp = Blueprint('agents', __name__)
 
 @agents_bp.route('/agents', methods=['GET'])
 def get_agents():
-    """Get all agents"""
+    """Get all agents, optionally only those covering an area, property type or language"""
     try:
-        agents = Agent.query.all()
+        query = Agent.query
+        
+        if request.args.get('area'):
+            query = query.filter(Agent.specialization_areas.contains(request.args['area']))
+        if request.args.get('property_type'):
+            query = query.filter(Agent.specialization_types.contains(request.args['property_type']))
+        if request.args.get('language'):
+            query = query.filter(Agent.languages.contains(request.args['language']))
+        
+        agents = query.all()
         return jsonify({
             'success': True,
-            'agents': [agent.to_dict() for agent in agents]
+            'agents': serialize_agents(agents)
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -39,13 +53,13 @@ def create_agent():
         agent.max_leads = data.get('max_leads', 50)
         agent.is_active = data.get('is_active', True)
         
-        # Handle JSON fields
+        # Handle list fields
         if data.get('specialization_areas'):
-            agent.specialization_areas = json.dumps(data['specialization_areas'])
+            agent.specialization_areas = data['specialization_areas']
         if data.get('specialization_types'):
-            agent.specialization_types = json.dumps(data['specialization_types'])
+            agent.specialization_types = data['specialization_types']
         if data.get('languages'):
-            agent.languages = json.dumps(data['languages'])
+            agent.languages = data['languages']
         
         db.session.add(agent)
         db.session.commit()
@@ -86,13 +100,13 @@ def update_agent(agent_id):
             if field in data:
                 setattr(agent, field, data[field])
         
-        # Handle JSON fields
+        # Handle list fields
         if 'specialization_areas' in data:
-            agent.specialization_areas = json.dumps(data['specialization_areas'])
+            agent.specialization_areas = data['specialization_areas']
         if 'specialization_types' in data:
-            agent.specialization_types = json.dumps(data['specialization_types'])
+            agent.specialization_types = data['specialization_types']
         if 'languages' in data:
-            agent.languages = json.dumps(data['languages'])
+            agent.languages = data['languages']
         
         agent.updated_at = datetime.utcnow()
         db.session.commit()
@@ -116,13 +130,32 @@ def get_agent_leads(agent_id):
         status = request.args.get('status')
         page = request.args.get('page', 1, type=int)
         per_page = min(request.args.get('per_page', 20, type=int), 100)
+        cursor = request.args.get('cursor')
         
         # Build query
-        query = Lead.query.filter_by(assigned_agent_id=agent_id)
+        query = Lead.query.options(*LEAD_LIST_OPTIONS).filter_by(assigned_agent_id=agent_id)
         
         if status:
             query = query.filter(Lead.status == status)
         
+        # Cursor pagination when a cursor parameter is present (empty for the first page)
+        if cursor is not None:
+            try:
+                leads, pagination = paginate_leads_by_cursor(
+                    query, cursor, per_page,
+                    include_total=request.args.get('include_total', 'false').lower() == 'true',
+                    count_key=('agent_leads', agent_id, status)
+                )
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            return jsonify({
+                'success': True,
+                'agent': agent.to_dict(),
+                'leads': serialize_leads(leads),
+                'pagination': pagination
+            })
+        
         # Order by priority and creation date
         query = query.order_by(
             Lead.priority.desc(),
@@ -139,7 +172,7 @@ def get_agent_leads(agent_id):
         return jsonify({
             'success': True,
             'agent': agent.to_dict(),
-            'leads': [lead.to_dict() for lead in leads.items],
+            'leads': serialize_leads(leads.items),
             'pagination': {
                 'page': page,
                 'per_page': per_page,
@@ -153,6 +186,27 @@ def get_agent_leads(agent_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@agents_bp.route('/agents/performance', methods=['GET'])
+def get_all_agents_performance():
+    """
+    Get performance and workload metrics for every agent.
+    
+    Computed with a fixed number of grouped queries and reused for
+    AGENT_METRICS_TTL seconds; pass fresh=true to bypass the cache.
+    """
+    try:
+        days = request.args.get('days', 30, type=int)
+        fresh = request.args.get('fresh', 'false').lower() == 'true'
+        
+        return jsonify({
+            'success': True,
+            'period_days': days,
+            'agents': all_agent_metrics(days, use_cache=not fresh)
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @agents_bp.route('/agents/<int:agent_id>/performance', methods=['GET'])
 def get_agent_performance(agent_id):
     """Get agent performance metrics"""
@@ -161,68 +215,13 @@ def get_agent_performance(agent_id):
         
         # Get date range
         days = request.args.get('days', 30, type=int)
-        start_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Current leads by status
-        current_leads = db.session.query(
-            Lead.status, 
-            db.func.count(Lead.id)
-        ).filter_by(assigned_agent_id=agent_id).group_by(Lead.status).all()
-        
-        leads_by_status = {status: count for status, count in current_leads}
-        
-        # Leads created in period
-        new_leads = Lead.query.filter(
-            Lead.assigned_agent_id == agent_id,
-            Lead.created_at >= start_date
-        ).count()
-        
-        # Interactions in period
-        interactions = Interaction.query.filter(
-            Interaction.agent_id == agent_id,
-            Interaction.created_at >= start_date
-        ).count()
-        
-        # Response time calculation
-        response_times = db.session.query(
-            Interaction.created_at,
-            Lead.created_at
-        ).join(Lead).filter(
-            Interaction.agent_id == agent_id,
-            Interaction.direction == 'outbound',
-            Interaction.created_at >= start_date
-        ).all()
-        
-        avg_response_time = 0
-        if response_times:
-            total_response_time = sum([
-                (interaction_time - lead_time).total_seconds() / 60
-                for interaction_time, lead_time in response_times
-                if interaction_time > lead_time
-            ])
-            avg_response_time = total_response_time / len(response_times)
-        
-        # Conversion rate
-        converted_leads = Lead.query.filter(
-            Lead.assigned_agent_id == agent_id,
-            Lead.status == 'converted',
-            Lead.updated_at >= start_date
-        ).count()
-        
-        conversion_rate = (converted_leads / new_leads * 100) if new_leads > 0 else 0
+        
+        metrics = compute_agent_metrics([agent], days)[agent.id]
         
         return jsonify({
             'success': True,
-            'agent': agent.to_dict(),
-            'performance': {
-                'period_days': days,
-                'leads_by_status': leads_by_status,
-                'new_leads': new_leads,
-                'interactions': interactions,
-                'avg_response_time_minutes': round(avg_response_time, 2),
-                'converted_leads': converted_leads,
-                'conversion_rate': round(conversion_rate, 2)
-            }
+            'agent': metrics['agent'],
+            'performance': metrics['performance']
         })
         
     except Exception as e:
@@ -234,52 +233,12 @@ def get_agent_workload(agent_id):
     try:
         agent = Agent.query.get_or_404(agent_id)
         
-        # Current active leads
-        active_leads = Lead.query.filter(
-            Lead.assigned_agent_id == agent_id,
-            Lead.status.in_(['new', 'contacted', 'qualified', 'viewing_scheduled'])
-        ).count()
-        
-        # Overdue follow-ups
-        overdue_followups = Lead.query.filter(
-            Lead.assigned_agent_id == agent_id,
-            Lead.next_follow_up_at < datetime.utcnow(),
-            Lead.status.in_(['new', 'contacted', 'qualified'])
-        ).count()
-        
-        # Today's scheduled interactions
-        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_end = today_start + timedelta(days=1)
-        
-        scheduled_today = Interaction.query.filter(
-            Interaction.agent_id == agent_id,
-            Interaction.scheduled_at >= today_start,
-            Interaction.scheduled_at < today_end,
-            Interaction.completed_at.is_(None)
-        ).count()
-        
-        # High priority leads
-        high_priority_leads = Lead.query.filter(
-            Lead.assigned_agent_id == agent_id,
-            Lead.priority == 'high',
-            Lead.status.in_(['new', 'contacted', 'qualified'])
-        ).count()
-        
-        # Workload capacity
-        capacity_percentage = (active_leads / agent.max_leads * 100) if agent.max_leads > 0 else 0
+        metrics = compute_agent_metrics([agent])[agent.id]
         
         return jsonify({
             'success': True,
-            'agent': agent.to_dict(),
-            'workload': {
-                'active_leads': active_leads,
-                'max_leads': agent.max_leads,
-                'capacity_percentage': round(capacity_percentage, 2),
-                'overdue_followups': overdue_followups,
-                'scheduled_today': scheduled_today,
-                'high_priority_leads': high_priority_leads,
-                'can_take_more_leads': agent.can_take_lead()
-            }
+            'agent': metrics['agent'],
+            'workload': metrics['workload']
         })
         
     except Exception as e:
@@ -316,6 +275,7 @@ def assign_lead():
         interaction.is_automated = True
         
         db.session.add(interaction)
+        lead.record_interaction()
         db.session.commit()
         
         return jsonify({
@@ -330,40 +290,103 @@ def assign_lead():
 
 @agents_bp.route('/agents/auto-assign', methods=['POST'])
 def auto_assign_leads():
-    """Auto-assign unassigned leads to available agents"""
+    """
+    Auto-assign unassigned leads to available agents.
+    
+    Agent capacities are loaded once and the whole backlog is assigned in
+    memory, then the leads are updated with one conditional UPDATE per agent
+    and the assignment interactions written with one bulk insert.
+    """
     try:
         # Get unassigned leads
-        unassigned_leads = Lead.query.filter(
+        unassigned = db.session.query(Lead.id).filter(
             Lead.assigned_agent_id.is_(None),
             Lead.status.in_(['new', 'contacted'])
+        )
+        unassigned_leads = db.session.query(
+            Lead.id,
+            Lead.source,
+            Lead.property_type,
+            Lead.status,
+            Lead.score,
+            Lead.created_at
+        ).filter(
+            Lead.id.in_(unassigned)
         ).order_by(Lead.priority.desc(), Lead.created_at.asc()).all()
         
-        assigned_count = 0
+        # Their preferred areas, in one query over the list value rows
+        preferred_areas = {}
+        for lead_id, area in db.session.query(LeadListValue.lead_id, LeadListValue.value).filter(
+            LeadListValue.field == 'preferred_areas',
+            LeadListValue.lead_id.in_(unassigned)
+        ).order_by(LeadListValue.lead_id, LeadListValue.position):
+            preferred_areas.setdefault(lead_id, []).append(area)
+        
+        leads_by_id = {lead.id: lead for lead in unassigned_leads}
+        assignments = routing_table.plan_assignments(
+            (lead.id, preferred_areas.get(lead.id, []), lead.property_type, lead.status)
+            for lead in unassigned_leads
+        )
         
-        for lead in unassigned_leads:
-            # Find best available agent
-            from src.routes.leads import find_best_agent
-            agent = find_best_agent(lead)
-            
-            if agent:
-                lead.assigned_agent_id = agent.id
-                lead.updated_at = datetime.utcnow()
-                
-                # Create interaction record
-                interaction = Interaction()
-                interaction.lead_id = lead.id
-                interaction.type = 'assignment'
-                interaction.channel = 'system'
-                interaction.direction = 'outbound'
-                interaction.message = f"Lead auto-assigned to {agent.name}"
-                interaction.agent_id = agent.id
-                interaction.is_automated = True
-                
-                db.session.add(interaction)
-                assigned_count += 1
+        # Assign per agent, only where the lead is still unassigned: a lead
+        # assigned concurrently since it was read is skipped. The assignment
+        # interaction counts towards each lead's score
+        now = datetime.utcnow()
+        planned = {}
+        for lead_id, agent in assignments:
+            planned.setdefault(agent.id, (agent, []))[1].append(lead_id)
+        
+        interaction_count = db.func.coalesce(Lead.interaction_count, 0) + 1
+        new_scores = {}
+        for agent, lead_ids in planned.values():
+            new_scores.update(db.session.execute(
+                db.update(Lead)
+                .where(Lead.id.in_(lead_ids), Lead.assigned_agent_id.is_(None))
+                .values(
+                    assigned_agent_id=agent.id,
+                    updated_at=now,
+                    interaction_count=interaction_count,
+                    score=lead_score_expression(interaction_count, Lead.recency_score)
+                )
+                .returning(Lead.id, Lead.score)
+                .execution_options(synchronize_session=False)
+            ).all())
+        assignments = [(lead_id, agent) for lead_id, agent in assignments if lead_id in new_scores]
+        
+        # Create interaction records
+        db.session.bulk_insert_mappings(Interaction, [
+            {
+                'lead_id': lead_id,
+                'type': 'assignment',
+                'channel': 'system',
+                'direction': 'outbound',
+                'message': f"Lead auto-assigned to {agent.name}",
+                'agent_id': agent.id,
+                'is_automated': True,
+                'created_at': now
+            }
+            for lead_id, agent in assignments
+        ])
+        
+        # Bulk writes bypass the rollup flush hooks too
+        rollups = RollupChanges()
+        for lead_id, agent in assignments:
+            lead = leads_by_id[lead_id]
+            rollups.lead_moved((lead.source, None, lead.status), (lead.source, agent.id, lead.status),
+                               lead.score, new_scores[lead_id])
+            rollups.interaction_created(agent.id, 'outbound', now, lead.created_at)
+        rollups.write()
+        mark_analytics_changed(db.session)
         
         db.session.commit()
         
+        # Bulk writes bypass the flush hooks, so report the assignments directly
+        for lead_id, agent in assignments:
+            status = leads_by_id[lead_id].status
+            routing_table.apply_lead_change(None, status, agent.id, status)
+        
+        assigned_count = len(assignments)
+        
         return jsonify({
             'success': True,
             'assigned_count': assigned_count,
@@ -373,4 +396,3 @@ def auto_assign_leads():
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
-
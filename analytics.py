@@ -1,53 +1,132 @@
-from flask import Blueprint, request, jsonify
-from src.models.lead import db, Lead, Agent, Interaction, Property
+from flask import Blueprint, Response, g, request, jsonify, stream_with_context
+from src.models.lead import (db, Lead, Agent, Interaction, Property, DailyLeadRollup, DailyInteractionRollup,
+                             LeadCountRollup, serialize_leads, serialize_agents, serialize_interactions,
+                             LEAD_LIST_OPTIONS, INTERACTION_LIST_OPTIONS)
 from datetime import datetime, timedelta
-from sqlalchemy import func, and_, or_
+from src.services.analytics_cache import analytics_cache
+from src.services.analytics_export import EXPORT_FORMATS, stream_export
+from sqlalchemy import func, and_
 import json
+import time
 
 analytics_bp = Blueprint('analytics', __name__)
 
+# Funnel stages after "total_leads": (count key, statuses at or past the stage, rate key)
+FUNNEL_STAGES = [
+    ('contacted_leads', ['contacted', 'qualified', 'viewing_scheduled', 'applied', 'converted'], 'contact_rate'),
+    ('qualified_leads', ['qualified', 'viewing_scheduled', 'applied', 'converted'], 'qualification_rate'),
+    ('viewing_leads', ['viewing_scheduled', 'applied', 'converted'], 'viewing_rate'),
+    ('applied_leads', ['applied', 'converted'], 'application_rate'),
+    ('converted_leads', ['converted'], 'conversion_rate')
+]
+
+# Lead score bands: (min score, max score, label)
+SCORE_RANGES = [
+    (0, 20, 'Very Low'),
+    (21, 40, 'Low'),
+    (41, 60, 'Medium'),
+    (61, 80, 'High'),
+    (81, 100, 'Very High')
+]
+
+# Most properties /analytics/property-performance returns
+MAX_PROPERTY_PERFORMANCE_LIMIT = 100
+
+# Endpoints answered without the response cache
+UNCACHED_ENDPOINTS = {'analytics.get_analytics_cache_stats', 'analytics.export_analytics_data'}
+
+@analytics_bp.before_request
+def serve_cached_response():
+    """Answer GETs from the response cache, or with 304 when the client's ETag is current"""
+    if request.method != 'GET' or request.endpoint in UNCACHED_ENDPOINTS:
+        return None
+    
+    key = request.path + '?' + '&'.join(f'{name}={value}' for name, value in sorted(request.args.items(multi=True)))
+    entry = analytics_cache.get(key)
+    if entry is None:
+        # Remember the version the response is computed from
+        g.analytics_cache = (key, analytics_cache.version, time.perf_counter())
+        return None
+    
+    response = Response(entry['body'], mimetype='application/json')
+    return _conditional(response, entry['etag'])
+
+@analytics_bp.after_request
+def store_cached_response(response):
+    """Cache successful responses computed in this request and tag them with an ETag"""
+    pending = g.pop('analytics_cache', None)
+    if pending is None or response.status_code != 200 or response.is_streamed:
+        return response
+    
+    key, version, started = pending
+    etag = analytics_cache.put(key, version, response.get_data(), time.perf_counter() - started)
+    return _conditional(response, etag)
+
+def _conditional(response, etag):
+    response.set_etag(etag)
+    response.make_conditional(request)
+    if response.status_code == 304:
+        analytics_cache.count_not_modified()
+    return response
+
+@analytics_bp.route('/analytics/cache/stats', methods=['GET'])
+def get_analytics_cache_stats():
+    """Get the analytics response cache hit rate and per-endpoint compute times"""
+    try:
+        return jsonify({
+            'success': True,
+            'cache': analytics_cache.stats()
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @analytics_bp.route('/analytics/dashboard', methods=['GET'])
 def get_dashboard_metrics():
-    """Get key metrics for dashboard"""
+    """
+    Get key metrics for dashboard.
+    
+    Read from the rollup tables rather than the leads and interactions
+    tables: current counts from the running lead counts, window totals from
+    the daily rollups (the window covers whole UTC days).
+    """
     try:
         # Get date range
         days = request.args.get('days', 30, type=int)
-        start_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Total leads
-        total_leads = Lead.query.count()
-        new_leads = Lead.query.filter(Lead.created_at >= start_date).count()
-        
-        # Leads by status
-        leads_by_status = db.session.query(
-            Lead.status, 
-            func.count(Lead.id)
-        ).group_by(Lead.status).all()
-        
-        status_counts = {status: count for status, count in leads_by_status}
-        
-        # Leads by source
-        leads_by_source = db.session.query(
-            Lead.source, 
-            func.count(Lead.id)
-        ).group_by(Lead.source).all()
-        
-        source_counts = {source: count for source, count in leads_by_source}
-        
-        # Conversion metrics
-        converted_leads = Lead.query.filter(
-            Lead.status == 'converted',
-            Lead.updated_at >= start_date
-        ).count()
+        start_day = (datetime.utcnow() - timedelta(days=days)).date()
+        
+        # Current leads by status and source
+        lead_counts = db.session.query(
+            LeadCountRollup.status,
+            LeadCountRollup.source,
+            func.sum(LeadCountRollup.leads)
+        ).group_by(LeadCountRollup.status, LeadCountRollup.source).all()
+        
+        total_leads = 0
+        status_counts = {}
+        source_counts = {}
+        for status, source, count in lead_counts:
+            total_leads += count or 0
+            if count:
+                status_counts[status or None] = status_counts.get(status or None, 0) + count
+                source_counts[source or None] = source_counts.get(source or None, 0) + count
+        
+        # The window's new leads and conversions
+        new_leads, converted_leads = db.session.query(
+            func.sum(DailyLeadRollup.created),
+            func.sum(db.case((DailyLeadRollup.status == 'converted', DailyLeadRollup.status_entered), else_=0))
+        ).filter(DailyLeadRollup.day >= start_day).one()
+        new_leads = new_leads or 0
+        converted_leads = converted_leads or 0
         
         conversion_rate = (converted_leads / new_leads * 100) if new_leads > 0 else 0
         
         # Agent performance
         agent_performance = db.session.query(
             Agent.name,
-            func.count(Lead.id).label('total_leads'),
-            func.sum(func.case([(Lead.status == 'converted', 1)], else_=0)).label('converted')
-        ).outerjoin(Lead).group_by(Agent.id, Agent.name).all()
+            func.sum(LeadCountRollup.leads).label('total_leads'),
+            func.sum(db.case((LeadCountRollup.status == 'converted', LeadCountRollup.leads),
+                             else_=0)).label('converted')
+        ).outerjoin(LeadCountRollup, LeadCountRollup.agent_id == Agent.id).group_by(Agent.id, Agent.name).all()
         
         agents_data = []
         for name, total, converted in agent_performance:
@@ -58,22 +137,15 @@ def get_dashboard_metrics():
                 'conversion_rate': (converted / total * 100) if total and total > 0 else 0
             })
         
-        # Recent activity
-        recent_interactions = Interaction.query.filter(
-            Interaction.created_at >= start_date
-        ).count()
+        # Recent activity and response time
+        recent_interactions, outbound, response_days = db.session.query(
+            func.sum(DailyInteractionRollup.interactions),
+            func.sum(db.case((DailyInteractionRollup.direction == 'outbound', DailyInteractionRollup.interactions),
+                             else_=0)),
+            func.sum(DailyInteractionRollup.response_days)
+        ).filter(DailyInteractionRollup.day >= start_day).one()
         
-        # Response time
-        response_times = db.session.query(
-            func.avg(
-                func.julianday(Interaction.created_at) - func.julianday(Lead.created_at)
-            ).label('avg_response_days')
-        ).join(Lead).filter(
-            Interaction.direction == 'outbound',
-            Interaction.created_at >= start_date
-        ).first()
-        
-        avg_response_hours = (response_times[0] * 24) if response_times[0] else 0
+        avg_response_hours = (response_days / outbound * 24) if outbound else 0
         
         return jsonify({
             'success': True,
@@ -83,7 +155,7 @@ def get_dashboard_metrics():
                 'new_leads': new_leads,
                 'converted_leads': converted_leads,
                 'conversion_rate': round(conversion_rate, 2),
-                'recent_interactions': recent_interactions,
+                'recent_interactions': recent_interactions or 0,
                 'avg_response_hours': round(avg_response_hours, 2),
                 'leads_by_status': status_counts,
                 'leads_by_source': source_counts,
@@ -96,31 +168,24 @@ def get_dashboard_metrics():
 
 @analytics_bp.route('/analytics/leads-trend', methods=['GET'])
 def get_leads_trend():
-    """Get leads trend over time"""
+    """Get leads trend over time, by UTC day from the daily rollups"""
     try:
         days = request.args.get('days', 30, type=int)
-        start_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Daily lead creation
-        daily_leads = db.session.query(
-            func.date(Lead.created_at).label('date'),
-            func.count(Lead.id).label('count')
-        ).filter(
-            Lead.created_at >= start_date
-        ).group_by(func.date(Lead.created_at)).order_by('date').all()
+        start_day = (datetime.utcnow() - timedelta(days=days)).date()
         
-        # Daily conversions
-        daily_conversions = db.session.query(
-            func.date(Lead.updated_at).label('date'),
-            func.count(Lead.id).label('count')
+        # Daily lead creation and conversions
+        daily_rollups = db.session.query(
+            DailyLeadRollup.day,
+            func.sum(DailyLeadRollup.created),
+            func.sum(db.case((DailyLeadRollup.status == 'converted', DailyLeadRollup.status_entered), else_=0))
         ).filter(
-            Lead.status == 'converted',
-            Lead.updated_at >= start_date
-        ).group_by(func.date(Lead.updated_at)).order_by('date').all()
+            DailyLeadRollup.day >= start_day
+        ).group_by(DailyLeadRollup.day).order_by(DailyLeadRollup.day).all()
         
         # Format data
-        leads_data = [{'date': str(date), 'leads': count} for date, count in daily_leads]
-        conversions_data = [{'date': str(date), 'conversions': count} for date, count in daily_conversions]
+        leads_data = [{'date': str(day), 'leads': leads} for day, leads, _ in daily_rollups if leads]
+        conversions_data = [{'date': str(day), 'conversions': conversions}
+                            for day, _, conversions in daily_rollups if conversions]
         
         return jsonify({
             'success': True,
@@ -135,30 +200,46 @@ def get_leads_trend():
 
 @analytics_bp.route('/analytics/source-performance', methods=['GET'])
 def get_source_performance():
-    """Get performance metrics by lead source"""
+    """
+    Get performance metrics by lead source.
+    
+    Leads created and conversions made in the window, from the daily rollups
+    (priorities are as of lead creation). avg_score is the current average
+    score of all of the source's leads, from the running lead counts.
+    """
     try:
         days = request.args.get('days', 30, type=int)
-        start_date = datetime.utcnow() - timedelta(days=days)
+        start_day = (datetime.utcnow() - timedelta(days=days)).date()
         
         # Source performance
         source_performance = db.session.query(
-            Lead.source,
-            func.count(Lead.id).label('total_leads'),
-            func.sum(func.case([(Lead.status == 'converted', 1)], else_=0)).label('converted'),
-            func.avg(Lead.score).label('avg_score'),
-            func.sum(func.case([(Lead.priority == 'high', 1)], else_=0)).label('high_priority')
+            DailyLeadRollup.source,
+            func.sum(DailyLeadRollup.created).label('total_leads'),
+            func.sum(db.case((DailyLeadRollup.status == 'converted', DailyLeadRollup.status_entered),
+                             else_=0)).label('converted'),
+            func.sum(DailyLeadRollup.high_priority).label('high_priority')
         ).filter(
-            Lead.created_at >= start_date
-        ).group_by(Lead.source).all()
+            DailyLeadRollup.day >= start_day
+        ).group_by(DailyLeadRollup.source).having(func.sum(DailyLeadRollup.created) > 0).all()
+        
+        # Current scores per source
+        source_scores = {
+            source: (score_total or 0) / leads if leads else 0
+            for source, leads, score_total in db.session.query(
+                LeadCountRollup.source,
+                func.sum(LeadCountRollup.leads),
+                func.sum(LeadCountRollup.score_total)
+            ).group_by(LeadCountRollup.source)
+        }
         
         source_data = []
-        for source, total, converted, avg_score, high_priority in source_performance:
+        for source, total, converted, high_priority in source_performance:
             source_data.append({
-                'source': source,
+                'source': source or None,
                 'total_leads': total,
                 'converted_leads': converted or 0,
                 'conversion_rate': (converted / total * 100) if total > 0 else 0,
-                'avg_score': round(avg_score or 0, 2),
+                'avg_score': round(source_scores.get(source, 0), 2),
                 'high_priority_leads': high_priority or 0
             })
         
@@ -177,36 +258,67 @@ def get_agent_comparison():
         days = request.args.get('days', 30, type=int)
         start_date = datetime.utcnow() - timedelta(days=days)
         
-        # Agent metrics
-        agent_metrics = db.session.query(
-            Agent.id,
-            Agent.name,
+        # Pre-aggregate each metric per agent before joining, so a lead's
+        # interactions cannot multiply its lead and conversion counts
+        window_leads = Lead.created_at >= start_date
+        lead_stats = db.session.query(
+            Lead.assigned_agent_id.label('agent_id'),
             func.count(Lead.id).label('total_leads'),
-            func.sum(func.case([(Lead.status == 'converted', 1)], else_=0)).label('converted'),
-            func.avg(Lead.score).label('avg_lead_score'),
+            func.sum(db.case((Lead.status == 'converted', 1), else_=0)).label('converted'),
+            func.avg(Lead.score).label('avg_lead_score')
+        ).filter(window_leads, Lead.assigned_agent_id.isnot(None)).group_by(Lead.assigned_agent_id).cte('lead_stats')
+        
+        interaction_stats = db.session.query(
+            Interaction.agent_id.label('agent_id'),
             func.count(Interaction.id).label('total_interactions')
-        ).outerjoin(Lead).outerjoin(Interaction, and_(
+        ).join(Lead, and_(
             Interaction.lead_id == Lead.id,
-            Interaction.agent_id == Agent.id
-        )).filter(
-            or_(Lead.created_at >= start_date, Lead.created_at.is_(None))
-        ).group_by(Agent.id, Agent.name).all()
+            Interaction.agent_id == Lead.assigned_agent_id
+        )).filter(window_leads).group_by(Interaction.agent_id).cte('interaction_stats')
+        
+        response_stats = db.session.query(
+            Interaction.agent_id.label('agent_id'),
+            func.avg(
+                func.julianday(Interaction.created_at) - func.julianday(Lead.created_at)
+            ).label('avg_response_days')
+        ).join(Lead, Interaction.lead_id == Lead.id).filter(
+            Interaction.direction == 'outbound',
+            Interaction.created_at >= start_date
+        ).group_by(Interaction.agent_id).cte('response_stats')
+        
+        # Time from each lead's creation to its first outbound interaction,
+        # averaged over the agent's leads from the window. Automated
+        # interactions (e.g. the assignment notice) are not responses
+        first_response_at = db.session.query(func.min(Interaction.created_at)).filter(
+            Interaction.lead_id == Lead.id,
+            Interaction.direction == 'outbound',
+            Interaction.is_automated.isnot(True)
+        ).correlate(Lead).scalar_subquery()
+        first_response_stats = db.session.query(
+            Lead.assigned_agent_id.label('agent_id'),
+            func.avg(
+                func.julianday(first_response_at) - func.julianday(Lead.created_at)
+            ).label('avg_first_response_days')
+        ).filter(window_leads, Lead.assigned_agent_id.isnot(None)).group_by(Lead.assigned_agent_id).cte('first_response_stats')
+        
+        agent_metrics = db.session.query(
+            Agent.id,
+            Agent.name,
+            lead_stats.c.total_leads,
+            lead_stats.c.converted,
+            lead_stats.c.avg_lead_score,
+            interaction_stats.c.total_interactions,
+            response_stats.c.avg_response_days,
+            first_response_stats.c.avg_first_response_days
+        ).outerjoin(lead_stats, lead_stats.c.agent_id == Agent.id
+        ).outerjoin(interaction_stats, interaction_stats.c.agent_id == Agent.id
+        ).outerjoin(response_stats, response_stats.c.agent_id == Agent.id
+        ).outerjoin(first_response_stats, first_response_stats.c.agent_id == Agent.id
+        ).order_by(Agent.id).all()
         
         agent_data = []
-        for agent_id, name, total, converted, avg_score, interactions in agent_metrics:
-            # Calculate response time for this agent
-            response_times = db.session.query(
-                func.avg(
-                    func.julianday(Interaction.created_at) - func.julianday(Lead.created_at)
-                ).label('avg_response_days')
-            ).join(Lead).filter(
-                Interaction.agent_id == agent_id,
-                Interaction.direction == 'outbound',
-                Interaction.created_at >= start_date
-            ).first()
-            
-            avg_response_hours = (response_times[0] * 24) if response_times[0] else 0
-            
+        for (agent_id, name, total, converted, avg_score, interactions,
+             response_days, first_response_days) in agent_metrics:
             agent_data.append({
                 'agent_id': agent_id,
                 'name': name,
@@ -215,7 +327,8 @@ def get_agent_comparison():
                 'conversion_rate': (converted / total * 100) if total and total > 0 else 0,
                 'avg_lead_score': round(avg_score or 0, 2),
                 'total_interactions': interactions or 0,
-                'avg_response_hours': round(avg_response_hours, 2)
+                'avg_response_hours': round((response_days or 0) * 24, 2),
+                'avg_first_response_hours': round((first_response_days or 0) * 24, 2)
             })
         
         return jsonify({
@@ -228,32 +341,48 @@ def get_agent_comparison():
 
 @analytics_bp.route('/analytics/property-performance', methods=['GET'])
 def get_property_performance():
-    """Get property listing performance metrics"""
+    """
+    Get property listing performance metrics for the top properties by
+    inquiries (limit, default 20, at most MAX_PROPERTY_PERFORMANCE_LIMIT).
+    
+    Two queries at any limit: the grouped inquiry counts, then one IN lookup
+    for the details of the listed properties.
+    """
     try:
         days = request.args.get('days', 30, type=int)
+        limit = max(min(request.args.get('limit', 20, type=int), MAX_PROPERTY_PERFORMANCE_LIMIT), 1)
         start_date = datetime.utcnow() - timedelta(days=days)
         
         # Property inquiry metrics
         property_inquiries = db.session.query(
             Lead.source_property_id,
             func.count(Lead.id).label('inquiries'),
-            func.sum(func.case([(Lead.status == 'converted', 1)], else_=0)).label('conversions'),
+            func.sum(db.case((Lead.status == 'converted', 1), else_=0)).label('conversions'),
             func.avg(Lead.score).label('avg_lead_quality')
         ).filter(
             Lead.source_property_id.isnot(None),
             Lead.created_at >= start_date
-        ).group_by(Lead.source_property_id).order_by(func.count(Lead.id).desc()).limit(20).all()
+        ).group_by(Lead.source_property_id).order_by(
+            func.count(Lead.id).desc(), Lead.source_property_id
+        ).limit(limit).all()
+        
+        # Get property details if available (the lowest id wins, as with .first())
+        properties = {}
+        property_ids = [prop_id for prop_id, _, _, _ in property_inquiries]
+        if property_ids:
+            for source_id, title, price, area in db.session.query(
+                Property.source_id, Property.title, Property.price, Property.area
+            ).filter(Property.source_id.in_(property_ids)).order_by(Property.id):
+                properties.setdefault(source_id, (title, price, area))
         
         property_data = []
         for prop_id, inquiries, conversions, avg_quality in property_inquiries:
-            # Get property details if available
-            property_info = Property.query.filter_by(source_id=prop_id).first()
-            
+            title, price, area = properties.get(prop_id, (f'Property {prop_id}', None, None))
             property_data.append({
                 'property_id': prop_id,
-                'title': property_info.title if property_info else f'Property {prop_id}',
-                'price': property_info.price if property_info else None,
-                'area': property_info.area if property_info else None,
+                'title': title,
+                'price': price,
+                'area': area,
                 'inquiries': inquiries,
                 'conversions': conversions or 0,
                 'conversion_rate': (conversions / inquiries * 100) if inquiries > 0 else 0,
@@ -275,56 +404,22 @@ def get_conversion_funnel():
         days = request.args.get('days', 30, type=int)
         start_date = datetime.utcnow() - timedelta(days=days)
         
-        # Funnel stages
-        funnel_data = {}
-        
-        # Stage 1: Total leads
-        total_leads = Lead.query.filter(Lead.created_at >= start_date).count()
-        funnel_data['total_leads'] = total_leads
-        
-        # Stage 2: Contacted leads
-        contacted_leads = Lead.query.filter(
-            Lead.created_at >= start_date,
-            Lead.status.in_(['contacted', 'qualified', 'viewing_scheduled', 'applied', 'converted'])
-        ).count()
-        funnel_data['contacted_leads'] = contacted_leads
-        
-        # Stage 3: Qualified leads
-        qualified_leads = Lead.query.filter(
-            Lead.created_at >= start_date,
-            Lead.status.in_(['qualified', 'viewing_scheduled', 'applied', 'converted'])
-        ).count()
-        funnel_data['qualified_leads'] = qualified_leads
-        
-        # Stage 4: Viewing scheduled
-        viewing_leads = Lead.query.filter(
-            Lead.created_at >= start_date,
-            Lead.status.in_(['viewing_scheduled', 'applied', 'converted'])
-        ).count()
-        funnel_data['viewing_leads'] = viewing_leads
-        
-        # Stage 5: Applied
-        applied_leads = Lead.query.filter(
-            Lead.created_at >= start_date,
-            Lead.status.in_(['applied', 'converted'])
-        ).count()
-        funnel_data['applied_leads'] = applied_leads
-        
-        # Stage 6: Converted
-        converted_leads = Lead.query.filter(
-            Lead.created_at >= start_date,
-            Lead.status == 'converted'
-        ).count()
-        funnel_data['converted_leads'] = converted_leads
+        # Count every funnel stage in one pass over the window
+        stage_counts = db.session.query(
+            func.count(Lead.id),
+            *[func.sum(db.case((Lead.status.in_(statuses), 1), else_=0)) for _, statuses, _ in FUNNEL_STAGES]
+        ).filter(Lead.created_at >= start_date).one()
+        
+        total_leads = stage_counts[0]
+        funnel_data = {'total_leads': total_leads}
+        for (stage, _, _), count in zip(FUNNEL_STAGES, stage_counts[1:]):
+            funnel_data[stage] = count or 0
         
         # Calculate conversion rates
         funnel_rates = {}
         if total_leads > 0:
-            funnel_rates['contact_rate'] = contacted_leads / total_leads * 100
-            funnel_rates['qualification_rate'] = qualified_leads / total_leads * 100
-            funnel_rates['viewing_rate'] = viewing_leads / total_leads * 100
-            funnel_rates['application_rate'] = applied_leads / total_leads * 100
-            funnel_rates['conversion_rate'] = converted_leads / total_leads * 100
+            for stage, _, rate in FUNNEL_STAGES:
+                funnel_rates[rate] = funnel_data[stage] / total_leads * 100
         
         return jsonify({
             'success': True,
@@ -341,28 +436,38 @@ def get_conversion_funnel():
 def get_lead_scoring_analysis():
     """Get lead scoring distribution and effectiveness"""
     try:
-        # Score distribution
-        score_ranges = [
-            (0, 20, 'Very Low'),
-            (21, 40, 'Low'),
-            (41, 60, 'Medium'),
-            (61, 80, 'High'),
-            (81, 100, 'Very High')
-        ]
+        # Bucket leads by score range and status in one grouped query
+        score_band = db.case(
+            *[((Lead.score >= min_score) & (Lead.score <= max_score), label)
+              for min_score, max_score, label in SCORE_RANGES],
+            else_=None
+        ).label('band')
+        groups = db.session.query(
+            score_band,
+            Lead.status,
+            func.count(Lead.id),
+            func.count(Lead.score),
+            func.sum(Lead.score)
+        ).group_by(score_band, Lead.status).all()
+        
+        band_counts = {}
+        band_converted = {}
+        status_totals = {}
+        for band, status, count, scored, score_sum in groups:
+            if band is not None:
+                band_counts[band] = band_counts.get(band, 0) + count
+                if status == 'converted':
+                    band_converted[band] = band_converted.get(band, 0) + count
+            totals = status_totals.setdefault(status, [0, 0, 0])
+            totals[0] += count
+            totals[1] += scored
+            totals[2] += score_sum or 0
         
+        # Score distribution
         score_distribution = []
-        for min_score, max_score, label in score_ranges:
-            count = Lead.query.filter(
-                Lead.score >= min_score,
-                Lead.score <= max_score
-            ).count()
-            
-            converted = Lead.query.filter(
-                Lead.score >= min_score,
-                Lead.score <= max_score,
-                Lead.status == 'converted'
-            ).count()
-            
+        for min_score, max_score, label in SCORE_RANGES:
+            count = band_counts.get(label, 0)
+            converted = band_converted.get(label, 0)
             score_distribution.append({
                 'range': f'{min_score}-{max_score}',
                 'label': label,
@@ -372,19 +477,13 @@ def get_lead_scoring_analysis():
             })
         
         # Score vs conversion correlation
-        avg_score_by_status = db.session.query(
-            Lead.status,
-            func.avg(Lead.score).label('avg_score'),
-            func.count(Lead.id).label('count')
-        ).group_by(Lead.status).all()
-        
         status_scores = [
             {
                 'status': status,
-                'avg_score': round(avg_score or 0, 2),
+                'avg_score': round(score_sum / scored if scored else 0, 2),
                 'count': count
             }
-            for status, avg_score, count in avg_score_by_status
+            for status, (count, scored, score_sum) in sorted(status_totals.items(), key=lambda item: item[0] or '')
         ]
         
         return jsonify({
@@ -400,24 +499,45 @@ def get_lead_scoring_analysis():
 
 @analytics_bp.route('/analytics/export', methods=['GET'])
 def export_analytics_data():
-    """Export analytics data for external analysis"""
+    """
+    Export analytics data for external analysis.
+    
+    By default leads, interactions and agents are returned in one JSON
+    document. With format=csv, ndjson, parquet or arrow (Arrow IPC stream),
+    one dataset (leads, interactions or agents; default leads) is streamed
+    in fixed-size batches instead, so large windows use constant memory.
+    Parquet and Arrow need pyarrow installed.
+    """
     try:
         days = request.args.get('days', 30, type=int)
         start_date = datetime.utcnow() - timedelta(days=days)
         
+        file_format = request.args.get('format', 'json')
+        if file_format != 'json':
+            dataset = request.args.get('dataset', 'leads')
+            try:
+                chunks = stream_export(dataset, file_format, start_date)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            mimetype, extension, _ = EXPORT_FORMATS[file_format]
+            return Response(stream_with_context(chunks), mimetype=mimetype, headers={
+                'Content-Disposition': f'attachment; filename={dataset}-{days}d.{extension}'
+            })
+        
         # Export lead data
-        leads = Lead.query.filter(Lead.created_at >= start_date).all()
-        leads_data = [lead.to_dict() for lead in leads]
+        leads = Lead.query.options(*LEAD_LIST_OPTIONS).filter(Lead.created_at >= start_date).all()
+        leads_data = serialize_leads(leads)
         
         # Export interaction data
-        interactions = Interaction.query.filter(
+        interactions = Interaction.query.options(*INTERACTION_LIST_OPTIONS).filter(
             Interaction.created_at >= start_date
         ).all()
-        interactions_data = [interaction.to_dict() for interaction in interactions]
+        interactions_data = serialize_interactions(interactions)
         
         # Export agent data
         agents = Agent.query.all()
-        agents_data = [agent.to_dict() for agent in agents]
+        agents_data = serialize_agents(agents)
         
         return jsonify({
             'success': True,
@@ -0,0 +1,161 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from src.models.lead import Lead, LeadListValue, Interaction, Agent, AgentListValue, Property
+
+# Seconds a cached response is served, to pick up writes made by other
+# worker processes (writes in this process invalidate it immediately)
+ANALYTICS_CACHE_TTL = int(os.environ.get("ANALYTICS_CACHE_TTL", 60))
+
+# Models the analytics endpoints read; writing any of them invalidates the cache
+ANALYTICS_MODELS = (Lead, LeadListValue, Interaction, Agent, AgentListValue, Property)
+
+# Responses kept; the least recently used is dropped beyond this
+ANALYTICS_CACHE_SIZE = int(os.environ.get("ANALYTICS_CACHE_SIZE", 256))
+
+class ResponseCache:
+    """
+    Versioned cache of serialized analytics responses.
+
+    Every entry is stored with the data version current when its
+    computation started. Commits touching ANALYTICS_MODELS bump the version, so
+    an entry computed before a write is never served after it, even if the
+    computation finished later. Entries carry a content ETag so clients can
+    revalidate with If-None-Match.
+    """
+
+    def __init__(self, ttl_seconds: int = ANALYTICS_CACHE_TTL, max_entries: int = ANALYTICS_CACHE_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._version = 0
+        self._entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        # Per-key hits and compute times, kept across invalidations
+        self._key_stats: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            'hits': 0,
+            'misses': 0,
+            'not_modified': 0,
+            'invalidations': 0
+        }
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def bump(self):
+        """Invalidate every entry by moving to a new data version."""
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            self._counters['invalidations'] += 1
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the current entry for a key ({"body", "etag", ...}), or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            key_stats = self._stats_for(key)
+            if (entry is None or entry['version'] != self._version
+                    or time.monotonic() - entry['stored_at'] >= self.ttl_seconds):
+                self._counters['misses'] += 1
+                key_stats['misses'] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            key_stats['hits'] += 1
+            return entry
+
+    def put(self, key: str, version: int, body: bytes, compute_seconds: float) -> str:
+        """
+        Store a response computed at the given data version.
+
+        Returns:
+            str: The response's ETag
+        """
+        etag = hashlib.sha1(body).hexdigest()
+        with self._lock:
+            key_stats = self._stats_for(key)
+            key_stats['computes'] += 1
+            key_stats['compute_seconds'] += compute_seconds
+            key_stats['last_compute_seconds'] = compute_seconds
+            if version == self._version:
+                self._entries[key] = {
+                    'version': version,
+                    'body': body,
+                    'etag': etag,
+                    'stored_at': time.monotonic()
+                }
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return etag
+
+    def _stats_for(self, key: str) -> Dict[str, Any]:
+        """Per-key counters, creating them if needed. Caller must hold the lock."""
+        key_stats = self._key_stats.get(key)
+        if key_stats is None:
+            key_stats = self._key_stats[key] = {
+                'hits': 0, 'misses': 0, 'computes': 0, 'compute_seconds': 0.0, 'last_compute_seconds': 0.0
+            }
+            while len(self._key_stats) > self.max_entries:
+                self._key_stats.popitem(last=False)
+        self._key_stats.move_to_end(key)
+        return key_stats
+
+    def count_not_modified(self):
+        with self._lock:
+            self._counters['not_modified'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters overall and per key, with each key's compute times."""
+        now = time.monotonic()
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return {
+                **self._counters,
+                'hit_rate': self._counters['hits'] / lookups if lookups > 0 else 0,
+                'version': self._version,
+                'ttl_seconds': self.ttl_seconds,
+                'keys': {
+                    key: {
+                        'hits': key_stats['hits'],
+                        'misses': key_stats['misses'],
+                        'hit_rate': key_stats['hits'] / (key_stats['hits'] + key_stats['misses'])
+                                    if key_stats['hits'] + key_stats['misses'] > 0 else 0,
+                        'computes': key_stats['computes'],
+                        'avg_compute_ms': round(key_stats['compute_seconds'] / key_stats['computes'] * 1000, 2)
+                                          if key_stats['computes'] else None,
+                        'last_compute_ms': round(key_stats['last_compute_seconds'] * 1000, 2),
+                        'cached_age_seconds': round(now - self._entries[key]['stored_at'], 2)
+                                              if key in self._entries else None,
+                        'cached_size': len(self._entries[key]['body']) if key in self._entries else None
+                    }
+                    for key, key_stats in self._key_stats.items()
+                }
+            }
+
+analytics_cache = ResponseCache()
+
+def mark_analytics_changed(session):
+    """Invalidate the analytics cache once the session commits (for bulk writes, which skip the flush hook)"""
+    session.info['analytics_changed'] = True
+
+@event.listens_for(Session, 'after_flush')
+def _note_analytics_changes(session, flush_context):
+    """Flag sessions that wrote any model the analytics endpoints read."""
+    for objects in (session.new, session.dirty, session.deleted):
+        if any(isinstance(obj, ANALYTICS_MODELS) for obj in objects):
+            mark_analytics_changed(session)
+            return
+
+@event.listens_for(Session, 'after_commit')
+def _bump_on_commit(session):
+    """Bump after the commit, so a response computed from the new data is cached under the new version."""
+    if session.info.pop('analytics_changed', False):
+        analytics_cache.bump()
@@ -0,0 +1,208 @@
+import csv
+import io
+import json
+import os
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List
+from sqlalchemy import select
+from src.models.lead import db, Lead, LeadListValue, Agent, AgentListValue, Interaction
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # Parquet and Arrow exports are unavailable without pyarrow
+    pyarrow = None
+
+# Rows fetched from the database and written out per batch
+EXPORT_BATCH_SIZE = int(os.environ.get("ANALYTICS_EXPORT_BATCH_SIZE", 1000))
+
+# format: (mimetype, file extension, needs pyarrow)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv', False),
+    'ndjson': ('application/x-ndjson', 'ndjson', False),
+    'parquet': ('application/vnd.apache.parquet', 'parquet', True),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows', True)
+}
+
+EXPORT_DATASETS = ('leads', 'interactions', 'agents')
+
+# List fields exported with each dataset: dataset -> (list value model, owner key, field names)
+LIST_FIELDS = {
+    'leads': (LeadListValue, 'lead_id', ['interested_properties', 'preferred_areas', 'tags']),
+    'agents': (AgentListValue, 'agent_id', ['specialization_areas', 'specialization_types', 'languages'])
+}
+
+def _export_query(dataset, start_date):
+    """Columns and ordered SELECT for a dataset; leads and interactions are limited to the window"""
+    if dataset == 'leads':
+        columns = list(Lead.__table__.columns) + [Agent.name.label('assigned_agent_name')]
+        query = (select(*columns).outerjoin(Agent, Lead.assigned_agent_id == Agent.id)
+                 .where(Lead.created_at >= start_date).order_by(Lead.created_at, Lead.id))
+    elif dataset == 'interactions':
+        columns = list(Interaction.__table__.columns) + [Agent.name.label('agent_name')]
+        query = (select(*columns).outerjoin(Agent, Interaction.agent_id == Agent.id)
+                 .where(Interaction.created_at >= start_date).order_by(Interaction.created_at, Interaction.id))
+    else:
+        columns = list(Agent.__table__.columns)
+        query = select(*columns).order_by(Agent.id)
+    return columns, query
+
+def export_field_names(dataset: str) -> List[str]:
+    """Output columns of a dataset, in order"""
+    columns, _ = _export_query(dataset, datetime.utcnow())
+    list_fields = LIST_FIELDS[dataset][2] if dataset in LIST_FIELDS else []
+    return [column.name for column in columns] + list_fields
+
+def iter_export_batches(dataset: str, start_date: datetime,
+                        batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yield a dataset's rows as lists of at most batch_size dicts.
+
+    Rows come from one streamed result (a server-side cursor where the
+    driver supports it) read batch_size rows at a time, and list fields are
+    fetched with one IN lookup per batch, so memory does not grow with the
+    size of the window.
+    """
+    _, query = _export_query(dataset, start_date)
+    result = db.session.execute(query.execution_options(stream_results=True, yield_per=batch_size))
+    for partition in result.partitions():
+        rows = [dict(row._mapping) for row in partition]
+        if dataset in LIST_FIELDS:
+            _attach_list_fields(dataset, rows)
+        yield rows
+
+def _attach_list_fields(dataset, rows):
+    value_model, owner_key, fields = LIST_FIELDS[dataset]
+    by_id = {row['id']: row for row in rows}
+    for row in rows:
+        row.update({field: [] for field in fields})
+
+    owner_column = getattr(value_model, owner_key)
+    for owner_id, field, value in db.session.execute(
+        select(owner_column, value_model.field, value_model.value)
+        .where(owner_column.in_(list(by_id)))
+        .order_by(owner_column, value_model.position)
+    ):
+        if field in fields:
+            by_id[owner_id][field].append(value)
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+def stream_csv(dataset: str, batches: Iterator[List[Dict[str, Any]]]) -> Iterator[str]:
+    """CSV text, one chunk per batch; list fields are joined with ';'"""
+    fields = export_field_names(dataset)
+    list_fields = set(LIST_FIELDS[dataset][2]) if dataset in LIST_FIELDS else set()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for rows in batches:
+        for row in rows:
+            writer.writerow([
+                ';'.join(row[field]) if field in list_fields
+                else row[field].isoformat() if isinstance(row[field], (datetime, date))
+                else row[field]
+                for field in fields
+            ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def stream_ndjson(dataset: str, batches: Iterator[List[Dict[str, Any]]]) -> Iterator[str]:
+    """One JSON object per line, one chunk per batch"""
+    for rows in batches:
+        yield ''.join(json.dumps(row, default=_json_value) + '\n' for row in rows)
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands written bytes back to the generator instead of keeping them"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def _arrow_type(column):
+    python_type = column.type.python_type
+    if python_type is bool:
+        return pyarrow.bool_()
+    if python_type is int:
+        return pyarrow.int64()
+    if python_type is float:
+        return pyarrow.float64()
+    if python_type is datetime:
+        return pyarrow.timestamp('us')
+    if python_type is date:
+        return pyarrow.date32()
+    return pyarrow.string()
+
+def arrow_schema(dataset: str):
+    """Arrow schema for a dataset, derived from the column types"""
+    columns, _ = _export_query(dataset, datetime.utcnow())
+    fields = [pyarrow.field(column.name, _arrow_type(column)) for column in columns]
+    if dataset in LIST_FIELDS:
+        fields += [pyarrow.field(name, pyarrow.list_(pyarrow.string())) for name in LIST_FIELDS[dataset][2]]
+    return pyarrow.schema(fields)
+
+def stream_arrow(dataset: str, batches: Iterator[List[Dict[str, Any]]], file_format: str) -> Iterator[bytes]:
+    """Parquet (one row group per batch) or Arrow IPC stream bytes, one chunk per batch"""
+    schema = arrow_schema(dataset)
+    sink = _ChunkSink()
+    output = pyarrow.PythonFile(sink, mode='w')
+    if file_format == 'parquet':
+        writer = pyarrow.parquet.ParquetWriter(output, schema)
+        write = writer.write_table
+        to_table = pyarrow.Table.from_pylist
+    else:
+        writer = pyarrow.ipc.new_stream(output, schema)
+        write = writer.write_batch
+        to_table = pyarrow.RecordBatch.from_pylist
+
+    for rows in batches:
+        if rows:
+            write(to_table(rows, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+def stream_export(dataset: str, file_format: str, start_date: datetime,
+                  batch_size: int = EXPORT_BATCH_SIZE) -> Iterator:
+    """
+    Stream a dataset in the given EXPORT_FORMATS format.
+
+    Raises:
+        ValueError: If the dataset or format is unknown, or pyarrow is
+            needed and not installed
+    """
+    if dataset not in EXPORT_DATASETS:
+        raise ValueError(f"dataset must be one of {', '.join(EXPORT_DATASETS)}")
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of json, {', '.join(EXPORT_FORMATS)}")
+    if EXPORT_FORMATS[file_format][2] and pyarrow is None:
+        raise ValueError(f'{file_format} export requires pyarrow')
+
+    batches = iter_export_batches(dataset, start_date, batch_size)
+    if file_format == 'csv':
+        return stream_csv(dataset, batches)
+    if file_format == 'ndjson':
+        return stream_ndjson(dataset, batches)
+    return stream_arrow(dataset, batches, file_format)
@@ -0,0 +1,270 @@
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterable, Optional
+from sqlalchemy import event, inspect, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from src.models.lead import db, Lead, Interaction, DailyLeadRollup, DailyInteractionRollup, LeadCountRollup
+
+# Lead attributes that place a lead in a rollup row
+LEAD_KEY_FIELDS = ('source', 'assigned_agent_id', 'status')
+
+# Lead attributes whose previous values are needed to move a lead's counts
+LEAD_TRACKED_FIELDS = LEAD_KEY_FIELDS + ('score',)
+
+LEAD_COUNTERS = ('created', 'entered', 'exited', 'status_entered', 'score_total', 'high_priority')
+LEAD_COUNT_COUNTERS = ('leads', 'score_total')
+INTERACTION_COUNTERS = ('interactions', 'response_days')
+
+def _lead_key(day, source, agent_id, status):
+    return (day, source or '', agent_id or 0, status or '')
+
+def _count_key(source, agent_id, status):
+    return (source or '', agent_id or 0, status or '')
+
+def _response_days(interaction_at, lead_created_at):
+    if interaction_at is None or lead_created_at is None:
+        return 0
+    return (interaction_at - lead_created_at).total_seconds() / 86400
+
+class RollupChanges:
+    """
+    Counter increments for the daily rollup tables and the current lead
+    counts, accumulated in memory and written with one upsert per table.
+
+    The flush hooks below record ORM writes on the current UTC day, so rows
+    for earlier days are never touched again. Bulk writes, which bypass the
+    hooks, record their changes here themselves and call write() before
+    committing.
+    """
+
+    def __init__(self, day: Optional[date] = None):
+        self.day = day or datetime.utcnow().date()
+        self.leads = defaultdict(lambda: dict.fromkeys(LEAD_COUNTERS, 0))
+        self.interactions = defaultdict(lambda: dict.fromkeys(INTERACTION_COUNTERS, 0))
+        self.counts = defaultdict(lambda: dict.fromkeys(LEAD_COUNT_COUNTERS, 0))
+
+    def lead_created(self, source, agent_id, status, score=0, priority=None):
+        counters = self.leads[_lead_key(self.day, source, agent_id, status)]
+        counters['created'] += 1
+        counters['entered'] += 1
+        counters['status_entered'] += 1
+        counters['score_total'] += score or 0
+        counters['high_priority'] += int(priority == 'high')
+        counts = self.counts[_count_key(source, agent_id, status)]
+        counts['leads'] += 1
+        counts['score_total'] += score or 0
+
+    def lead_moved(self, old_key: tuple, new_key: tuple, old_score=0, new_score=0):
+        """
+        Move a lead between (source, agent_id, status) keys and/or change its
+        score; None for either key adds or removes it.
+        """
+        if old_key == new_key and (old_score or 0) == (new_score or 0):
+            return
+        if old_key is not None:
+            counts = self.counts[_count_key(*old_key)]
+            counts['leads'] -= 1
+            counts['score_total'] -= old_score or 0
+        if new_key is not None:
+            counts = self.counts[_count_key(*new_key)]
+            counts['leads'] += 1
+            counts['score_total'] += new_score or 0
+        if old_key == new_key:
+            return
+        if old_key is not None:
+            self.leads[_lead_key(self.day, *old_key)]['exited'] += 1
+        if new_key is not None:
+            counters = self.leads[_lead_key(self.day, *new_key)]
+            counters['entered'] += 1
+            counters['status_entered'] += int(old_key is None or old_key[2] != new_key[2])
+
+    def interaction_created(self, agent_id, direction, interaction_at=None, lead_created_at=None):
+        counters = self.interactions[(self.day, agent_id or 0, direction or '')]
+        counters['interactions'] += 1
+        if direction == 'outbound':
+            counters['response_days'] += _response_days(interaction_at, lead_created_at)
+
+    def __bool__(self):
+        return bool(self.leads or self.interactions or self.counts)
+
+    def write(self, connection=None):
+        """Add the accumulated increments to the rollup tables"""
+        connection = connection or db.session.connection()
+        _upsert(connection, DailyLeadRollup.__table__, ('day', 'source', 'agent_id', 'status'),
+                LEAD_COUNTERS, self.leads)
+        _upsert(connection, DailyInteractionRollup.__table__, ('day', 'agent_id', 'direction'),
+                INTERACTION_COUNTERS, self.interactions)
+        _upsert(connection, LeadCountRollup.__table__, ('source', 'agent_id', 'status'),
+                LEAD_COUNT_COUNTERS, self.counts)
+        self.leads.clear()
+        self.interactions.clear()
+        self.counts.clear()
+
+def _upsert(connection, table, key_columns, counters, rows: Dict[tuple, dict]):
+    if not rows:
+        return
+    statement = insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={name: table.c[name] + statement.excluded[name] for name in counters}
+    )
+    connection.execute(statement, [dict(zip(key_columns, key), **values) for key, values in rows.items()])
+
+def rebuild_rollups(connection=None):
+    """
+    Recompute the rollup tables from the leads and interactions tables.
+
+    Used to backfill existing data. A lead's status history is not stored,
+    so each lead is counted as created on its created_at day and as having
+    entered its current source/agent/status on its updated_at day (its
+    created_at day while still new). Interactions count on their
+    created_at day.
+    """
+    connection = connection or db.session.connection()
+    connection.execute(DailyLeadRollup.__table__.delete())
+    connection.execute(DailyInteractionRollup.__table__.delete())
+
+    leads = defaultdict(lambda: dict.fromkeys(LEAD_COUNTERS, 0))
+    created_day = db.func.date(Lead.created_at)
+    for day, source, agent_id, status, count, score_total, high_priority in connection.execute(
+        select(created_day, Lead.source, Lead.assigned_agent_id, Lead.status, db.func.count(Lead.id),
+               db.func.sum(Lead.score), db.func.sum(db.case((Lead.priority == 'high', 1), else_=0)))
+        .group_by(created_day, Lead.source, Lead.assigned_agent_id, Lead.status)
+    ):
+        counters = leads[_lead_key(date.fromisoformat(day), source, agent_id, status)]
+        counters['created'] += count
+        counters['score_total'] += score_total or 0
+        counters['high_priority'] += high_priority or 0
+
+    entered_day = db.func.date(db.case((Lead.status == 'new', Lead.created_at),
+                                       else_=db.func.coalesce(Lead.updated_at, Lead.created_at)))
+    for day, source, agent_id, status, count in connection.execute(
+        select(entered_day, Lead.source, Lead.assigned_agent_id, Lead.status, db.func.count(Lead.id))
+        .group_by(entered_day, Lead.source, Lead.assigned_agent_id, Lead.status)
+    ):
+        counters = leads[_lead_key(date.fromisoformat(day), source, agent_id, status)]
+        counters['entered'] += count
+        counters['status_entered'] += count
+
+    interactions = defaultdict(lambda: dict.fromkeys(INTERACTION_COUNTERS, 0))
+    interaction_day = db.func.date(Interaction.created_at)
+    for day, agent_id, direction, count, response_days in connection.execute(
+        select(interaction_day, Interaction.agent_id, Interaction.direction, db.func.count(Interaction.id),
+               db.func.sum(db.case((Interaction.direction == 'outbound',
+                                    db.func.julianday(Interaction.created_at) - db.func.julianday(Lead.created_at)),
+                                   else_=0)))
+        .join(Lead, Interaction.lead_id == Lead.id)
+        .group_by(interaction_day, Interaction.agent_id, Interaction.direction)
+    ):
+        counters = interactions[(date.fromisoformat(day), agent_id or 0, direction or '')]
+        counters['interactions'] += count
+        counters['response_days'] += response_days or 0
+
+    _upsert(connection, DailyLeadRollup.__table__, ('day', 'source', 'agent_id', 'status'), LEAD_COUNTERS, leads)
+    _upsert(connection, DailyInteractionRollup.__table__, ('day', 'agent_id', 'direction'),
+            INTERACTION_COUNTERS, interactions)
+    rebuild_lead_counts(connection)
+
+def rebuild_lead_counts(connection=None):
+    """Recompute the current lead counts and score totals per source/agent/status from the leads table"""
+    connection = connection or db.session.connection()
+    connection.execute(LeadCountRollup.__table__.delete())
+
+    counts = defaultdict(lambda: dict.fromkeys(LEAD_COUNT_COUNTERS, 0))
+    for source, agent_id, status, count, score_total in connection.execute(
+        select(Lead.source, Lead.assigned_agent_id, Lead.status, db.func.count(Lead.id), db.func.sum(Lead.score))
+        .group_by(Lead.source, Lead.assigned_agent_id, Lead.status)
+    ):
+        key_counts = counts[_count_key(source, agent_id, status)]
+        key_counts['leads'] += count
+        key_counts['score_total'] += score_total or 0
+    _upsert(connection, LeadCountRollup.__table__, ('source', 'agent_id', 'status'), LEAD_COUNT_COUNTERS, counts)
+
+def _previous_lead_values(state, previous: Dict[int, tuple]):
+    """(source, agent_id, status, score) a dirty lead had before this flush"""
+    key = []
+    for position, attribute in enumerate(LEAD_TRACKED_FIELDS):
+        history = state.attrs[attribute].history
+        if history.deleted:
+            key.append(history.deleted[0])
+        elif history.unchanged:
+            key.append(history.unchanged[0])
+        elif history.added:
+            # Assigned without being loaded first: use the value read in before_flush
+            key.append(previous[state.identity[0]][position])
+        else:
+            key.append(getattr(state.obj(), attribute))
+    return tuple(key)
+
+@event.listens_for(Session, 'before_flush')
+def _load_previous_lead_values(session, flush_context, instances):
+    """Read the stored values of dirty leads whose old source/agent/status/score was never loaded."""
+    stale = []
+    for obj in session.dirty:
+        if isinstance(obj, Lead) and obj.id is not None:
+            state = inspect(obj)
+            for attribute in LEAD_TRACKED_FIELDS:
+                history = state.attrs[attribute].history
+                if history.added and not history.deleted and not history.unchanged:
+                    stale.append(obj.id)
+                    break
+
+    previous = {}
+    if stale:
+        rows = session.connection().execute(
+            select(Lead.id, *[getattr(Lead, attribute) for attribute in LEAD_TRACKED_FIELDS]).where(Lead.id.in_(stale))
+        )
+        previous = {row[0]: tuple(row[1:]) for row in rows}
+    session.info['rollup_previous_values'] = previous
+
+@event.listens_for(Session, 'after_flush')
+def _record_flushed_changes(session, flush_context):
+    """Add flushed lead and interaction changes to today's rollup rows."""
+    previous = session.info.pop('rollup_previous_values', {})
+    changes = RollupChanges()
+    interactions = []
+
+    for obj in session.new:
+        if isinstance(obj, Lead):
+            changes.lead_created(obj.source, obj.assigned_agent_id, obj.status, obj.score, obj.priority)
+        elif isinstance(obj, Interaction):
+            interactions.append(obj)
+
+    for obj in session.deleted:
+        if isinstance(obj, Lead):
+            *old_key, old_score = _previous_lead_values(inspect(obj), previous)
+            changes.lead_moved(tuple(old_key), None, old_score)
+
+    for obj in session.dirty:
+        if isinstance(obj, Lead) and session.is_modified(obj):
+            *old_key, old_score = _previous_lead_values(inspect(obj), previous)
+            changes.lead_moved(tuple(old_key), tuple(getattr(obj, attribute) for attribute in LEAD_KEY_FIELDS),
+                               old_score, obj.score)
+
+    if interactions:
+        created_at = _lead_created_at(session, [obj for obj in interactions if obj.direction == 'outbound'])
+        for interaction in interactions:
+            changes.interaction_created(interaction.agent_id, interaction.direction,
+                                        interaction.created_at, created_at.get(interaction.lead_id))
+
+    if changes:
+        changes.write(session.connection())
+
+def _lead_created_at(session, interactions: Iterable[Interaction]) -> Dict[int, datetime]:
+    """created_at of the interactions' leads, read in one query for leads not already loaded"""
+    created_at = {}
+    missing = set()
+    for interaction in interactions:
+        lead = interaction.__dict__.get('lead')
+        if lead is not None and 'created_at' in lead.__dict__:
+            created_at[interaction.lead_id] = lead.created_at
+        elif interaction.lead_id is not None:
+            missing.add(interaction.lead_id)
+
+    missing -= created_at.keys()
+    if missing:
+        created_at.update(session.connection().execute(
+            select(Lead.id, Lead.created_at).where(Lead.id.in_(missing))
+        ).all())
+    return created_at
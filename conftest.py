@@ -0,0 +1,21 @@
+"""
+Test setup for the flat source tree.
+
+The modules are deployed as the src.models, src.routes and src.services
+packages; map those package names onto this directory so the code's own
+imports resolve when the tests run from a checkout.
+"""
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Standalone scripts that talk to live services
+collect_ignore = ['test_google_sheet_access.py']
+
+for package in ('src', 'src.models', 'src.routes', 'src.services'):
+    if package not in sys.modules:
+        module = types.ModuleType(package)
+        module.__path__ = [ROOT]
+        sys.modules[package] = module
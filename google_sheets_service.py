@@ -2,12 +2,49 @@ import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 import json
 import os
-from typing import List, Dict, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Tuple
+from .snapshot_cache import SnapshotCache
+from .listing_store import ListingStore
+from .listing_dedup import deduplicate_listings
+from .sheet_sync import SheetSyncState
+
+# Listing sheets for each property source
+LISTING_SHEETS = {
+    "28hse": "https://docs.google.com/spreadsheets/d/1Dg6g0QFlETa4NdP6eR1qXGudldwe5syK8HbdZZu4h74/edit?gid=0#gid=0",
+    "centaline": "https://docs.google.com/spreadsheets/d/1DsiJScP1HBftv04VFlAKt2jAJVVVU-1Nmun7K4xF7gM/edit?gid=0#gid=0",
+    "squarefoot": "https://docs.google.com/spreadsheets/d/1ZMHZuPUol0eTdXijRKRCPwMpFLWZ8qsQ0HKzhFm6PD0/edit?gid=0#gid=0"
+}
+
+HK01_NEWS_SHEET = "https://docs.google.com/spreadsheets/d/1TQUlIfvv4k_hgf4vFlPULz4HD32x22qBxJMIdEwDC9g/edit?gid=0#gid=0"
+
+# Seconds a listing snapshot is served before a background refresh is triggered
+DEFAULT_CACHE_TTL = int(os.environ.get("SHEETS_CACHE_TTL", 300))
+
+# Serve search_properties from the local properties table instead of the Sheets API
+USE_LOCAL_DB = os.environ.get("LISTINGS_USE_LOCAL_DB", "false").lower() == "true"
+
+# Incremental sync fetches only rows appended since the last refresh, with a
+# full download diffed by row hash every FULL_RESYNC_EVERY refreshes
+INCREMENTAL_SYNC = os.environ.get("SHEETS_INCREMENTAL_SYNC", "false").lower() == "true"
+FULL_RESYNC_EVERY = int(os.environ.get("SHEETS_FULL_RESYNC_EVERY", 12))
 
 class GoogleSheetsService:
-    def __init__(self):
+    def __init__(self, cache_ttl: int = DEFAULT_CACHE_TTL, incremental_sync: bool = INCREMENTAL_SYNC,
+                 full_resync_every: int = FULL_RESYNC_EVERY, use_local_db: bool = USE_LOCAL_DB):
         self.scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
         self.client = None
+        self.cache = SnapshotCache(ttl_seconds=cache_ttl)
+        self.incremental_sync = incremental_sync
+        self.use_local_db = use_local_db
+        self.full_resync_every = max(full_resync_every, 1)
+        self.sync_states = {source_name: SheetSyncState() for source_name in LISTING_SHEETS}
+        self._worksheets = {}
+        self.store = ListingStore()
+        self._store_snapshots = {}  # source -> snapshot currently loaded into the store
+        self._store_versions = {}  # source -> sync version applied to the store
+        self._store_lock = threading.Lock()
         self._initialize_client()
     
     def _initialize_client(self):
@@ -43,16 +80,7 @@ class GoogleSheetsService:
             List[Dict[str, Any]]: List of dictionaries representing rows
         """
         try:
-            # Open the spreadsheet by URL
-            spreadsheet = self.client.open_by_url(sheet_url)
-            
-            # Get the specified worksheet
-            worksheet = spreadsheet.get_worksheet(worksheet_index)
-            
-            # Get all records as a list of dictionaries
-            data = worksheet.get_all_records()
-            
-            return data
+            return self._fetch_sheet_records(sheet_url, worksheet_index)
         except gspread.exceptions.SpreadsheetNotFound:
             print(f"Error: Spreadsheet not found at URL: {sheet_url}")
             return []
@@ -63,36 +91,239 @@ class GoogleSheetsService:
             print(f"An unexpected error occurred while fetching sheet data: {e}")
             return []
     
+    def _fetch_sheet_records(self, sheet_url: str, worksheet_index: int = 0) -> List[Dict[str, Any]]:
+        """Fetch all records from a worksheet, letting API errors propagate."""
+        # Open the spreadsheet by URL
+        spreadsheet = self.client.open_by_url(sheet_url)
+        
+        # Get the specified worksheet
+        worksheet = spreadsheet.get_worksheet(worksheet_index)
+        
+        # Get all records as a list of dictionaries
+        return worksheet.get_all_records()
+    
+    def get_source_listings(self, source: str) -> List[Dict[str, Any]]:
+        """
+        Get the cached listing snapshot for a source.
+        
+        The first call for a source fetches the sheet; afterwards the snapshot
+        is served from the cache and refreshed in the background once its TTL
+        expires, so callers never wait on a refresh.
+        
+        Args:
+            source (str): Listing source name (28hse, centaline, squarefoot)
+        
+        Returns:
+            List[Dict[str, Any]]: Listing rows for the source
+        """
+        try:
+            return self._load_source(source)
+        except Exception as e:
+            print(f"Error fetching {source} listings: {e}")
+            return []
+    
+    def _load_source(self, source: str) -> List[Dict[str, Any]]:
+        """Read a source through the snapshot cache, letting fetch errors propagate."""
+        if self.incremental_sync:
+            return self.cache.get(source, lambda: self.sync_source(source))
+        sheet_url = LISTING_SHEETS[source]
+        return self.cache.get(source, lambda: self._fetch_sheet_records(sheet_url))
+    
+    def sync_source(self, source: str) -> List[Dict[str, Any]]:
+        """
+        Refresh a listing source incrementally.
+        
+        Normally only the rows below the last seen row are requested, so a
+        refresh transfers and parses just the appended rows. Every
+        full_resync_every refreshes the whole sheet is downloaded and diffed
+        against the stored row hashes to pick up edited and deleted rows; only
+        the rows whose hash changed end up in the delta.
+        
+        Args:
+            source (str): Listing source name (28hse, centaline, squarefoot)
+        
+        Returns:
+            List[Dict[str, Any]]: Current rows of the source
+        """
+        state = self.sync_states[source]
+        worksheet = self._get_worksheet(source)
+        with state.lock:
+            header, refreshes, row_count = state.header, state.refreshes, state.row_count
+        
+        # A sheet without a header has no column range to append to, so it is
+        # read in full until one appears
+        if not header or refreshes % self.full_resync_every == 0:
+            values = worksheet.get_all_values()
+            header = values[0] if values else []
+            state.apply_full(header, [self._row_to_record(header, row) for row in values[1:]])
+        else:
+            # Data starts on sheet row 2, below the header
+            last_column = gspread.utils.rowcol_to_a1(1, len(header)).rstrip("0123456789")
+            values = worksheet.get_values(f"A{row_count + 2}:{last_column}")
+            state.apply_appended([self._row_to_record(header, row) for row in values], start=row_count)
+        
+        return state.rows
+    
+    def _get_worksheet(self, source: str):
+        """Open and remember the first worksheet of a listing source."""
+        worksheet = self._worksheets.get(source)
+        if worksheet is None:
+            worksheet = self.client.open_by_url(LISTING_SHEETS[source]).get_worksheet(0)
+            self._worksheets[source] = worksheet
+        return worksheet
+    
+    @staticmethod
+    def _row_to_record(header: List[str], values: List[str]) -> Dict[str, Any]:
+        """Convert a row of cell values into a record, as get_all_records does."""
+        values = list(values[:len(header)]) + [""] * (len(header) - len(values))
+        return dict(zip(header, gspread.utils.numericise_all(values)))
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and snapshot ages for the listing cache."""
+        return self.cache.stats()
+    
+    def invalidate_cache(self, source: str = None):
+        """Drop the cached snapshot for a source, or for all sources."""
+        self.cache.invalidate(source)
+    
     def get_28hse_listings(self) -> List[Dict[str, Any]]:
         """Get 28Hse property listings."""
-        sheet_url = "https://docs.google.com/spreadsheets/d/1Dg6g0QFlETa4NdP6eR1qXGudldwe5syK8HbdZZu4h74/edit?gid=0#gid=0"
-        return self.get_sheet_data(sheet_url)
+        return self.get_source_listings("28hse")
     
     def get_centaline_listings(self) -> List[Dict[str, Any]]:
         """Get Centaline property listings."""
-        sheet_url = "https://docs.google.com/spreadsheets/d/1DsiJScP1HBftv04VFlAKt2jAJVVVU-1Nmun7K4xF7gM/edit?gid=0#gid=0"
-        return self.get_sheet_data(sheet_url)
+        return self.get_source_listings("centaline")
     
     def get_squarefoot_listings(self) -> List[Dict[str, Any]]:
         """Get Squarefoot property listings."""
-        sheet_url = "https://docs.google.com/spreadsheets/d/1ZMHZuPUol0eTdXijRKRCPwMpFLWZ8qsQ0HKzhFm6PD0/edit?gid=0#gid=0"
-        return self.get_sheet_data(sheet_url)
+        return self.get_source_listings("squarefoot")
     
     def get_hk01_news(self) -> List[Dict[str, Any]]:
         """Get HK01 news articles."""
-        sheet_url = "https://docs.google.com/spreadsheets/d/1TQUlIfvv4k_hgf4vFlPULz4HD32x22qBxJMIdEwDC9g/edit?gid=0#gid=0"
-        return self.get_sheet_data(sheet_url)
-    
-    def get_all_property_listings(self) -> Dict[str, List[Dict[str, Any]]]:
-        """Get all property listings from all sources."""
-        return {
-            "28hse": self.get_28hse_listings(),
-            "centaline": self.get_centaline_listings(),
-            "squarefoot": self.get_squarefoot_listings()
+        return self.get_sheet_data(HK01_NEWS_SHEET)
+    
+    def get_all_property_listings(self, concurrent: bool = True) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Get all property listings from all sources.
+        
+        Args:
+            concurrent (bool): Fetch the sources in parallel (default: True)
+        
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: Listings keyed by source; a source
+            that failed to load maps to an empty list
+        """
+        results = self.fetch_all_sources(concurrent=concurrent)
+        for source_name, error in results["errors"].items():
+            print(f"Error fetching {source_name} listings: {error}")
+        return results["listings"]
+    
+    def fetch_all_sources(self, concurrent: bool = True, max_workers: int = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetch every listing source, reporting failures per source.
+        
+        With concurrent=True the sheets are fetched on a bounded thread pool, so
+        total latency is close to that of the slowest source rather than the sum.
+        
+        Args:
+            concurrent (bool): Fetch the sources in parallel (default: True)
+            max_workers (int): Thread pool size (default: one per source)
+        
+        Returns:
+            Dict[str, Dict[str, Any]]: {"listings": {source: rows}, "errors": {source: message}}
+        """
+        listings = {}
+        errors = {}
+        
+        if concurrent:
+            with ThreadPoolExecutor(max_workers=max_workers or len(LISTING_SHEETS),
+                                    thread_name_prefix="sheets-fetch") as executor:
+                futures = {
+                    source_name: executor.submit(self._load_source, source_name)
+                    for source_name in LISTING_SHEETS
+                }
+                for source_name, future in futures.items():
+                    try:
+                        listings[source_name] = future.result()
+                    except Exception as e:
+                        listings[source_name] = []
+                        errors[source_name] = str(e)
+        else:
+            for source_name in LISTING_SHEETS:
+                try:
+                    listings[source_name] = self._load_source(source_name)
+                except Exception as e:
+                    listings[source_name] = []
+                    errors[source_name] = str(e)
+        
+        return {"listings": listings, "errors": errors}
+    
+    def get_deduplicated_listings(self) -> List[Dict[str, Any]]:
+        """
+        Get all listings with cross-source duplicates collapsed.
+        
+        Returns:
+            List[Dict[str, Any]]: Canonical listings, each with the "sources" it
+            appears on and the per-source "variants"
+        """
+        return deduplicate_listings(self.get_all_property_listings())
+    
+    def get_listing_store(self) -> ListingStore:
+        """
+        Get the indexed listing store, reloading any source whose snapshot changed.
+        
+        Each snapshot is normalized and indexed once; searches against an
+        unchanged snapshot reuse the existing indexes. A source that fails to
+        load keeps its previously indexed rows.
+        """
+        results = self.fetch_all_sources()
+        with self._store_lock:
+            for source_name, listings in results["listings"].items():
+                if source_name in results["errors"]:
+                    print(f"Error fetching {source_name} listings: {results['errors'][source_name]}")
+                    continue
+                if self.incremental_sync:
+                    self._apply_sync_deltas(source_name)
+                elif self._store_snapshots.get(source_name) is not listings:
+                    self.store.load_source(source_name, listings)
+                    self._store_snapshots[source_name] = listings
+        return self.store
+    
+    def _apply_sync_deltas(self, source: str):
+        """Bring the store up to the latest sync version of a source. Caller holds the store lock."""
+        state = self.sync_states[source]
+        with state.lock:
+            applied_version = self._store_versions.get(source)
+            deltas = state.deltas_since(applied_version) if applied_version is not None else None
+            if deltas is None:
+                self.store.load_source(source, state.rows)
+            else:
+                for delta in deltas:
+                    self.store.apply_delta(source, delta)
+            self._store_versions[source] = state.version
+    
+    def sync_to_database(self) -> Dict[str, Any]:
+        """
+        Mirror all listing sources into the local properties table.
+        
+        Sources that fail to load are skipped so an outage never deactivates
+        their rows. Must run inside an application context.
+        
+        Returns:
+            Dict[str, Any]: {"synced": per-source upsert counts, "errors": {source: message}}
+        """
+        from .property_sync import sync_listings_to_db
+        
+        results = self.fetch_all_sources()
+        listings = {
+            source_name: rows for source_name, rows in results["listings"].items()
+            if source_name not in results["errors"]
         }
+        return {"synced": sync_listings_to_db(listings), "errors": results["errors"]}
     
     def search_properties(self, query: str = "", min_price: int = None, max_price: int = None, 
-                         rooms: str = None, development: str = None) -> List[Dict[str, Any]]:
+                         rooms: str = None, development: str = None,
+                         use_local_db: bool = None) -> List[Dict[str, Any]]:
         """
         Search properties across all sources with filters.
         
@@ -102,66 +333,47 @@ class GoogleSheetsService:
             max_price (int): Maximum price filter
             rooms (str): Number of rooms filter
             development (str): Development name filter
+            use_local_db (bool): Query the synced properties table instead of the
+                sheets (default: the service's use_local_db setting)
         
         Returns:
             List[Dict[str, Any]]: Filtered property listings
         """
-        all_listings = []
-        
-        # Get listings from all sources
-        sources = self.get_all_property_listings()
-        for source_name, listings in sources.items():
-            for listing in listings:
-                listing['source'] = source_name  # Add source information
-                all_listings.append(listing)
-        
-        # Apply filters
-        filtered_listings = all_listings
-        
-        if query:
-            query_lower = query.lower()
-            filtered_listings = [
-                listing for listing in filtered_listings
-                if (query_lower in listing.get('title', '').lower() or
-                    query_lower in listing.get('address', '').lower() or
-                    query_lower in listing.get('development', '').lower())
-            ]
-        
-        if min_price is not None or max_price is not None:
-            def extract_price(price_str):
-                """Extract numeric price from price string like '$18,000'"""
-                try:
-                    # Remove currency symbols and commas, then convert to int
-                    price_clean = price_str.replace('$', '').replace(',', '').replace(' ', '')
-                    return int(price_clean)
-                except (ValueError, AttributeError):
-                    return 0
-            
-            filtered_listings = [
-                listing for listing in filtered_listings
-                if self._price_in_range(extract_price(listing.get('price', '0')), min_price, max_price)
-            ]
-        
-        if rooms:
-            filtered_listings = [
-                listing for listing in filtered_listings
-                if rooms in listing.get('rooms', '')
-            ]
-        
-        if development:
-            development_lower = development.lower()
-            filtered_listings = [
-                listing for listing in filtered_listings
-                if development_lower in listing.get('development', '').lower()
-            ]
-        
-        return filtered_listings
-    
-    def _price_in_range(self, price: int, min_price: int = None, max_price: int = None) -> bool:
-        """Check if price is within the specified range."""
-        if min_price is not None and price < min_price:
-            return False
-        if max_price is not None and price > max_price:
-            return False
-        return True
-
+        if use_local_db if use_local_db is not None else self.use_local_db:
+            from .property_sync import search_local_properties
+            return search_local_properties(
+                query=query,
+                min_price=min_price,
+                max_price=max_price,
+                rooms=rooms,
+                development=development
+            )
+        
+        return self.get_listing_store().search(
+            query=query,
+            min_price=min_price,
+            max_price=max_price,
+            rooms=rooms,
+            development=development
+        )
+    
+    def iter_search_properties(self, query: str = "", min_price: int = None, max_price: int = None,
+                               rooms: str = None, development: str = None,
+                               cursor: str = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Lazily search properties for streaming responses.
+        
+        Takes the same filters as search_properties, plus a cursor from a
+        previous page. Yields (cursor, listing) pairs.
+        
+        Raises:
+            ValueError: If the cursor is invalid for this search
+        """
+        return self.get_listing_store().iter_search(
+            query=query,
+            min_price=min_price,
+            max_price=max_price,
+            rooms=rooms,
+            development=development,
+            cursor=cursor
+        )
@@ -0,0 +1,388 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from src.models.lead import db
+from .lead_ingest import ingest_inquiries
+
+# SQLite file holding the queue, separate from the application database so
+# enqueueing never waits on lead writes
+QUEUE_PATH = os.environ.get(
+    "INQUIRY_QUEUE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database', 'inquiry_queue.db')
+)
+
+# Webhooks enqueue and return 202 when enabled (opt-in); otherwise they are
+# processed inline and answer with the lead as before
+ASYNC_INQUIRIES = os.environ.get("INQUIRY_QUEUE_ASYNC", "false").lower() in ("1", "true", "yes")
+
+QUEUE_WORKERS = int(os.environ.get("INQUIRY_QUEUE_WORKERS", 2))
+QUEUE_BATCH_SIZE = int(os.environ.get("INQUIRY_QUEUE_BATCH_SIZE", 200))
+
+# Attempts before an inquiry is parked as failed
+MAX_ATTEMPTS = 5
+
+# Seconds before a claimed batch is handed out again (its worker died)
+CLAIM_TIMEOUT = 300
+
+# Seconds processed entries are kept for enqueue-time deduplication and lag stats
+DONE_RETENTION = 7 * 24 * 3600
+
+# Seconds an idle worker waits before polling again
+POLL_INTERVAL = 1.0
+
+class InquiryQueue:
+    """
+    Durable SQLite-backed queue of raw webhook payloads.
+
+    enqueue() commits the payload before returning, so a webhook can be
+    acknowledged as soon as it is stored. Workers claim batches atomically
+    (BEGIN IMMEDIATE), which is safe across threads and processes sharing
+    the file. A batch never contains a sender whose earlier messages are
+    still being processed, so one sender's messages are applied in order and
+    never race to create the same lead. Payloads are deduplicated on their
+    idempotency key while the entry is retained.
+    """
+
+    def __init__(self, path: str = QUEUE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._create_schema()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # Autocommit mode; transactions are opened explicitly
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=FULL')
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _create_schema(self):
+        connection = self._connection()
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS inquiry_queue ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'idempotency_key TEXT NOT NULL UNIQUE, '
+            'channel TEXT NOT NULL, '
+            'sender TEXT NOT NULL, '
+            'payload TEXT NOT NULL, '
+            "status TEXT NOT NULL DEFAULT 'pending', "  # pending, processing, done, failed
+            'attempts INTEGER NOT NULL DEFAULT 0, '
+            'received_at REAL NOT NULL, '
+            'claimed_at REAL, '
+            'processed_at REAL, '
+            'error TEXT)'
+        )
+        connection.execute('CREATE INDEX IF NOT EXISTS ix_inquiry_queue_status ON inquiry_queue (status, id)')
+        connection.execute('CREATE INDEX IF NOT EXISTS ix_inquiry_queue_sender ON inquiry_queue (sender, status)')
+
+    def enqueue(self, channel: str, sender: str, payload: Dict[str, Any],
+                idempotency_key: Optional[str] = None) -> Tuple[int, bool]:
+        """
+        Durably store one inquiry payload.
+
+        Args:
+            channel: "instagram" or "whatsapp"
+            sender: Instagram handle or WhatsApp number
+            payload: Raw webhook payload
+            idempotency_key: Delivery id from the sender (e.g. the message id);
+                a random key is used when none is given, which disables deduplication
+
+        Returns:
+            Tuple[int, bool]: Queue entry id and whether the key was already queued
+        """
+        idempotency_key = str(idempotency_key)[:128] if idempotency_key else uuid.uuid4().hex
+        connection = self._connection()
+        cursor = connection.execute(
+            'INSERT OR IGNORE INTO inquiry_queue (idempotency_key, channel, sender, payload, received_at) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (idempotency_key, channel, sender, json.dumps(payload, ensure_ascii=False), time.time())
+        )
+        if cursor.rowcount:
+            self.wake()
+            return cursor.lastrowid, False
+
+        row = connection.execute('SELECT id FROM inquiry_queue WHERE idempotency_key = ?', (idempotency_key,)).fetchone()
+        return row[0], True
+
+    def claim(self, limit: int) -> List[Dict[str, Any]]:
+        """Claim up to limit pending inquiries, oldest first, skipping senders already in flight."""
+        now = time.time()
+        with self._transaction() as connection:
+            # Release batches whose worker stopped without finishing them
+            connection.execute(
+                "UPDATE inquiry_queue SET status = 'pending' WHERE status = 'processing' AND claimed_at < ?",
+                (now - CLAIM_TIMEOUT,)
+            )
+            rows = connection.execute(
+                "SELECT id, idempotency_key, channel, payload, received_at FROM inquiry_queue "
+                "WHERE status = 'pending' AND sender NOT IN "
+                "(SELECT sender FROM inquiry_queue WHERE status = 'processing') "
+                "ORDER BY id LIMIT ?",
+                (limit,)
+            ).fetchall()
+            connection.executemany(
+                "UPDATE inquiry_queue SET status = 'processing', claimed_at = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                [(now, row[0]) for row in rows]
+            )
+
+        return [
+            {
+                'id': entry_id,
+                'idempotency_key': idempotency_key,
+                'channel': channel,
+                'payload': json.loads(payload),
+                'received_at': received_at
+            }
+            for entry_id, idempotency_key, channel, payload, received_at in rows
+        ]
+
+    def complete(self, entry_ids: List[int]):
+        """Mark claimed inquiries as processed."""
+        now = time.time()
+        with self._transaction() as connection:
+            connection.executemany(
+                "UPDATE inquiry_queue SET status = 'done', processed_at = ?, error = NULL WHERE id = ?",
+                [(now, entry_id) for entry_id in entry_ids]
+            )
+
+    def fail(self, failures: Dict[int, str], retry: bool = True):
+        """
+        Record failed inquiries.
+
+        With retry, entries go back to pending until MAX_ATTEMPTS is reached;
+        without it (e.g. invalid payloads) they are parked as failed at once.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            connection.executemany(
+                "UPDATE inquiry_queue SET status = CASE WHEN ? AND attempts < ? THEN 'pending' ELSE 'failed' END, "
+                "processed_at = ?, error = ? WHERE id = ?",
+                [(int(retry), MAX_ATTEMPTS, now, error[:1000], entry_id) for entry_id, error in failures.items()]
+            )
+        if retry:
+            self.wake()
+
+    def purge(self, older_than: float = DONE_RETENTION) -> int:
+        """Delete processed entries older than the retention window."""
+        cursor = self._connection().execute(
+            "DELETE FROM inquiry_queue WHERE status = 'done' AND processed_at < ?",
+            (time.time() - older_than,)
+        )
+        return cursor.rowcount
+
+    def wait(self, timeout: float):
+        """Block until something is enqueued in this process or the timeout passes."""
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
+    def wake(self):
+        """Release workers blocked in wait()."""
+        self._wakeup.set()
+
+    def stats(self, window: float = 300) -> Dict[str, Any]:
+        """
+        Queue depth and processing lag.
+
+        Args:
+            window: Seconds of recently processed inquiries to average lag over
+
+        Returns:
+            Dict[str, Any]: Entry counts by status, age of the oldest pending
+            entry and average/max enqueue-to-processed lag within the window
+        """
+        now = time.time()
+        connection = self._connection()
+        counts = dict(connection.execute('SELECT status, COUNT(*) FROM inquiry_queue GROUP BY status').fetchall())
+        oldest_pending = connection.execute(
+            "SELECT MIN(received_at) FROM inquiry_queue WHERE status IN ('pending', 'processing')"
+        ).fetchone()[0]
+        processed, average_lag, max_lag = connection.execute(
+            "SELECT COUNT(*), AVG(processed_at - received_at), MAX(processed_at - received_at) "
+            "FROM inquiry_queue WHERE status = 'done' AND processed_at >= ?",
+            (now - window,)
+        ).fetchone()
+
+        return {
+            'depth': counts.get('pending', 0) + counts.get('processing', 0),
+            'pending': counts.get('pending', 0),
+            'processing': counts.get('processing', 0),
+            'failed': counts.get('failed', 0),
+            'done': counts.get('done', 0),
+            'oldest_pending_age_seconds': round(now - oldest_pending, 3) if oldest_pending else 0,
+            'lag_window_seconds': window,
+            'processed_in_window': processed,
+            'average_lag_seconds': round(average_lag, 3) if average_lag is not None else None,
+            'max_lag_seconds': round(max_lag, 3) if max_lag is not None else None
+        }
+
+class InquiryWorkerPool:
+    """Background threads that drain an InquiryQueue in batches through ingest_inquiries."""
+
+    def __init__(self, app, queue: InquiryQueue, workers: int = QUEUE_WORKERS,
+                 batch_size: int = QUEUE_BATCH_SIZE):
+        self.app = app
+        self.queue = queue
+        self.workers = workers
+        self.batch_size = batch_size
+        self._threads = []
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self._counters = {
+            'batches': 0,
+            'processed': 0,
+            'duplicates': 0,
+            'rejected': 0,
+            'batch_errors': 0
+        }
+
+    def start(self):
+        """Start the worker threads (no-op if already running)."""
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'inquiry-worker-{number}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = 5):
+        """Ask the workers to stop after their current batch and wait for them."""
+        self._stopping.set()
+        self.queue.wake()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counters, workers=len(self._threads), batch_size=self.batch_size)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                batch = self.queue.claim(self.batch_size)
+                if batch:
+                    self.process_batch(batch)
+                else:
+                    self._purge_if_due()
+                    self.queue.wait(POLL_INTERVAL)
+            except Exception as e:
+                print(f"Inquiry worker error: {e}")
+                time.sleep(POLL_INTERVAL)
+
+    def process_batch(self, batch: List[Dict[str, Any]]):
+        """
+        Apply one claimed batch in a single transaction and record the outcome per entry.
+
+        If the batch transaction fails, its entries are retried one at a time
+        so that only the entries that fail on their own are sent back for
+        another attempt.
+        """
+        inquiries = [self._inquiry(entry) for entry in batch]
+
+        with self.app.app_context():
+            try:
+                result = ingest_inquiries(inquiries)
+            except Exception:
+                self._count(batch_errors=1)
+                db.session.remove()
+                for entry, inquiry in zip(batch, inquiries):
+                    self._process_entry(entry, inquiry)
+                return
+            finally:
+                db.session.remove()
+
+        rejected = {batch[error['index']]['id']: error['error'] for error in result['errors']}
+        if rejected:
+            self.queue.fail(rejected, retry=False)
+        self.queue.complete([entry['id'] for entry in batch if entry['id'] not in rejected])
+        self._count(batches=1, processed=len(batch) - len(rejected),
+                    duplicates=result['duplicates'], rejected=len(rejected))
+
+    def _process_entry(self, entry: Dict[str, Any], inquiry: Dict[str, Any]):
+        """Apply one entry of a failed batch in its own transaction. Caller holds an app context."""
+        try:
+            result = ingest_inquiries([inquiry])
+        except Exception as e:
+            self.queue.fail({entry['id']: str(e)})
+            return
+        finally:
+            db.session.remove()
+
+        if result['errors']:
+            self.queue.fail({entry['id']: result['errors'][0]['error']}, retry=False)
+            self._count(rejected=1)
+        else:
+            self.queue.complete([entry['id']])
+            self._count(processed=1, duplicates=result['duplicates'])
+
+    @staticmethod
+    def _inquiry(entry: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(entry['payload'],
+                    channel=entry['channel'],
+                    idempotency_key=entry['idempotency_key'],
+                    received_at=datetime.utcfromtimestamp(entry['received_at']))
+
+    def _count(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                self._counters[name] += value
+
+    def _purge_if_due(self):
+        with self._lock:
+            if time.monotonic() - self._last_purge < 3600:
+                return
+            self._last_purge = time.monotonic()
+        self.queue.purge()
+
+_queue = None
+_workers = None
+_setup_lock = threading.Lock()
+
+def get_inquiry_queue() -> InquiryQueue:
+    """Open the queue on first use so every request in the process shares it"""
+    global _queue
+    with _setup_lock:
+        if _queue is None:
+            _queue = InquiryQueue()
+        return _queue
+
+def start_inquiry_workers(app) -> InquiryWorkerPool:
+    """Start the worker pool for this process once, bound to the Flask app"""
+    global _workers
+    queue = get_inquiry_queue()
+    with _setup_lock:
+        if _workers is None:
+            _workers = InquiryWorkerPool(app, queue)
+            _workers.start()
+        return _workers
+
+def inquiry_queue_stats() -> Dict[str, Any]:
+    """Queue depth/lag plus this process's worker counters"""
+    stats = get_inquiry_queue().stats()
+    stats['workers'] = _workers.stats() if _workers is not None else None
+    return stats
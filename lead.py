@@ -1,11 +1,101 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from sqlalchemy.orm import joinedload
+from datetime import datetime, timedelta
 import json
 
 db = SQLAlchemy()
 
+class ListField:
+    """
+    A list of strings stored as rows of the owner's list_values child table
+    instead of JSON text, so membership can be looked up through an index.
+    
+    Reading returns a tuple in insertion order, so in-place edits fail
+    loudly instead of being silently lost; assigning a list (or None)
+    replaces it, dropping duplicates. On the class, contains(value)
+    builds an indexed filter, e.g. Lead.query.filter(Lead.tags.contains('vip')).
+    """
+    
+    def __set_name__(self, owner, name):
+        self.owner = owner
+        self.name = name
+    
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        return tuple(row.value for row in obj.list_values if row.field == self.name)
+    
+    def __set__(self, obj, values):
+        if isinstance(values, str):
+            values = [values]
+        
+        current = {row.value: row for row in obj.list_values if row.field == self.name}
+        rows = [row for row in obj.list_values if row.field != self.name]
+        value_class = type(obj).list_values.property.mapper.class_
+        
+        seen = set()
+        for value in values or []:
+            value = str(value)
+            if value in seen:
+                continue
+            seen.add(value)
+            row = current.get(value) or value_class(field=self.name, value=value)
+            row.position = len(seen) - 1
+            rows.append(row)
+        
+        obj.list_values = rows
+    
+    def contains(self, value):
+        """SQL expression matching owners whose list includes value"""
+        value_class = self.owner.list_values.property.mapper.class_
+        owner_id = next(iter(self.owner.list_values.property.remote_side))
+        return self.owner.id.in_(
+            db.select(owner_id).where(value_class.field == self.name, value_class.value == str(value))
+        )
+
+class LeadListValue(db.Model):
+    __tablename__ = 'lead_list_values'
+    __table_args__ = (
+        db.Index('ix_lead_list_values_field_value', 'field', 'value', 'lead_id'),
+    )
+    
+    # One element of a lead list field (interested_properties, preferred_areas, tags)
+    lead_id = db.Column(db.Integer, db.ForeignKey('leads.id'), primary_key=True)
+    field = db.Column(db.String(30), primary_key=True)
+    value = db.Column(db.String(200), primary_key=True)
+    position = db.Column(db.Integer, default=0)
+
+class AgentListValue(db.Model):
+    __tablename__ = 'agent_list_values'
+    __table_args__ = (
+        db.Index('ix_agent_list_values_field_value', 'field', 'value', 'agent_id'),
+    )
+    
+    # One element of an agent list field (specialization_areas, specialization_types, languages)
+    agent_id = db.Column(db.Integer, db.ForeignKey('agents.id'), primary_key=True)
+    field = db.Column(db.String(30), primary_key=True)
+    value = db.Column(db.String(200), primary_key=True)
+    position = db.Column(db.Integer, default=0)
+
 class Lead(db.Model):
     __tablename__ = 'leads'
+    __table_args__ = (
+        # Webhook sender lookups
+        db.Index('ix_leads_instagram_handle', 'instagram_handle'),
+        db.Index('ix_leads_whatsapp_number', 'whatsapp_number'),
+        # Lead lists: optional filter, then priority/created_at/id ordering
+        db.Index('ix_leads_priority_created', 'priority', 'created_at', 'id'),
+        db.Index('ix_leads_status_priority_created', 'status', 'priority', 'created_at', 'id'),
+        db.Index('ix_leads_source_priority_created', 'source', 'priority', 'created_at', 'id'),
+        db.Index('ix_leads_agent_priority_created', 'assigned_agent_id', 'priority', 'created_at', 'id'),
+        # Per-agent counts by status (routing, workload, performance)
+        db.Index('ix_leads_agent_status', 'assigned_agent_id', 'status', 'priority'),
+        # Date-window analytics
+        db.Index('ix_leads_created_at', 'created_at'),
+        db.Index('ix_leads_status_updated', 'status', 'updated_at'),
+        db.Index('ix_leads_created_property', 'created_at', 'source_property_id', 'status', 'score'),
+        db.Index('ix_leads_score', 'score', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
@@ -27,11 +117,16 @@ class Lead(db.Model):
     priority = db.Column(db.String(10), default='medium')  # low, medium, high, urgent
     score = db.Column(db.Integer, default=0)  # Lead scoring 0-100
     
+    # Score components, maintained incrementally (see update_score)
+    profile_score = db.Column(db.Integer, default=0)  # Contact, engagement and interest points (0-60)
+    interaction_count = db.Column(db.Integer, default=0)
+    recency_score = db.Column(db.Integer, default=0)  # Decays over time, see rescore_leads
+    
     # Property Interests
-    interested_properties = db.Column(db.Text)  # JSON array of property IDs
+    interested_properties = ListField()  # Property IDs
     budget_min = db.Column(db.Integer)
     budget_max = db.Column(db.Integer)
-    preferred_areas = db.Column(db.Text)  # JSON array of area names
+    preferred_areas = ListField()  # Area names
     property_type = db.Column(db.String(50))  # apartment, house, studio, etc.
     bedrooms = db.Column(db.Integer)
     move_in_date = db.Column(db.Date)
@@ -47,13 +142,25 @@ class Lead(db.Model):
     next_follow_up_at = db.Column(db.DateTime)
     
     # Metadata
-    tags = db.Column(db.Text)  # JSON array of tags
+    tags = ListField()
     notes = db.Column(db.Text)
     
+    # Rows behind the list fields, loaded for a whole result set in one query
+    list_values = db.relationship('LeadListValue', order_by='LeadListValue.position',
+                                  cascade='all, delete-orphan', lazy='selectin')
+    
     def __repr__(self):
         return f'<Lead {self.id}: {self.name or self.instagram_handle or "Unknown"}>'
     
-    def to_dict(self):
+    def to_dict(self, agent_lead_counts=None):
+        """
+        Serialize the lead. agent_lead_counts ({agent_id: lead count}) lets list
+        serializers supply the embedded agent's lead count without a query per lead.
+        """
+        agent_current_leads = None
+        if agent_lead_counts is not None:
+            agent_current_leads = agent_lead_counts.get(self.assigned_agent_id, 0)
+        
         return {
             'id': self.id,
             'name': self.name,
@@ -68,25 +175,36 @@ class Lead(db.Model):
             'status': self.status,
             'priority': self.priority,
             'score': self.score,
-            'interested_properties': json.loads(self.interested_properties) if self.interested_properties else [],
+            'interested_properties': list(self.interested_properties),
             'budget_min': self.budget_min,
             'budget_max': self.budget_max,
-            'preferred_areas': json.loads(self.preferred_areas) if self.preferred_areas else [],
+            'preferred_areas': list(self.preferred_areas),
             'property_type': self.property_type,
             'bedrooms': self.bedrooms,
             'move_in_date': self.move_in_date.isoformat() if self.move_in_date else None,
             'assigned_agent_id': self.assigned_agent_id,
-            'assigned_agent': self.assigned_agent.to_dict() if self.assigned_agent else None,
+            'assigned_agent': self.assigned_agent.to_dict(current_leads=agent_current_leads) if self.assigned_agent else None,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
             'last_contact_at': self.last_contact_at.isoformat() if self.last_contact_at else None,
             'next_follow_up_at': self.next_follow_up_at.isoformat() if self.next_follow_up_at else None,
-            'tags': json.loads(self.tags) if self.tags else [],
+            'tags': list(self.tags),
             'notes': self.notes
         }
     
     def update_score(self):
-        """Calculate and update lead score based on various factors"""
+        """
+        Recalculate the profile and recency components and the total score.
+        
+        Interaction history comes from the interaction_count counter, so this
+        issues no queries. Call after editing the lead's own fields.
+        """
+        self.update_profile_score()
+        self.recency_score = recency_score(self.last_contact_at)
+        return self.refresh_score()
+    
+    def update_profile_score(self):
+        """Recalculate the points that depend only on the lead's own fields"""
         score = 0
         
         # Contact information completeness (0-20 points)
@@ -101,25 +219,109 @@ class Lead(db.Model):
         if self.preferred_areas: score += 5
         if self.move_in_date: score += 5
         
-        # Interaction history (0-25 points)
-        interactions = Interaction.query.filter_by(lead_id=self.id).count()
-        score += min(interactions * 5, 25)
-        
-        # Recency (0-15 points)
-        if self.last_contact_at:
-            days_since_contact = (datetime.utcnow() - self.last_contact_at).days
-            if days_since_contact <= 1: score += 15
-            elif days_since_contact <= 3: score += 10
-            elif days_since_contact <= 7: score += 5
-        
         # Property interest specificity (0-10 points)
-        if self.interested_properties:
-            properties = json.loads(self.interested_properties)
-            score += min(len(properties) * 2, 10)
+        score += min(len(self.interested_properties) * 2, 10)
+        
+        self.profile_score = score
+        return score
+    
+    def record_interaction(self, contacted_at=None):
+        """
+        Count a new interaction and update the score by delta.
         
-        self.score = min(score, 100)
+        Args:
+            contacted_at: When the lead was contacted; refreshes last_contact_at
+                and the recency points (optional)
+        """
+        self.interaction_count = (self.interaction_count or 0) + 1
+        if contacted_at is not None:
+            self.last_contact_at = contacted_at
+            self.recency_score = recency_score(contacted_at)
+        return self.refresh_score()
+    
+    def refresh_score(self):
+        """Recombine the stored components into the total score"""
+        if self.profile_score is None:
+            self.update_profile_score()
+        self.score = compute_lead_score(self.profile_score, self.interaction_count, self.recency_score)
         return self.score
 
+def compute_lead_score(profile_score, interaction_count, recency):
+    """Total lead score (0-100) from its components"""
+    # Interaction history (0-25 points)
+    interaction_score = min((interaction_count or 0) * 5, 25)
+    return min((profile_score or 0) + interaction_score + (recency or 0), 100)
+
+def lead_score_expression(interaction_count, recency):
+    """compute_lead_score as a SQL expression, for updating scores in bulk statements"""
+    interaction_count = db.func.coalesce(interaction_count, 0)
+    interaction_points = db.case((interaction_count * 5 > 25, 25), else_=interaction_count * 5)
+    total = db.func.coalesce(Lead.profile_score, 0) + interaction_points + db.func.coalesce(recency, 0)
+    return db.case((total > 100, 100), else_=total)
+
+def recency_score(last_contact_at, now=None):
+    """Recency points (0-15) for the time since the last contact"""
+    if not last_contact_at:
+        return 0
+    days_since_contact = ((now or datetime.utcnow()) - last_contact_at).days
+    if days_since_contact <= 1: return 15
+    elif days_since_contact <= 3: return 10
+    elif days_since_contact <= 7: return 5
+    return 0
+
+def rescore_leads(now=None):
+    """
+    Apply recency decay to every lead in one UPDATE statement.
+    
+    Recency only ever decays between contacts, so only leads that still have
+    recency points are touched. Meant to run on a schedule rather than per
+    request. The thresholds match recency_score: whole days since contact
+    of at most 1, 3 and 7. The bulk UPDATE bypasses the rollup flush hooks,
+    so the score changes are added to the current lead score totals here.
+    
+    Returns:
+        int: Number of leads rescored
+    """
+    now = now or datetime.utcnow()
+    
+    recency = db.case(
+        (Lead.last_contact_at > now - timedelta(days=2), 15),
+        (Lead.last_contact_at > now - timedelta(days=4), 10),
+        (Lead.last_contact_at > now - timedelta(days=8), 5),
+        else_=0
+    )
+    new_score = lead_score_expression(Lead.interaction_count, recency)
+    
+    # Score change per rollup key, read before the leads are updated
+    rollup_key = (db.func.coalesce(Lead.source, ''), db.func.coalesce(Lead.assigned_agent_id, 0),
+                  db.func.coalesce(Lead.status, ''))
+    score_deltas = db.session.query(
+        *rollup_key,
+        db.func.sum(new_score - db.func.coalesce(Lead.score, 0))
+    ).filter(Lead.recency_score > 0).group_by(*rollup_key).all()
+    
+    result = db.session.execute(
+        db.update(Lead)
+        .where(Lead.recency_score > 0)
+        .values(recency_score=recency, score=new_score)
+        .execution_options(synchronize_session=False)
+    )
+    
+    counts = LeadCountRollup.__table__
+    deltas = [{'key_source': source, 'key_agent_id': agent_id, 'key_status': status, 'delta': delta}
+              for source, agent_id, status, delta in score_deltas if delta]
+    if deltas:
+        db.session.execute(
+            counts.update()
+            .where(counts.c.source == db.bindparam('key_source'),
+                   counts.c.agent_id == db.bindparam('key_agent_id'),
+                   counts.c.status == db.bindparam('key_status'))
+            .values(score_total=counts.c.score_total + db.bindparam('delta')),
+            deltas
+        )
+    db.session.commit()
+    return result.rowcount
+
 class Agent(db.Model):
     __tablename__ = 'agents'
     
@@ -130,9 +332,12 @@ class Agent(db.Model):
     whatsapp_number = db.Column(db.String(20))
     
     # Specializations
-    specialization_areas = db.Column(db.Text)  # JSON array of areas
-    specialization_types = db.Column(db.Text)  # JSON array of property types
-    languages = db.Column(db.Text)  # JSON array of languages
+    specialization_areas = ListField()
+    specialization_types = ListField()  # Property types
+    languages = ListField()
+    
+    list_values = db.relationship('AgentListValue', order_by='AgentListValue.position',
+                                  cascade='all, delete-orphan', lazy='selectin')
     
     # Performance metrics
     total_leads = db.Column(db.Integer, default=0)
@@ -149,23 +354,30 @@ class Agent(db.Model):
     def __repr__(self):
         return f'<Agent {self.id}: {self.name}>'
     
-    def to_dict(self):
+    def to_dict(self, current_leads=None):
+        """
+        Serialize the agent. current_leads can be passed in from a grouped count;
+        otherwise it is counted with one query rather than loading every lead.
+        """
+        if current_leads is None:
+            current_leads = agent_lead_counts([self.id]).get(self.id, 0)
+        
         return {
             'id': self.id,
             'name': self.name,
             'email': self.email,
             'phone': self.phone,
             'whatsapp_number': self.whatsapp_number,
-            'specialization_areas': json.loads(self.specialization_areas) if self.specialization_areas else [],
-            'specialization_types': json.loads(self.specialization_types) if self.specialization_types else [],
-            'languages': json.loads(self.languages) if self.languages else [],
+            'specialization_areas': list(self.specialization_areas),
+            'specialization_types': list(self.specialization_types),
+            'languages': list(self.languages),
             'total_leads': self.total_leads,
             'converted_leads': self.converted_leads,
             'conversion_rate': self.converted_leads / self.total_leads if self.total_leads > 0 else 0,
             'avg_response_time': self.avg_response_time,
             'is_active': self.is_active,
             'max_leads': self.max_leads,
-            'current_leads': len(self.leads),
+            'current_leads': current_leads,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
         }
@@ -182,6 +394,12 @@ class Agent(db.Model):
 
 class Interaction(db.Model):
     __tablename__ = 'interactions'
+    __table_args__ = (
+        db.Index('ix_interactions_lead_created', 'lead_id', 'created_at'),
+        db.Index('ix_interactions_agent_created', 'agent_id', 'created_at'),
+        db.Index('ix_interactions_agent_scheduled', 'agent_id', 'scheduled_at'),
+        db.Index('ix_interactions_created_at', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     lead_id = db.Column(db.Integer, db.ForeignKey('leads.id'), nullable=False)
@@ -215,7 +433,11 @@ class Interaction(db.Model):
     def __repr__(self):
         return f'<Interaction {self.id}: {self.type} with Lead {self.lead_id}>'
     
-    def to_dict(self):
+    def to_dict(self, agent_lead_counts=None):
+        agent_current_leads = None
+        if agent_lead_counts is not None:
+            agent_current_leads = agent_lead_counts.get(self.agent_id, 0)
+        
         return {
             'id': self.id,
             'lead_id': self.lead_id,
@@ -226,7 +448,7 @@ class Interaction(db.Model):
             'message': self.message,
             'attachments': json.loads(self.attachments) if self.attachments else [],
             'agent_id': self.agent_id,
-            'agent': self.agent.to_dict() if self.agent else None,
+            'agent': self.agent.to_dict(current_leads=agent_current_leads) if self.agent else None,
             'is_automated': self.is_automated,
             'created_at': self.created_at.isoformat(),
             'scheduled_at': self.scheduled_at.isoformat() if self.scheduled_at else None,
@@ -236,8 +458,116 @@ class Interaction(db.Model):
             'follow_up_date': self.follow_up_date.isoformat() if self.follow_up_date else None
         }
 
+class ProcessedInquiry(db.Model):
+    __tablename__ = 'processed_inquiries'
+    
+    # Idempotency key of an inquiry already applied to a lead, so redelivered
+    # webhooks and retried queue batches are not counted twice
+    idempotency_key = db.Column(db.String(128), primary_key=True)
+    lead_id = db.Column(db.Integer, db.ForeignKey('leads.id'))
+    processed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ProcessedInquiry {self.idempotency_key}: Lead {self.lead_id}>'
+
+class DailyLeadRollup(db.Model):
+    __tablename__ = 'daily_lead_rollups'
+    
+    # Lead events per UTC day, maintained by src.services.analytics_rollups.
+    # Key columns use '' and 0 rather than NULL for "none", so each key has
+    # exactly one row to increment
+    day = db.Column(db.Date, primary_key=True)
+    source = db.Column(db.String(50), primary_key=True, default='')
+    agent_id = db.Column(db.Integer, primary_key=True, default=0)  # 0 = unassigned
+    status = db.Column(db.String(20), primary_key=True, default='')
+    
+    created = db.Column(db.Integer, default=0)  # Leads created
+    entered = db.Column(db.Integer, default=0)  # Leads that took on this source/agent/status
+    exited = db.Column(db.Integer, default=0)  # Leads that left it
+    status_entered = db.Column(db.Integer, default=0)  # Leads that changed to this status (new or from another status)
+    score_total = db.Column(db.Integer, default=0)  # Sum of created leads' scores at creation
+    high_priority = db.Column(db.Integer, default=0)  # Created leads with high priority
+    
+    def __repr__(self):
+        return f'<DailyLeadRollup {self.day} {self.source}/{self.agent_id}/{self.status}>'
+
+class LeadCountRollup(db.Model):
+    __tablename__ = 'lead_count_rollups'
+    
+    # Current number of leads and sum of their current scores per
+    # source/agent/status, maintained alongside the daily rollups so current
+    # figures do not sum over every day of history
+    source = db.Column(db.String(50), primary_key=True, default='')
+    agent_id = db.Column(db.Integer, primary_key=True, default=0)  # 0 = unassigned
+    status = db.Column(db.String(20), primary_key=True, default='')
+    
+    leads = db.Column(db.Integer, default=0)
+    score_total = db.Column(db.Integer, default=0)
+    
+    def __repr__(self):
+        return f'<LeadCountRollup {self.source}/{self.agent_id}/{self.status}: {self.leads}>'
+
+class DailyInteractionRollup(db.Model):
+    __tablename__ = 'daily_interaction_rollups'
+    
+    day = db.Column(db.Date, primary_key=True)
+    agent_id = db.Column(db.Integer, primary_key=True, default=0)  # 0 = no agent
+    direction = db.Column(db.String(10), primary_key=True, default='')
+    
+    interactions = db.Column(db.Integer, default=0)
+    response_days = db.Column(db.Float, default=0)  # Sum of days from lead creation to each outbound interaction
+    
+    def __repr__(self):
+        return f'<DailyInteractionRollup {self.day} {self.agent_id}/{self.direction}>'
+
+def agent_lead_counts(agent_ids):
+    """Count assigned leads for many agents in one grouped query"""
+    agent_ids = [agent_id for agent_id in set(agent_ids) if agent_id is not None]
+    if not agent_ids:
+        return {}
+    
+    return dict(
+        db.session.query(Lead.assigned_agent_id, db.func.count(Lead.id))
+        .filter(Lead.assigned_agent_id.in_(agent_ids))
+        .group_by(Lead.assigned_agent_id)
+        .all()
+    )
+
+def serialize_agents(agents):
+    """Serialize agents with a single lead count query for the whole list"""
+    counts = agent_lead_counts(agent.id for agent in agents)
+    return [agent.to_dict(current_leads=counts.get(agent.id, 0)) for agent in agents]
+
+def serialize_leads(leads):
+    """
+    Serialize leads with a single lead count query for all embedded agents.
+    
+    Load the leads with LEAD_LIST_OPTIONS so the agents themselves come from the
+    same query instead of one lazy load per lead.
+    """
+    counts = agent_lead_counts(lead.assigned_agent_id for lead in leads)
+    return [lead.to_dict(agent_lead_counts=counts) for lead in leads]
+
+def serialize_interactions(interactions):
+    """Serialize interactions with a single lead count query for all embedded agents"""
+    counts = agent_lead_counts(interaction.agent_id for interaction in interactions)
+    return [interaction.to_dict(agent_lead_counts=counts) for interaction in interactions]
+
+# Loader options for list endpoints that serialize embedded agents
+LEAD_LIST_OPTIONS = (joinedload(Lead.assigned_agent),)
+INTERACTION_LIST_OPTIONS = (joinedload(Interaction.agent),)
+
 class Property(db.Model):
     __tablename__ = 'properties'
+    __table_args__ = (
+        db.UniqueConstraint('source', 'source_id', name='uq_properties_source_source_id'),
+        db.Index('ix_properties_active_price', 'is_active', 'price'),
+        db.Index('ix_properties_active_bedrooms', 'is_active', 'bedrooms'),
+        db.Index('ix_properties_development', 'development'),
+        db.Index('ix_properties_source_id', 'source_id'),
+        db.Index('ix_properties_active_source', 'is_active', 'source'),
+        db.Index('ix_properties_total_views', 'total_views'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
@@ -0,0 +1,296 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+from src.models.lead import db, Lead, LeadListValue, Interaction, ProcessedInquiry
+from .agent_routing import routing_table
+from .analytics_rollups import RollupChanges
+from .analytics_cache import mark_analytics_changed
+
+# Lead column that identifies the sender on each inquiry channel
+CHANNEL_KEYS = {
+    'instagram': 'instagram_handle',
+    'whatsapp': 'whatsapp_number'
+}
+
+# Columns written for a new lead (every row of a bulk insert needs the same keys)
+NEW_LEAD_FIELDS = [
+    'name', 'instagram_handle', 'whatsapp_number', 'source', 'source_post_id',
+    'source_property_id', 'original_message', 'status', 'priority', 'assigned_agent_id',
+    'score', 'profile_score', 'interaction_count', 'recency_score', 'created_at', 'updated_at'
+]
+
+# Identifiers per IN (...) lookup, well below SQLite's bound parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+def normalize_inquiry(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate one Instagram/WhatsApp inquiry and reduce it to the fields used.
+
+    The channel is taken from "channel" (or "source"), or else inferred from
+    whichever of instagram_handle/whatsapp_number is present. received_at
+    may carry a UTC offset; it is stored as naive UTC like every other
+    timestamp.
+
+    Raises:
+        ValueError: If the channel, sender or message is missing, or a field
+            has the wrong type
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Inquiry must be an object')
+
+    channel = data.get('channel') or data.get('source')
+    if channel not in CHANNEL_KEYS:
+        channel = next((name for name, key in CHANNEL_KEYS.items() if data.get(key)), None)
+    if channel is None:
+        raise ValueError('Instagram handle or WhatsApp number is required')
+
+    sender = data.get(CHANNEL_KEYS[channel])
+    if not sender or not data.get('message'):
+        raise ValueError(f'{CHANNEL_KEYS[channel]} and message are required')
+    if not isinstance(sender, (str, int)) or isinstance(sender, bool):
+        raise ValueError(f'{CHANNEL_KEYS[channel]} must be a string')
+    if not isinstance(data['message'], str):
+        raise ValueError('message must be a string')
+    if data.get('name') is not None and not isinstance(data['name'], str):
+        raise ValueError('name must be a string')
+    for field in ('post_id', 'property_id'):
+        value = data.get(field)
+        if value is not None and (not isinstance(value, (str, int)) or isinstance(value, bool)):
+            raise ValueError(f'{field} must be a string')
+
+    idempotency_key = data.get('idempotency_key')
+    if idempotency_key is not None:
+        idempotency_key = str(idempotency_key)[:128]
+
+    return {
+        'channel': channel,
+        'sender': str(sender),
+        'message': data['message'],
+        'name': data.get('name'),
+        'post_id': data.get('post_id'),
+        'property_id': data.get('property_id'),
+        'received_at': _parse_received_at(data.get('received_at')),
+        'idempotency_key': idempotency_key
+    }
+
+def _parse_received_at(value):
+    """Parse an ISO timestamp (or datetime) into naive UTC"""
+    if not value:
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError('received_at must be an ISO 8601 timestamp')
+    elif not isinstance(value, datetime):
+        raise ValueError('received_at must be an ISO 8601 timestamp')
+
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def ingest_inquiries(inquiries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Create or update leads for a batch of Instagram/WhatsApp inquiries.
+
+    Does the same per-message work as the instagram/whatsapp inquiry routes,
+    but for the whole batch at once: existing leads are found with chunked
+    IN lookups on instagram_handle and whatsapp_number, new leads are routed
+    in one pass over the cached routing table, new leads and interactions
+    are each written with one executemany and everything is committed in
+    one transaction. Several messages from the same sender become one lead
+    with several interactions. Invalid inquiries are reported and skipped.
+    Inquiries whose idempotency_key was already processed are reported as
+    duplicates and not applied again. Must run inside an application context.
+
+    Args:
+        inquiries: Inquiry payloads with channel (or instagram_handle /
+            whatsapp_number), message and optionally name, post_id,
+            property_id, received_at (ISO timestamp) and idempotency_key
+
+    Returns:
+        Dict[str, Any]: Counts, one {"index", "lead_id", "is_new_lead",
+        "duplicate"} result per accepted inquiry and one {"index", "error"}
+        entry per rejected one
+    """
+    accepted = []
+    errors = []
+    for index, data in enumerate(inquiries):
+        try:
+            accepted.append((index, normalize_inquiry(data)))
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+
+    try:
+        accepted, duplicates = _split_duplicates(accepted)
+        existing = _find_existing_leads(accepted)
+        now = datetime.utcnow()
+
+        # Group messages by sender, keeping arrival order
+        senders = {}
+        for index, inquiry in accepted:
+            senders.setdefault((inquiry['channel'], inquiry['sender']), []).append((index, inquiry))
+
+        new_leads = {}
+        for key, messages in senders.items():
+            lead = existing.get(key)
+            if lead is None:
+                new_leads[key] = _new_lead(messages, now)
+            else:
+                _update_lead(lead, messages, now)
+
+        # Route all new leads in one pass over the cached routing table
+        pending = list(new_leads.values())
+        assignments = routing_table.plan_assignments(
+            (position, None, None, lead.status) for position, lead in enumerate(pending))
+        for position, agent in assignments:
+            pending[position].assigned_agent_id = agent.id
+
+        # One executemany for the new leads, then read their ids back by sender
+        db.session.bulk_insert_mappings(Lead, [
+            {field: getattr(lead, field) for field in NEW_LEAD_FIELDS} for lead in pending
+        ])
+        created = _find_existing_leads([(None, inquiry) for messages in senders.values()
+                                        for _, inquiry in messages[:1]
+                                        if (inquiry['channel'], inquiry['sender']) in new_leads])
+        db.session.bulk_insert_mappings(LeadListValue, [
+            {'lead_id': created[key].id, 'field': row.field, 'value': row.value, 'position': row.position}
+            for key, lead in new_leads.items() for row in lead.list_values
+        ])
+
+        interactions = []
+        receipts = []
+        results = []
+        for key, messages in senders.items():
+            lead = existing.get(key) or created[key]
+            for index, inquiry in messages:
+                interactions.append({
+                    'lead_id': lead.id,
+                    'type': 'message',
+                    'channel': inquiry['channel'],
+                    'direction': 'inbound',
+                    'message': inquiry['message'],
+                    'is_automated': False,
+                    'created_at': inquiry['received_at'] or now
+                })
+                if inquiry['idempotency_key']:
+                    receipts.append({'idempotency_key': inquiry['idempotency_key'], 'lead_id': lead.id,
+                                     'processed_at': now})
+                results.append({'index': index, 'lead_id': lead.id, 'is_new_lead': key in new_leads,
+                                'duplicate': False})
+
+        db.session.bulk_insert_mappings(Interaction, interactions)
+        db.session.bulk_insert_mappings(ProcessedInquiry, receipts)
+        
+        # Bulk inserts bypass the rollup flush hooks too
+        rollups = RollupChanges()
+        for lead in pending:
+            rollups.lead_created(lead.source, lead.assigned_agent_id, lead.status, lead.score, lead.priority)
+        for interaction in interactions:
+            rollups.interaction_created(None, 'inbound')
+        rollups.write()
+        mark_analytics_changed(db.session)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    # Bulk inserts bypass the flush hooks, so report the assignments directly
+    for position, agent in assignments:
+        routing_table.apply_lead_change(None, pending[position].status, agent.id, pending[position].status)
+
+    # Repeats within the batch point at the lead their first copy was applied to
+    batch_leads = {receipt['idempotency_key']: receipt['lead_id'] for receipt in receipts}
+    for duplicate in duplicates:
+        key = duplicate.pop('idempotency_key')
+        if duplicate['lead_id'] is None:
+            duplicate['lead_id'] = batch_leads.get(key)
+    results.extend(duplicates)
+    results.sort(key=lambda result: result['index'])
+    return {
+        'received': len(inquiries),
+        'accepted': len(accepted) + len(duplicates),
+        'duplicates': len(duplicates),
+        'created_leads': len(new_leads),
+        'updated_leads': len(senders) - len(new_leads),
+        'interactions': len(interactions),
+        'results': results,
+        'errors': errors
+    }
+
+def _split_duplicates(accepted):
+    """Separate inquiries whose idempotency key was already processed (or repeats one in the batch)"""
+    keys = sorted({inquiry['idempotency_key'] for _, inquiry in accepted if inquiry['idempotency_key']})
+    processed = {}
+    for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+        chunk = keys[start:start + LOOKUP_CHUNK_SIZE]
+        processed.update(db.session.query(ProcessedInquiry.idempotency_key, ProcessedInquiry.lead_id)
+                         .filter(ProcessedInquiry.idempotency_key.in_(chunk)))
+
+    fresh = []
+    duplicates = []
+    seen = set()
+    for index, inquiry in accepted:
+        key = inquiry['idempotency_key']
+        if key and (key in processed or key in seen):
+            duplicates.append({'index': index, 'lead_id': processed.get(key), 'is_new_lead': False,
+                               'duplicate': True, 'idempotency_key': key})
+        else:
+            seen.add(key)
+            fresh.append((index, inquiry))
+    return fresh, duplicates
+
+def _find_existing_leads(accepted):
+    """Load the leads matching any sender in the batch, keyed by (channel, sender)"""
+    existing = {}
+    for channel, key in CHANNEL_KEYS.items():
+        column = getattr(Lead, key)
+        senders = sorted({inquiry['sender'] for _, inquiry in accepted if inquiry['channel'] == channel})
+        for start in range(0, len(senders), LOOKUP_CHUNK_SIZE):
+            chunk = senders[start:start + LOOKUP_CHUNK_SIZE]
+            # Lowest id wins if a sender has several leads, as with .first()
+            for lead in Lead.query.filter(column.in_(chunk)).order_by(Lead.id.desc()):
+                existing[(channel, getattr(lead, key))] = lead
+    return existing
+
+def _new_lead(messages, now):
+    """Build an unsaved lead from its sender's messages, as the inquiry routes do"""
+    _, first = messages[0]
+    lead = Lead()
+    for field in NEW_LEAD_FIELDS:
+        setattr(lead, field, None)
+    setattr(lead, CHANNEL_KEYS[first['channel']], first['sender'])
+    lead.source = first['channel']
+    lead.status = 'new'
+    lead.priority = 'medium'
+    lead.created_at = lead.updated_at = now
+    lead.original_message = first['message']
+    lead.source_post_id = first['post_id']
+    lead.source_property_id = first['property_id']
+    lead.name = next((inquiry['name'] for _, inquiry in messages if inquiry['name']), None)
+
+    lead.interested_properties = [inquiry['property_id'] for _, inquiry in messages if inquiry['property_id']]
+
+    lead.update_score()
+    lead.interaction_count = len(messages)
+    lead.refresh_score()
+    return lead
+
+def _update_lead(lead, messages, now):
+    """Apply a sender's new messages to their existing lead"""
+    interested = list(lead.interested_properties)
+    profile_changed = False
+    for _, inquiry in messages:
+        if inquiry['property_id'] and str(inquiry['property_id']) not in interested:
+            interested.append(str(inquiry['property_id']))
+            profile_changed = True
+        if inquiry['name'] and not lead.name:
+            lead.name = inquiry['name']
+            profile_changed = True
+
+    if profile_changed:
+        lead.interested_properties = interested
+        lead.update_profile_score()
+
+    contacted_at = max(inquiry['received_at'] or now for _, inquiry in messages)
+    lead.interaction_count = (lead.interaction_count or 0) + len(messages) - 1
+    lead.record_interaction(contacted_at=contacted_at)
@@ -1,10 +1,111 @@
 from flask import Blueprint, request, jsonify
-from src.models.lead import db, Lead, Agent, Interaction, Property
+from src.models.lead import (db, Lead, Interaction, Property, serialize_leads,
+                             serialize_interactions, rescore_leads, LEAD_LIST_OPTIONS, INTERACTION_LIST_OPTIONS)
+from src.services.agent_routing import routing_table
+from src.services.analytics_cache import analytics_cache
+from src.services.lead_ingest import CHANNEL_KEYS, ingest_inquiries
+from src.services.inquiry_queue import (ASYNC_INQUIRIES, get_inquiry_queue, inquiry_queue_stats,
+                                        start_inquiry_workers)
+from sqlalchemy import and_, or_
+from collections import OrderedDict
 from datetime import datetime, timedelta
+import base64
 import json
+import threading
+import time
 
 leads_bp = Blueprint('leads', __name__)
 
+@leads_bp.record_once
+def start_queue_workers(state):
+    """Start the inquiry worker pool when the blueprint is registered at app startup"""
+    if ASYNC_INQUIRIES:
+        start_inquiry_workers(state.app)
+
+# Most inquiries accepted by one /leads/bulk request
+MAX_BULK_INQUIRIES = 5000
+
+# Seconds a lead list total is reused for cursor-paginated requests
+LEAD_COUNT_CACHE_TTL = 30
+
+# Filter combinations whose totals are kept; the least recently used is dropped beyond this
+LEAD_COUNT_CACHE_SIZE = 256
+
+_lead_count_cache = OrderedDict()
+_lead_count_lock = threading.Lock()
+
+def _cached_lead_count(count_key):
+    """Return the cached total for a filter combination, or None if missing or expired"""
+    with _lead_count_lock:
+        cached = _lead_count_cache.get(count_key)
+        if cached is None or time.monotonic() - cached[1] >= LEAD_COUNT_CACHE_TTL:
+            _lead_count_cache.pop(count_key, None)
+            return None
+        _lead_count_cache.move_to_end(count_key)
+        return cached[0]
+
+def _store_lead_count(count_key, total):
+    with _lead_count_lock:
+        _lead_count_cache[count_key] = (total, time.monotonic())
+        _lead_count_cache.move_to_end(count_key)
+        while len(_lead_count_cache) > LEAD_COUNT_CACHE_SIZE:
+            _lead_count_cache.popitem(last=False)
+
+def encode_lead_cursor(lead):
+    """Encode a lead's (priority, created_at, id) sort position as an opaque cursor"""
+    key = [lead.priority, lead.created_at.isoformat(), lead.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+def decode_lead_cursor(cursor):
+    """Decode a cursor from encode_lead_cursor, raising ValueError if malformed"""
+    try:
+        priority, created_at, lead_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return priority, datetime.fromisoformat(created_at), int(lead_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def paginate_leads_by_cursor(query, cursor, per_page, include_total=False, count_key=None):
+    """
+    Keyset-paginate a lead query ordered by priority, created_at and id (all descending).
+    
+    Each page filters on the position of the previous page's last lead instead
+    of using OFFSET, so deep pages cost the same as the first. The total is
+    only counted when requested and is cached briefly per count_key.
+    """
+    query = query.order_by(Lead.priority.desc(), Lead.created_at.desc(), Lead.id.desc())
+    
+    total = None
+    if include_total:
+        total = _cached_lead_count(count_key) if count_key is not None else None
+        if total is None:
+            total = query.order_by(None).count()
+            if count_key is not None:
+                _store_lead_count(count_key, total)
+    
+    if cursor:
+        priority, created_at, lead_id = decode_lead_cursor(cursor)
+        query = query.filter(or_(
+            Lead.priority < priority,
+            and_(Lead.priority == priority, or_(
+                Lead.created_at < created_at,
+                and_(Lead.created_at == created_at, Lead.id < lead_id)
+            ))
+        ))
+    
+    leads = query.limit(per_page + 1).all()
+    has_next = len(leads) > per_page
+    leads = leads[:per_page]
+    
+    pagination = {
+        'per_page': per_page,
+        'has_next': has_next,
+        'next_cursor': encode_lead_cursor(leads[-1]) if has_next else None
+    }
+    if total is not None:
+        pagination['total'] = total
+    
+    return leads, pagination
+
 @leads_bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -25,9 +126,13 @@ def get_leads():
         priority = request.args.get('priority')
         agent_id = request.args.get('agent_id', type=int)
         source = request.args.get('source')
+        interested_property = request.args.get('interested_property')
+        preferred_area = request.args.get('preferred_area')
+        tag = request.args.get('tag')
+        cursor = request.args.get('cursor')
         
         # Build query
-        query = Lead.query
+        query = Lead.query.options(*LEAD_LIST_OPTIONS)
         
         if status:
             query = query.filter(Lead.status == status)
@@ -37,6 +142,30 @@ def get_leads():
             query = query.filter(Lead.assigned_agent_id == agent_id)
         if source:
             query = query.filter(Lead.source == source)
+        if interested_property:
+            query = query.filter(Lead.interested_properties.contains(interested_property))
+        if preferred_area:
+            query = query.filter(Lead.preferred_areas.contains(preferred_area))
+        if tag:
+            query = query.filter(Lead.tags.contains(tag))
+        
+        # Cursor pagination when a cursor parameter is present (empty for the first page)
+        if cursor is not None:
+            try:
+                leads, pagination = paginate_leads_by_cursor(
+                    query, cursor, per_page,
+                    include_total=request.args.get('include_total', 'false').lower() == 'true',
+                    count_key=('leads', status, priority, agent_id, source,
+                               interested_property, preferred_area, tag)
+                )
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            return jsonify({
+                'success': True,
+                'leads': serialize_leads(leads),
+                'pagination': pagination
+            })
         
         # Order by priority and creation date
         query = query.order_by(
@@ -53,7 +182,7 @@ def get_leads():
         
         return jsonify({
             'success': True,
-            'leads': [lead.to_dict() for lead in leads.items],
+            'leads': serialize_leads(leads.items),
             'pagination': {
                 'page': page,
                 'per_page': per_page,
@@ -98,11 +227,11 @@ def create_lead():
         
         # Property interests
         if data.get('interested_properties'):
-            lead.interested_properties = json.dumps(data['interested_properties'])
+            lead.interested_properties = data['interested_properties']
         lead.budget_min = data.get('budget_min')
         lead.budget_max = data.get('budget_max')
         if data.get('preferred_areas'):
-            lead.preferred_areas = json.dumps(data['preferred_areas'])
+            lead.preferred_areas = data['preferred_areas']
         lead.property_type = data.get('property_type')
         lead.bedrooms = data.get('bedrooms')
         if data.get('move_in_date'):
@@ -110,7 +239,7 @@ def create_lead():
         
         # Tags and notes
         if data.get('tags'):
-            lead.tags = json.dumps(data['tags'])
+            lead.tags = data['tags']
         lead.notes = data.get('notes')
         
         # Auto-assign agent if not specified
@@ -122,11 +251,9 @@ def create_lead():
             if agent:
                 lead.assigned_agent_id = agent.id
         
-        # Calculate initial score
-        db.session.add(lead)
-        db.session.flush()  # Get the ID
+        # Calculate the initial score before the first flush, which rolls it up
         lead.update_score()
-        
+        db.session.add(lead)
         db.session.commit()
         
         return jsonify({
@@ -167,13 +294,13 @@ def update_lead(lead_id):
             if field in data:
                 setattr(lead, field, data[field])
         
-        # Handle JSON fields
+        # Handle list fields
         if 'interested_properties' in data:
-            lead.interested_properties = json.dumps(data['interested_properties'])
+            lead.interested_properties = data['interested_properties']
         if 'preferred_areas' in data:
-            lead.preferred_areas = json.dumps(data['preferred_areas'])
+            lead.preferred_areas = data['preferred_areas']
         if 'tags' in data:
-            lead.tags = json.dumps(data['tags'])
+            lead.tags = data['tags']
         
         # Handle date fields
         if 'move_in_date' in data and data['move_in_date']:
@@ -201,20 +328,20 @@ def get_lead_interactions(lead_id):
     """Get all interactions for a lead"""
     try:
         lead = Lead.query.get_or_404(lead_id)
-        interactions = Interaction.query.filter_by(lead_id=lead_id).order_by(
+        interactions = Interaction.query.options(*INTERACTION_LIST_OPTIONS).filter_by(lead_id=lead_id).order_by(
             Interaction.created_at.desc()
         ).all()
         
         return jsonify({
             'success': True,
-            'interactions': [interaction.to_dict() for interaction in interactions]
+            'interactions': serialize_interactions(interactions)
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @leads_bp.route('/leads/<int:lead_id>/interactions', methods=['POST'])
-def create_interaction():
+def create_interaction(lead_id):
     """Create a new interaction for a lead"""
     try:
         data = request.get_json()
@@ -241,9 +368,9 @@ def create_interaction():
         if data.get('follow_up_date'):
             interaction.follow_up_date = datetime.fromisoformat(data['follow_up_date'])
         
-        # Update lead's last contact time
-        lead = Lead.query.get(lead_id)
-        lead.last_contact_at = datetime.utcnow()
+        # Update lead's last contact time and score
+        lead = Lead.query.get_or_404(lead_id)
+        lead.record_interaction(contacted_at=datetime.utcnow())
         
         db.session.add(interaction)
         db.session.commit()
@@ -266,70 +393,10 @@ def handle_instagram_inquiry():
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
-        instagram_handle = data.get('instagram_handle')
-        message = data.get('message')
-        post_id = data.get('post_id')
-        property_id = data.get('property_id')
-        
-        if not instagram_handle or not message:
+        if not data.get('instagram_handle') or not data.get('message'):
             return jsonify({'error': 'Instagram handle and message are required'}), 400
         
-        # Check if lead already exists
-        existing_lead = Lead.query.filter_by(instagram_handle=instagram_handle).first()
-        
-        if existing_lead:
-            # Update existing lead
-            lead = existing_lead
-            lead.last_contact_at = datetime.utcnow()
-            
-            # Add to interested properties if new
-            if property_id:
-                interested = json.loads(lead.interested_properties) if lead.interested_properties else []
-                if property_id not in interested:
-                    interested.append(property_id)
-                    lead.interested_properties = json.dumps(interested)
-        else:
-            # Create new lead
-            lead = Lead()
-            lead.instagram_handle = instagram_handle
-            lead.source = 'instagram'
-            lead.source_post_id = post_id
-            lead.source_property_id = property_id
-            lead.original_message = message
-            lead.status = 'new'
-            
-            if property_id:
-                lead.interested_properties = json.dumps([property_id])
-            
-            # Auto-assign agent
-            agent = find_best_agent(lead)
-            if agent:
-                lead.assigned_agent_id = agent.id
-            
-            db.session.add(lead)
-            db.session.flush()
-        
-        # Create interaction record
-        interaction = Interaction()
-        interaction.lead_id = lead.id
-        interaction.type = 'message'
-        interaction.channel = 'instagram'
-        interaction.direction = 'inbound'
-        interaction.message = message
-        interaction.is_automated = False
-        
-        db.session.add(interaction)
-        
-        # Update lead score
-        lead.update_score()
-        
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'lead': lead.to_dict(),
-            'is_new_lead': existing_lead is None
-        })
+        return receive_inquiry('instagram', data)
         
     except Exception as e:
         db.session.rollback()
@@ -344,110 +411,111 @@ def handle_whatsapp_inquiry():
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
-        whatsapp_number = data.get('whatsapp_number')
-        message = data.get('message')
-        name = data.get('name')
-        
-        if not whatsapp_number or not message:
+        if not data.get('whatsapp_number') or not data.get('message'):
             return jsonify({'error': 'WhatsApp number and message are required'}), 400
         
-        # Check if lead already exists
-        existing_lead = Lead.query.filter_by(whatsapp_number=whatsapp_number).first()
+        return receive_inquiry('whatsapp', data)
         
-        if existing_lead:
-            lead = existing_lead
-            lead.last_contact_at = datetime.utcnow()
-            if name and not lead.name:
-                lead.name = name
-        else:
-            # Create new lead
-            lead = Lead()
-            lead.whatsapp_number = whatsapp_number
-            lead.name = name
-            lead.source = 'whatsapp'
-            lead.original_message = message
-            lead.status = 'new'
-            
-            # Auto-assign agent
-            agent = find_best_agent(lead)
-            if agent:
-                lead.assigned_agent_id = agent.id
-            
-            db.session.add(lead)
-            db.session.flush()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+def receive_inquiry(channel, data):
+    """
+    Queue a validated inquiry, or process it inline when the queue is disabled.
+    
+    Queued inquiries are acknowledged with 202 as soon as the raw payload is
+    stored; the worker pool creates/updates the lead. The idempotency key is
+    taken from the Idempotency-Key header, or the payload's idempotency_key
+    or message_id, so redelivered webhooks are only applied once.
+    """
+    idempotency_key = (request.headers.get('Idempotency-Key')
+                       or data.get('idempotency_key') or data.get('message_id'))
+    sender = str(data[CHANNEL_KEYS[channel]])
+    
+    if ASYNC_INQUIRIES:
+        entry_id, duplicate = get_inquiry_queue().enqueue(channel, sender, data, idempotency_key)
+        return jsonify({
+            'success': True,
+            'queued': True,
+            'queue_id': entry_id,
+            'duplicate': duplicate
+        }), 202
+    
+    result = ingest_inquiries([dict(data, channel=channel, idempotency_key=idempotency_key)])
+    if result['errors']:
+        return jsonify({'error': result['errors'][0]['error']}), 400
+    
+    outcome = result['results'][0]
+    lead = Lead.query.options(*LEAD_LIST_OPTIONS).get(outcome['lead_id'])
+    return jsonify({
+        'success': True,
+        'lead': lead.to_dict(),
+        'is_new_lead': outcome['is_new_lead'],
+        'duplicate': outcome['duplicate']
+    })
+
+@leads_bp.route('/leads/queue/stats', methods=['GET'])
+def get_inquiry_queue_stats():
+    """Get inquiry queue depth, processing lag and worker counters"""
+    try:
+        return jsonify({
+            'success': True,
+            'queue': inquiry_queue_stats()
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@leads_bp.route('/leads/bulk', methods=['POST'])
+def bulk_ingest_inquiries():
+    """
+    Create or update leads for a batch of Instagram/WhatsApp inquiries.
+    
+    Accepts a JSON array of inquiries (or {"inquiries": [...]}) in the same
+    shape as the instagram/whatsapp inquiry endpoints, plus a "channel" field
+    when the sender field alone is ambiguous. The batch is committed in one
+    transaction; invalid inquiries are skipped and listed under "errors".
+    """
+    try:
+        data = request.get_json()
+        inquiries = data.get('inquiries') if isinstance(data, dict) else data
         
-        # Create interaction record
-        interaction = Interaction()
-        interaction.lead_id = lead.id
-        interaction.type = 'message'
-        interaction.channel = 'whatsapp'
-        interaction.direction = 'inbound'
-        interaction.message = message
-        interaction.is_automated = False
+        if not inquiries or not isinstance(inquiries, list):
+            return jsonify({'error': 'A non-empty list of inquiries is required'}), 400
+        if len(inquiries) > MAX_BULK_INQUIRIES:
+            return jsonify({'error': f'At most {MAX_BULK_INQUIRIES} inquiries per request'}), 400
         
-        db.session.add(interaction)
+        result = ingest_inquiries(inquiries)
         
-        # Update lead score
-        lead.update_score()
-        
-        db.session.commit()
+        return jsonify(dict(result, success=True))
         
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@leads_bp.route('/leads/rescore', methods=['POST'])
+def rescore_all_leads():
+    """Apply recency decay to all lead scores (run on a schedule, e.g. hourly)"""
+    try:
+        rescored = rescore_leads()
+        analytics_cache.bump()
         return jsonify({
             'success': True,
-            'lead': lead.to_dict(),
-            'is_new_lead': existing_lead is None
+            'rescored_count': rescored
         })
-        
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 def find_best_agent(lead):
-    """Find the best available agent for a lead"""
+    """
+    Find the best available agent for a lead.
+    
+    Uses the cached routing table, so no queries are issued per agent. Returns
+    the agent's routing entry (with id and name), or None if nobody is available.
+    """
     try:
-        # Get all active agents who can take more leads
-        available_agents = Agent.query.filter_by(is_active=True).all()
-        available_agents = [agent for agent in available_agents if agent.can_take_lead()]
-        
-        if not available_agents:
-            return None
-        
-        # Score agents based on specialization and workload
-        best_agent = None
-        best_score = -1
-        
-        for agent in available_agents:
-            score = 0
-            
-            # Specialization match
-            if lead.preferred_areas and agent.specialization_areas:
-                agent_areas = json.loads(agent.specialization_areas)
-                lead_areas = json.loads(lead.preferred_areas)
-                if any(area in agent_areas for area in lead_areas):
-                    score += 20
-            
-            if lead.property_type and agent.specialization_types:
-                agent_types = json.loads(agent.specialization_types)
-                if lead.property_type in agent_types:
-                    score += 15
-            
-            # Workload (prefer agents with fewer current leads)
-            current_leads = len(agent.leads)
-            workload_score = max(0, 10 - current_leads)
-            score += workload_score
-            
-            # Performance (conversion rate)
-            if agent.total_leads > 0:
-                conversion_rate = agent.converted_leads / agent.total_leads
-                score += conversion_rate * 10
-            
-            if score > best_score:
-                best_score = score
-                best_agent = agent
-        
-        return best_agent
-        
+        return routing_table.find_best_agent(lead)
     except Exception as e:
         print(f"Error finding best agent: {e}")
         return None
-
@@ -0,0 +1,155 @@
+import math
+import re
+import unicodedata
+from typing import List, Dict, Any, Optional
+from .listing_store import extract_price
+
+# Relative tolerances for treating two listings as the same flat
+AREA_TOLERANCE = 0.03
+PRICE_TOLERANCE = 0.05
+
+# Preferred source for the canonical copy when variants are equally complete
+SOURCE_PRIORITY = ['28hse', 'centaline', 'squarefoot']
+
+NON_WORD_PATTERN = re.compile(r'[\W_]+')
+NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+
+def normalize_text(value: Any) -> str:
+    """Fold width and case and drop whitespace/punctuation ("太古城 (第1期)" -> "太古城第1期")."""
+    text = unicodedata.normalize('NFKC', str(value or '')).lower()
+    return NON_WORD_PATTERN.sub('', text)
+
+def parse_area(value: Any) -> Optional[float]:
+    """Parse a saleable area such as "1,200呎" or "650 sq ft" into square feet."""
+    if isinstance(value, (int, float)):
+        return float(value) if value > 0 else None
+    match = NUMBER_PATTERN.search(str(value or '').replace(',', ''))
+    if not match:
+        return None
+    area = float(match.group(0))
+    return area if area > 0 else None
+
+def area_bucket(area: float) -> int:
+    """
+    Logarithmic area bucket, sized so any two areas within AREA_TOLERANCE of
+    each other land in the same or adjacent buckets.
+    """
+    return int(math.log(area) / -math.log(1 - AREA_TOLERANCE))
+
+def _within(a: float, b: float, tolerance: float) -> bool:
+    return abs(a - b) <= tolerance * max(a, b)
+
+class _SourceClusters:
+    """Disjoint sets of listings that never hold two listings from the same source."""
+
+    def __init__(self, sources: List[str]):
+        self.parent = list(range(len(sources)))
+        self.sources = [{source} for source in sources]
+
+    def find(self, item: int) -> int:
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, a: int, b: int) -> bool:
+        root_a, root_b = sorted((self.find(a), self.find(b)))
+        if root_a == root_b or self.sources[root_a] & self.sources[root_b]:
+            return False
+        self.parent[root_b] = root_a
+        self.sources[root_a] |= self.sources[root_b]
+        return True
+
+def deduplicate_listings(listings_by_source: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Collapse copies of the same flat listed on several sources.
+
+    Listings are blocked on normalized development and a saleable area bucket,
+    and only listings in the same or a neighbouring bucket are compared, so
+    the work stays close to linear instead of comparing every pair. Two
+    listings from different sources match when their saleable areas are
+    within tolerance, their floors and prices do not disagree, and at least
+    one of floor or price is present on both and agrees. Matches are merged
+    closest first, and a group never takes two listings from the same
+    source, so a chain of near matches cannot swallow a whole estate.
+    Listings without a development or saleable area are passed through
+    unchanged.
+
+    Args:
+        listings_by_source: Listing rows keyed by source name
+
+    Returns:
+        List[Dict[str, Any]]: One canonical listing per flat, each carrying
+        "sources" and "variants" (every source copy, canonical included)
+    """
+    listings = []
+    for source_name, rows in listings_by_source.items():
+        for row in rows:
+            listings.append(dict(row, source=source_name))
+
+    keys = []
+    blocks = {}
+    for index, listing in enumerate(listings):
+        development = normalize_text(listing.get('development'))
+        area = parse_area(listing.get('saleable_area'))
+        key = {
+            'source': listing['source'],
+            'development': development,
+            'floor': normalize_text(listing.get('floor')),
+            'area': area,
+            'price': extract_price(listing.get('price', '0'))
+        }
+        keys.append(key)
+        if development and area:
+            blocks.setdefault((development, area_bucket(area)), []).append(index)
+
+    matches = set()
+    for (development, bucket), members in blocks.items():
+        for neighbour in (bucket - 1, bucket, bucket + 1):
+            for a in members:
+                for b in blocks.get((development, neighbour), []):
+                    if a < b and _is_same_flat(keys[a], keys[b]):
+                        matches.add((a, b))
+
+    clusters = _SourceClusters([listing['source'] for listing in listings])
+    for a, b in sorted(matches, key=lambda pair: (_match_distance(keys[pair[0]], keys[pair[1]]), pair)):
+        clusters.union(a, b)
+
+    groups = {}
+    for index in range(len(listings)):
+        groups.setdefault(clusters.find(index), []).append(listings[index])
+
+    return [_canonical_listing(variants) for _, variants in sorted(groups.items())]
+
+def _is_same_flat(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    if a['source'] == b['source']:
+        return False
+    if not _within(a['area'], b['area'], AREA_TOLERANCE):
+        return False
+
+    floor_known = bool(a['floor'] and b['floor'])
+    if floor_known and a['floor'] != b['floor']:
+        return False
+    price_known = bool(a['price'] and b['price'])
+    if price_known and not _within(a['price'], b['price'], PRICE_TOLERANCE):
+        return False
+    return floor_known or price_known
+
+def _match_distance(a: Dict[str, Any], b: Dict[str, Any]) -> float:
+    """Relative area and price difference of a matching pair; a missing price counts as the full tolerance."""
+    distance = abs(a['area'] - b['area']) / max(a['area'], b['area'])
+    if a['price'] and b['price']:
+        return distance + abs(a['price'] - b['price']) / max(a['price'], b['price'])
+    return distance + PRICE_TOLERANCE
+
+def _canonical_listing(variants: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Pick the most complete variant as the canonical copy and attach all variants."""
+    def completeness(listing):
+        filled = sum(1 for value in listing.values() if value not in (None, ''))
+        priority = SOURCE_PRIORITY.index(listing['source']) if listing['source'] in SOURCE_PRIORITY else len(SOURCE_PRIORITY)
+        return (-filled, priority)
+
+    canonical = dict(min(variants, key=completeness))
+    canonical['sources'] = sorted({variant['source'] for variant in variants})
+    canonical['variants'] = variants
+    return canonical
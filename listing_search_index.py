@@ -0,0 +1,154 @@
+import math
+import re
+from collections import Counter
+from typing import List, Dict, Optional, Iterable, Set, Tuple
+
+HAN_CHARACTERS = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+
+# Runs of Han characters, or runs of Latin letters and digits
+TOKEN_PATTERN = re.compile(f'([{HAN_CHARACTERS}]+)|([0-9a-z]+)')
+HAN_CHARACTER_PATTERN = re.compile(f'[{HAN_CHARACTERS}]')
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into search terms.
+
+    Latin and digit runs become lowercased words. Han runs become overlapping
+    bigrams ("太古城" -> "太古", "古城"); a run of a single character is
+    kept as that character.
+
+    Args:
+        text (str): Text to tokenize
+
+    Returns:
+        List[str]: Terms in order of appearance
+    """
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        cjk_run, word = match.groups()
+        if word:
+            tokens.append(word)
+        elif len(cjk_run) == 1:
+            tokens.append(cjk_run)
+        else:
+            tokens.extend(cjk_run[i:i + 2] for i in range(len(cjk_run) - 1))
+    return tokens
+
+def _is_han_character(term: str) -> bool:
+    return len(term) == 1 and HAN_CHARACTER_PATTERN.match(term) is not None
+
+class ListingSearchIndex:
+    """
+    Inverted index with BM25 ranking, updated one document at a time.
+
+    Postings map each term to {doc_id: term frequency}. A query matches the
+    documents containing every query term; intersection starts from the rarest
+    term, so latency depends on posting sizes rather than on the total number
+    of listings.
+
+    Documents do not index the single characters of their Han bigrams;
+    a one-character query is matched through the bigrams containing that
+    character instead, so it does not inflate document lengths.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._doc_terms: Dict[int, Counter] = {}
+        self._doc_lengths: Dict[int, int] = {}
+        self._total_length = 0
+        self._bigrams_by_character: Dict[str, Set[str]] = {}
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def add(self, doc_id: int, text: str):
+        """Index a document, replacing any previous version of it."""
+        if doc_id in self._doc_terms:
+            self.remove(doc_id)
+
+        terms = Counter(tokenize(text))
+        self._doc_terms[doc_id] = terms
+        self._doc_lengths[doc_id] = sum(terms.values())
+        self._total_length += self._doc_lengths[doc_id]
+        for term, frequency in terms.items():
+            posting = self._postings.get(term)
+            if posting is None:
+                posting = self._postings[term] = {}
+                if len(term) == 2 and _is_han_character(term[0]):
+                    for character in term:
+                        self._bigrams_by_character.setdefault(character, set()).add(term)
+            posting[doc_id] = frequency
+
+    def remove(self, doc_id: int):
+        """Drop a document from the index, if present."""
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        for term in terms:
+            posting = self._postings[term]
+            del posting[doc_id]
+            if not posting:
+                del self._postings[term]
+                if len(term) == 2 and _is_han_character(term[0]):
+                    for character in term:
+                        bigrams = self._bigrams_by_character.get(character)
+                        if bigrams is not None:
+                            bigrams.discard(term)
+                            if not bigrams:
+                                del self._bigrams_by_character[character]
+
+    def search(self, query: str, candidates: Iterable[int] = None) -> Optional[List[Tuple[int, float]]]:
+        """
+        Rank the documents matching every term of a query.
+
+        Args:
+            query (str): Search query
+            candidates (Iterable[int]): Restrict results to these document ids
+
+        Returns:
+            Optional[List[Tuple[int, float]]]: (doc_id, score) pairs, best first,
+            or None when the query contains no searchable terms
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return None
+
+        postings = [self._character_posting(term) if _is_han_character(term) else self._postings.get(term)
+                    for term in terms]
+        if not all(postings):
+            return []
+
+        postings.sort(key=len)
+        matches = set(postings[0])
+        if candidates is not None:
+            matches &= set(candidates)
+        for posting in postings[1:]:
+            matches.intersection_update(posting)
+            if not matches:
+                return []
+
+        doc_count = len(self._doc_terms)
+        avg_length = self._total_length / doc_count if doc_count > 0 else 0
+        scores = dict.fromkeys(matches, 0.0)
+        for posting in postings:
+            idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id in matches:
+                frequency = posting[doc_id]
+                norm = 1 - BM25_B + BM25_B * (self._doc_lengths[doc_id] / avg_length if avg_length > 0 else 0)
+                scores[doc_id] += idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * norm)
+
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def _character_posting(self, character: str) -> Dict[int, int]:
+        """Posting for a single Han character, from its own documents and the bigrams containing it"""
+        posting = dict(self._postings.get(character, {}))
+        for bigram in self._bigrams_by_character.get(character, ()):
+            for doc_id, frequency in self._postings[bigram].items():
+                posting[doc_id] = max(posting.get(doc_id, 0), frequency)
+        return posting
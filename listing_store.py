@@ -0,0 +1,309 @@
+import base64
+import json
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Set, Iterator, Tuple
+from .listing_search_index import ListingSearchIndex
+
+# Matches the room count in values like "3", "3房2廳" or "3 bedrooms"
+ROOM_COUNT_PATTERN = re.compile(r'(\d+)')
+
+def extract_price(price: Any) -> int:
+    """Extract numeric price from a value like '$18,000' (0 when unparseable)."""
+    if isinstance(price, (int, float)):
+        return int(price)
+    try:
+        # Remove currency symbols and commas, then convert to int
+        price_clean = price.replace('$', '').replace(',', '').replace(' ', '')
+        return int(price_clean)
+    except (ValueError, AttributeError):
+        return 0
+
+def extract_room_count(rooms: str) -> Optional[int]:
+    """Extract the number of rooms from a rooms string, if present."""
+    match = ROOM_COUNT_PATTERN.search(rooms)
+    return int(match.group(1)) if match else None
+
+def encode_cursor(key: tuple, version: int = None) -> str:
+    """Encode a result position (and the store version it was ranked at) as an opaque URL-safe cursor."""
+    payload = list(key) + ([version] if version is not None else [])
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str) -> Tuple[tuple, Optional[int]]:
+    """Decode a cursor produced by encode_cursor into (key, version), raising ValueError if malformed."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    # Ranked cursors carry the store version their scores were computed at
+    if (not isinstance(payload, list) or not payload or payload[0] not in ('ranked', 'ordered')
+            or len(payload) != (4 if payload[0] == 'ranked' else 3)):
+        raise ValueError('Invalid cursor')
+    return tuple(payload[:3]), (payload[3] if payload[0] == 'ranked' else None)
+
+@dataclass
+class ListingRecord:
+    """A listing row with its search fields parsed once at load time."""
+    id: int
+    source: str
+    row: int
+    data: Dict[str, Any]
+    price: int
+    rooms: str
+    room_count: Optional[int]
+    title: str
+    address: str
+    development: str
+
+class ListingStore:
+    """
+    In-memory listing store with pre-parsed fields and secondary indexes.
+
+    Rows are normalized once when a source snapshot is loaded: prices become
+    integers, room counts are parsed and text fields are lowercased. Filters
+    are answered from a sorted price index and inverted indexes on development
+    and rooms, so a search intersects small id sets instead of scanning and
+    re-parsing every listing. Free-text queries go through a BM25 full-text
+    index that is updated row by row along with the other indexes.
+
+    Every change bumps the store version. BM25 scores depend on the whole
+    corpus, so ranked cursors are only valid at the version they were
+    issued at.
+    """
+
+    def __init__(self):
+        self._records: Dict[int, ListingRecord] = {}
+        self._keys: Dict[tuple, int] = {}  # (source, row) -> record id
+        self._source_rank: Dict[str, int] = {}
+        self._next_id = 0
+
+        self._development_index: Dict[str, Set[int]] = {}
+        self._rooms_index: Dict[str, Set[int]] = {}
+        self._room_count_index: Dict[int, Set[int]] = {}
+        self._price_index: List[tuple] = []  # sorted (price, id)
+        self._price_index_dirty = False
+        self._search_index = ListingSearchIndex()
+        self.version = 0
+
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._records)
+
+    def load_source(self, source: str, listings: List[Dict[str, Any]]):
+        """Replace every row of a source with a new snapshot."""
+        with self._lock:
+            for key in [key for key in self._keys if key[0] == source]:
+                self._remove(self._keys.pop(key))
+            for row, listing in enumerate(listings):
+                self._add(source, row, listing)
+            self._price_index_dirty = True
+            self.version += 1
+
+    def upsert_row(self, source: str, row: int, listing: Dict[str, Any]):
+        """Insert or replace a single row of a source."""
+        with self._lock:
+            record_id = self._keys.pop((source, row), None)
+            if record_id is not None:
+                self._remove(record_id)
+            self._add(source, row, listing)
+            self._price_index_dirty = True
+            self.version += 1
+
+    def remove_row(self, source: str, row: int):
+        """Remove a single row of a source, if present."""
+        with self._lock:
+            record_id = self._keys.pop((source, row), None)
+            if record_id is not None:
+                self._remove(record_id)
+                self._price_index_dirty = True
+                self.version += 1
+
+    def apply_delta(self, source: str, delta: Dict[str, Any]):
+        """Apply a sheet sync delta ({"upserted": {row: listing}, "removed": [row]}) to a source."""
+        with self._lock:
+            for row in delta['removed']:
+                self.remove_row(source, row)
+            for row, listing in delta['upserted'].items():
+                self.upsert_row(source, row, listing)
+
+    def search(self, query: str = "", min_price: int = None, max_price: int = None,
+               rooms: str = None, development: str = None,
+               room_count: int = None) -> List[Dict[str, Any]]:
+        """
+        Search listings with filters.
+
+        Args:
+            query (str): Full-text query over title, address and development
+            min_price (int): Minimum price filter
+            max_price (int): Maximum price filter
+            rooms (str): Substring matched against the rooms field
+            development (str): Substring matched against the development name
+            room_count (int): Exact parsed number of rooms
+
+        Returns:
+            List[Dict[str, Any]]: Matching listings, ranked by relevance when a
+            query is given and in source/row order otherwise
+        """
+        return [listing for _, listing in self.iter_search(
+            query=query,
+            min_price=min_price,
+            max_price=max_price,
+            rooms=rooms,
+            development=development,
+            room_count=room_count
+        )]
+
+    def iter_search(self, query: str = "", min_price: int = None, max_price: int = None,
+                    rooms: str = None, development: str = None, room_count: int = None,
+                    cursor: str = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Lazily yield search results together with a cursor for each position.
+
+        Matching and ordering happen up front on record references; listing
+        dicts are only copied as the caller consumes the iterator, so large
+        result sets can be streamed without materializing them. Passing the
+        cursor of the last consumed result resumes right after it.
+
+        Args:
+            cursor (str): Cursor of the last result already seen (optional)
+
+        Returns:
+            Iterator[Tuple[str, Dict[str, Any]]]: (cursor, listing) pairs
+
+        Raises:
+            ValueError: If the cursor is malformed, from a different kind of
+                search, or ranked before the listings changed
+        """
+        after, after_version = decode_cursor(cursor) if cursor else (None, None)
+        with self._lock:
+            matches = self._ordered_matches(query, min_price, max_price, rooms, development, room_count)
+            version = self.version
+
+        start = 0
+        if after is not None:
+            if matches and matches[0][0][0] != after[0]:
+                raise ValueError('Cursor does not belong to this search')
+            if after[0] == 'ranked' and after_version != version:
+                raise ValueError('Listings have changed since this cursor was issued; restart the search')
+            start = bisect_right(matches, after, key=lambda match: match[0])
+
+        return (
+            (encode_cursor(key, version if key[0] == 'ranked' else None), dict(record.data))
+            for key, record in matches[start:]
+        )
+
+    def _ordered_matches(self, query, min_price, max_price, rooms, development, room_count):
+        """Return sorted (position key, record) pairs for a search. Caller holds the lock."""
+        candidates = self._filter_ids(min_price, max_price, rooms, development, room_count)
+
+        if query:
+            ranked = self._search_index.search(
+                query, None if candidates is self._records.keys() else candidates
+            )
+            if ranked is not None:
+                return [(('ranked', -score, record_id), self._records[record_id]) for record_id, score in ranked]
+
+            # No searchable terms (e.g. only punctuation): fall back to a substring match
+            query_lower = query.lower()
+            candidates = [
+                record_id for record_id in candidates
+                if (query_lower in self._records[record_id].title or
+                    query_lower in self._records[record_id].address or
+                    query_lower in self._records[record_id].development)
+            ]
+
+        return sorted(
+            (('ordered',) + self._order(self._records[record_id]), self._records[record_id])
+            for record_id in candidates
+        )
+
+    def _filter_ids(self, min_price, max_price, rooms, development, room_count):
+        """Intersect the id sets of every active filter, smallest first."""
+        id_sets = []
+
+        if min_price is not None or max_price is not None:
+            id_sets.append(self._ids_in_price_range(min_price, max_price))
+        if rooms:
+            id_sets.append(self._ids_matching_key(self._rooms_index, rooms))
+        if development:
+            id_sets.append(self._ids_matching_key(self._development_index, development.lower()))
+        if room_count is not None:
+            id_sets.append(self._room_count_index.get(room_count, set()))
+
+        if not id_sets:
+            return self._records.keys()
+
+        id_sets.sort(key=len)
+        result = set(id_sets[0])
+        for ids in id_sets[1:]:
+            result &= ids
+            if not result:
+                break
+        return result
+
+    def _ids_in_price_range(self, min_price, max_price) -> Set[int]:
+        if self._price_index_dirty:
+            self._price_index = sorted((record.price, record.id) for record in self._records.values())
+            self._price_index_dirty = False
+
+        start = 0 if min_price is None else bisect_left(self._price_index, (min_price, -1))
+        end = len(self._price_index) if max_price is None else bisect_right(self._price_index, (max_price, float('inf')))
+        return {record_id for _, record_id in self._price_index[start:end]}
+
+    @staticmethod
+    def _ids_matching_key(index: Dict[str, Set[int]], needle: str) -> Set[int]:
+        """Union the postings of every distinct index key containing the needle."""
+        result = set()
+        for key, ids in index.items():
+            if needle in key:
+                result |= ids
+        return result
+
+    def _order(self, record: ListingRecord):
+        return (self._source_rank[record.source], record.row)
+
+    def _add(self, source: str, row: int, listing: Dict[str, Any]):
+        if source not in self._source_rank:
+            self._source_rank[source] = len(self._source_rank)
+
+        rooms = str(listing.get('rooms', '') or '')
+        record = ListingRecord(
+            id=self._next_id,
+            source=source,
+            row=row,
+            data=dict(listing, source=source),
+            price=extract_price(listing.get('price', '0')),
+            rooms=rooms,
+            room_count=extract_room_count(rooms),
+            title=str(listing.get('title', '') or '').lower(),
+            address=str(listing.get('address', '') or '').lower(),
+            development=str(listing.get('development', '') or '').lower()
+        )
+        self._next_id += 1
+
+        self._records[record.id] = record
+        self._keys[(source, row)] = record.id
+        self._development_index.setdefault(record.development, set()).add(record.id)
+        self._rooms_index.setdefault(record.rooms, set()).add(record.id)
+        if record.room_count is not None:
+            self._room_count_index.setdefault(record.room_count, set()).add(record.id)
+        self._search_index.add(record.id, ' '.join((record.title, record.address, record.development)))
+
+    def _remove(self, record_id: int):
+        record = self._records.pop(record_id)
+        self._discard(self._development_index, record.development, record_id)
+        self._discard(self._rooms_index, record.rooms, record_id)
+        if record.room_count is not None:
+            self._discard(self._room_count_index, record.room_count, record_id)
+        self._search_index.remove(record_id)
+
+    @staticmethod
+    def _discard(index: Dict[Any, Set[int]], key: Any, record_id: int):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(record_id)
+            if not ids:
+                del index[key]
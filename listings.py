@@ -0,0 +1,110 @@
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from flask_cors import cross_origin
+from itertools import islice
+import json
+
+listings_bp = Blueprint('listings', __name__, url_prefix='/api/listings')
+
+_sheets_service = None
+
+def get_sheets_service():
+    """Create the Google Sheets service on first use so snapshots are shared across requests"""
+    global _sheets_service
+    if _sheets_service is None:
+        from src.services.google_sheets_service import GoogleSheetsService
+        _sheets_service = GoogleSheetsService()
+    return _sheets_service
+
+@listings_bp.route('/search', methods=['GET'])
+@cross_origin()
+def search_listings():
+    """
+    Search listings across all sources, streaming results as they are produced.
+
+    Query parameters:
+        query, min_price, max_price, rooms, development: search filters
+        cursor: next_cursor from the previous page (optional)
+        limit: page size (default 50, max 1000)
+        format: "json" for a chunked JSON document, "ndjson" for one JSON object per line
+    """
+    try:
+        limit = max(1, min(request.args.get('limit', 50, type=int), 1000))
+        output_format = request.args.get('format', 'json')
+
+        if output_format not in ('json', 'ndjson'):
+            return jsonify({'success': False, 'error': 'format must be json or ndjson'}), 400
+
+        try:
+            results = get_sheets_service().iter_search_properties(
+                query=request.args.get('query', ''),
+                min_price=request.args.get('min_price', type=int),
+                max_price=request.args.get('max_price', type=int),
+                rooms=request.args.get('rooms'),
+                development=request.args.get('development'),
+                cursor=request.args.get('cursor')
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        # Fetch one extra result to know whether another page exists
+        page = islice(results, limit + 1)
+
+        if output_format == 'ndjson':
+            body = _stream_ndjson(page, limit)
+            mimetype = 'application/x-ndjson'
+        else:
+            body = _stream_json(page, limit)
+            mimetype = 'application/json'
+
+        return Response(stream_with_context(body), mimetype=mimetype)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@listings_bp.route('/sync', methods=['POST'])
+@cross_origin()
+def sync_listings():
+    """Mirror the listing sheets into the local properties table"""
+    try:
+        result = get_sheets_service().sync_to_database()
+        return jsonify({
+            'success': True,
+            'data': result
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def _paginate(page, limit):
+    """Yield listings up to the limit, then the cursor for the next page (None on the last page)"""
+    last_cursor = None
+    for count, (cursor, listing) in enumerate(page):
+        if count == limit:
+            yield None, last_cursor
+            return
+        last_cursor = cursor
+        yield listing, None
+    yield None, None
+
+def _stream_ndjson(page, limit):
+    count = 0
+    for listing, next_cursor in _paginate(page, limit):
+        if listing is None:
+            yield json.dumps({'type': 'end', 'count': count, 'next_cursor': next_cursor}) + '\n'
+        else:
+            count += 1
+            yield json.dumps({'type': 'listing', 'data': listing}, ensure_ascii=False) + '\n'
+
+def _stream_json(page, limit):
+    count = 0
+    yield '{"success": true, "listings": ['
+    for listing, next_cursor in _paginate(page, limit):
+        if listing is None:
+            yield '], ' + json.dumps({'count': count, 'next_cursor': next_cursor})[1:]
+        else:
+            yield (',' if count else '') + json.dumps(listing, ensure_ascii=False)
+            count += 1
@@ -16,6 +16,7 @@ app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 # db.init_app(app)
 # with app.app_context():
 #     db.create_all()
+#     run_migrations()  # from src.models.migrations
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -0,0 +1,195 @@
+"""
+Schema migrations for databases created before a model change.
+
+db.create_all() only creates missing tables, so columns and indexes added to
+existing tables are applied here. Every step is idempotent and is recorded in
+the schema_migrations table once it has run. Call run_migrations() inside an
+application context after db.create_all().
+"""
+from sqlalchemy import inspect, text
+from src.models.lead import db, Lead, LeadListValue, AgentListValue, Interaction, Property
+from datetime import datetime
+import json
+
+# List fields that used to be JSON text columns, per table:
+# (list value model, owner key column, field names)
+JSON_LIST_COLUMNS = {
+    'leads': (LeadListValue, 'lead_id', ['interested_properties', 'preferred_areas', 'tags']),
+    'agents': (AgentListValue, 'agent_id', ['specialization_areas', 'specialization_types', 'languages']),
+}
+
+def _column_names(table):
+    # Inspect through the session's connection so a pooled checkout cannot
+    # roll back statements already run in this migration
+    return {column['name'] for column in inspect(db.session.connection()).get_columns(table)}
+
+def add_column(table, name, ddl):
+    """Add a column unless it already exists"""
+    if name not in _column_names(table):
+        db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {name} {ddl}'))
+
+def create_index(name, table, columns):
+    """Create an index unless it already exists"""
+    db.session.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({", ".join(columns)})'))
+
+def _has_unique_key(table, columns):
+    """Whether a unique constraint or unique index covers exactly these columns"""
+    inspector = inspect(db.session.connection())
+    keys = [constraint['column_names'] for constraint in inspector.get_unique_constraints(table)]
+    keys += [index['column_names'] for index in inspector.get_indexes(table) if index['unique']]
+    return list(columns) in keys
+
+def create_model_indexes(*models):
+    """Create every index declared in the models' __table_args__ that is missing"""
+    connection = db.session.connection()
+    for model in models:
+        for index in model.__table__.indexes:
+            index.create(bind=connection, checkfirst=True)
+
+def migrate_incremental_lead_scores():
+    """Add the lead score component columns and backfill them"""
+    add_column('leads', 'profile_score', 'INTEGER DEFAULT 0')
+    add_column('leads', 'interaction_count', 'INTEGER DEFAULT 0')
+    add_column('leads', 'recency_score', 'INTEGER DEFAULT 0')
+    db.session.flush()
+
+    db.session.execute(text(
+        'UPDATE leads SET interaction_count = '
+        '(SELECT COUNT(*) FROM interactions WHERE interactions.lead_id = leads.id)'
+    ))
+
+    # Profile points need the JSON fields parsed, so backfill them in Python
+    for lead in Lead.query.yield_per(1000):
+        lead.update_score()
+    db.session.flush()
+
+def migrate_lead_contact_indexes():
+    """Index the sender lookups used when ingesting inquiries"""
+    create_index('ix_leads_instagram_handle', 'leads', ['instagram_handle'])
+    create_index('ix_leads_whatsapp_number', 'leads', ['whatsapp_number'])
+
+def migrate_crm_query_indexes():
+    """Add the composite indexes behind the lead, agent and analytics queries"""
+    create_model_indexes(Lead, Interaction, Property)
+
+def _json_list(raw):
+    """Distinct string values of a legacy JSON array column ([] if unparseable)"""
+    try:
+        values = json.loads(raw) if raw else []
+    except ValueError:
+        return []
+    if not isinstance(values, list):
+        values = [values]
+    return list(dict.fromkeys(str(value) for value in values if value not in (None, '')))
+
+def migrate_list_fields_to_tables():
+    """
+    Copy the JSON list columns into the list value tables.
+
+    The old text columns are left in place but are no longer mapped. Lead
+    profile scores are recomputed afterwards, since they count list entries.
+    """
+    for table, (value_model, owner_key, fields) in JSON_LIST_COLUMNS.items():
+        legacy_fields = [field for field in fields if field in _column_names(table)]
+        if not legacy_fields:
+            continue
+
+        values = []
+        rows = db.session.execute(text(f'SELECT id, {", ".join(legacy_fields)} FROM {table}'))
+        for row in rows:
+            for field, raw in zip(legacy_fields, row[1:]):
+                for position, value in enumerate(_json_list(raw)):
+                    values.append({owner_key: row[0], 'field': field, 'value': value, 'position': position})
+        if values:
+            db.session.execute(value_model.__table__.insert(), values)
+
+    db.session.flush()
+    db.session.expire_all()
+    for lead in Lead.query.yield_per(1000):
+        lead.update_profile_score()
+        lead.refresh_score()
+    db.session.flush()
+
+def migrate_daily_rollups():
+    """Fill the daily analytics rollup tables from the existing leads and interactions"""
+    from src.services.analytics_rollups import rebuild_rollups
+    rebuild_rollups(db.session.connection())
+
+def migrate_property_performance_index():
+    """Replace the property inquiry index with one covering the property performance query"""
+    db.session.execute(text('DROP INDEX IF EXISTS ix_leads_source_property_created'))
+    create_model_indexes(Lead)
+
+def migrate_lead_count_rollups():
+    """Fill the current lead count table from the existing leads"""
+    from src.services.analytics_rollups import rebuild_lead_counts
+    rebuild_lead_counts(db.session.connection())
+
+def migrate_lead_count_score_totals():
+    """Add the current score totals to the lead count table and refill it"""
+    from src.services.analytics_rollups import rebuild_lead_counts
+    add_column('lead_count_rollups', 'score_total', 'INTEGER DEFAULT 0')
+    db.session.flush()
+    rebuild_lead_counts(db.session.connection())
+
+def migrate_property_source_key():
+    """
+    Make (source, source_id) unique on properties tables created before the
+    constraint, keeping the oldest row of each duplicated listing.
+    """
+    if _has_unique_key('properties', ['source', 'source_id']):
+        return
+
+    db.session.execute(text(
+        'DELETE FROM properties WHERE source_id IS NOT NULL AND id NOT IN '
+        '(SELECT MIN(id) FROM properties WHERE source_id IS NOT NULL GROUP BY source, source_id)'
+    ))
+    db.session.execute(text(
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_properties_source_source_id ON properties (source, source_id)'
+    ))
+
+# Ordered (name, step) pairs; append new migrations to the end
+MIGRATIONS = [
+    ('0001_incremental_lead_scores', migrate_incremental_lead_scores),
+    ('0002_lead_contact_indexes', migrate_lead_contact_indexes),
+    ('0003_crm_query_indexes', migrate_crm_query_indexes),
+    ('0004_list_fields_to_tables', migrate_list_fields_to_tables),
+    ('0005_daily_rollups', migrate_daily_rollups),
+    ('0006_property_performance_index', migrate_property_performance_index),
+    ('0007_lead_count_rollups', migrate_lead_count_rollups),
+    ('0008_lead_count_score_totals', migrate_lead_count_score_totals),
+    ('0009_property_source_key', migrate_property_source_key),
+]
+
+def run_migrations():
+    """
+    Apply every migration that has not run yet.
+
+    Returns:
+        list: Names of the migrations applied
+    """
+    db.session.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migrations ('
+        'name VARCHAR(100) PRIMARY KEY, applied_at TIMESTAMP NOT NULL)'
+    ))
+    db.session.commit()
+
+    applied = {row[0] for row in db.session.execute(text('SELECT name FROM schema_migrations'))}
+    newly_applied = []
+
+    for name, step in MIGRATIONS:
+        if name in applied:
+            continue
+        try:
+            step()
+            db.session.execute(
+                text('INSERT INTO schema_migrations (name, applied_at) VALUES (:name, :applied_at)'),
+                {'name': name, 'applied_at': datetime.utcnow()}
+            )
+            db.session.commit()
+            newly_applied.append(name)
+        except Exception:
+            db.session.rollback()
+            raise
+
+    return newly_applied
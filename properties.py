@@ -1,11 +1,59 @@
 from flask import Blueprint, jsonify, request
 from flask_cors import cross_origin
+from src.models.lead import db, Property
+from sqlalchemy import func, case, and_, or_
 import requests
 import json
 from datetime import datetime
 
 properties_bp = Blueprint('properties', __name__, url_prefix='/api/properties')
 
+# Dashboard status derived from the content pipeline: posted to Instagram,
+# enriched and awaiting posting, or not yet processed
+PROPERTY_STATUS = case(
+    (and_(Property.instagram_posts.isnot(None), Property.instagram_posts != '[]'), 'published'),
+    (and_(Property.enriched_images.isnot(None), Property.enriched_images != '[]'), 'pending'),
+    else_='draft'
+)
+
+def serialize_property(prop, status, detail=False):
+    """Shape a Property row for the dashboard"""
+    images = json.loads(prop.images) if prop.images else []
+    posts = json.loads(prop.instagram_posts) if prop.instagram_posts else []
+    data = {
+        'id': prop.id,
+        'title': prop.title,
+        'location': prop.address or prop.area,
+        'development': prop.development,
+        'price': prop.price,
+        'currency': 'HKD',
+        'period': 'month',
+        'bedrooms': prop.bedrooms,
+        'bathrooms': prop.bathrooms,
+        'area': prop.saleable_area,
+        'image': images[0] if images else None,
+        'source': prop.source,
+        'status': status,
+        'engagement': {
+            'views': prop.total_views or 0,
+            'inquiries': prop.total_inquiries or 0
+        },
+        'instagram_posts': posts,
+        'listing_url': prop.listing_url,
+        'scraped_at': prop.scraped_at.isoformat() if prop.scraped_at else None
+    }
+    if detail:
+        data['images'] = images
+        data['enriched_images'] = json.loads(prop.enriched_images) if prop.enriched_images else []
+        data['floor'] = prop.floor
+        data['gross_area'] = prop.gross_area
+        data['agent'] = {
+            'name': prop.agent_name,
+            'phone': prop.agent_phone,
+            'agency': prop.agent_agency
+        }
+    return data
+
 @properties_bp.route('/', methods=['GET'])
 @cross_origin()
 def get_properties():
@@ -15,148 +63,58 @@ def get_properties():
         search = request.args.get('search', '')
         status = request.args.get('status', 'all')
         source = request.args.get('source', 'all')
-        page = int(request.args.get('page', 1))
-        limit = int(request.args.get('limit', 20))
+        page = max(int(request.args.get('page', 1)), 1)
+        limit = max(min(int(request.args.get('limit', 20)), 100), 1)
+        cursor = request.args.get('cursor', type=int)
         
-        # Mock properties data
-        properties = [
-            {
-                'id': 1,
-                'title': 'Modern 2BR Apartment in Central',
-                'location': 'Central, Hong Kong Island',
-                'price': 45000,
-                'currency': 'HKD',
-                'period': 'month',
-                'bedrooms': 2,
-                'bathrooms': 2,
-                'area': 800,
-                'image': '/api/placeholder/400/300',
-                'source': '28hse',
-                'status': 'published',
-                'engagement': {
-                    'views': 1250,
-                    'likes': 89,
-                    'comments': 12,
-                    'shares': 5
-                },
-                'ai_generated': {
-                    'caption': 'Stunning modern apartment in the heart of Central! ✨ This beautifully designed 2-bedroom unit offers breathtaking city views and premium finishes. Perfect for professionals seeking luxury living in Hong Kong\'s financial district. 🏙️ #CentralLiving #ModernApartment #HongKongRental',
-                    'hashtags': ['#CentralLiving', '#ModernApartment', '#HongKongRental', '#LuxuryLiving', '#CityViews'],
-                    'style': 'engaging'
-                },
-                'posted_at': '2024-01-15T10:30:00Z',
-                'scraped_at': '2024-01-15T09:15:00Z'
-            },
-            {
-                'id': 2,
-                'title': 'Cozy Studio in Causeway Bay',
-                'location': 'Causeway Bay, Hong Kong Island',
-                'price': 28000,
-                'currency': 'HKD',
-                'period': 'month',
-                'bedrooms': 0,
-                'bathrooms': 1,
-                'area': 450,
-                'image': '/api/placeholder/400/300',
-                'source': 'squarefoot',
-                'status': 'pending',
-                'engagement': {
-                    'views': 0,
-                    'likes': 0,
-                    'comments': 0,
-                    'shares': 0
-                },
-                'ai_generated': {
-                    'caption': 'Charming studio apartment in vibrant Causeway Bay! 🌟 Perfectly located near shopping and dining, this cozy space is ideal for young professionals. Efficient layout maximizes every square foot. 🏠 #CausewayBay #StudioApartment #ConvenientLiving',
-                    'hashtags': ['#CausewayBay', '#StudioApartment', '#ConvenientLiving', '#YoungProfessionals'],
-                    'style': 'professional'
-                },
-                'posted_at': None,
-                'scraped_at': '2024-01-15T11:45:00Z'
-            },
-            {
-                'id': 3,
-                'title': 'Luxury 3BR Penthouse in Mid-Levels',
-                'location': 'Mid-Levels, Hong Kong Island',
-                'price': 85000,
-                'currency': 'HKD',
-                'period': 'month',
-                'bedrooms': 3,
-                'bathrooms': 3,
-                'area': 1200,
-                'image': '/api/placeholder/400/300',
-                'source': 'centaline',
-                'status': 'published',
-                'engagement': {
-                    'views': 2100,
-                    'likes': 156,
-                    'comments': 28,
-                    'shares': 15
-                },
-                'ai_generated': {
-                    'caption': 'Exclusive penthouse living in prestigious Mid-Levels! 🏙️ This magnificent 3-bedroom residence features panoramic harbor views, premium appliances, and elegant finishes throughout. Experience the pinnacle of Hong Kong luxury. ✨ #MidLevels #PenthouseLiving #LuxuryRental',
-                    'hashtags': ['#MidLevels', '#PenthouseLiving', '#LuxuryRental', '#HarborViews', '#Exclusive'],
-                    'style': 'professional'
-                },
-                'posted_at': '2024-01-14T16:20:00Z',
-                'scraped_at': '2024-01-14T15:30:00Z'
-            },
-            {
-                'id': 4,
-                'title': 'Spacious Family Home in Tai Koo',
-                'location': 'Tai Koo, Hong Kong Island',
-                'price': 55000,
-                'currency': 'HKD',
-                'period': 'month',
-                'bedrooms': 3,
-                'bathrooms': 2,
-                'area': 950,
-                'image': '/api/placeholder/400/300',
-                'source': '28hse',
-                'status': 'draft',
-                'engagement': {
-                    'views': 0,
-                    'likes': 0,
-                    'comments': 0,
-                    'shares': 0
-                },
-                'ai_generated': {
-                    'caption': 'Perfect family home in peaceful Tai Koo! 🏡 This spacious 3-bedroom apartment offers comfort and convenience for growing families. Close to schools, parks, and MTR station. Your family\'s new chapter starts here! 👨‍👩‍👧‍👦 #TaiKoo #FamilyHome #SpaciousLiving',
-                    'hashtags': ['#TaiKoo', '#FamilyHome', '#SpaciousLiving', '#FamilyFriendly', '#Convenient'],
-                    'style': 'casual'
-                },
-                'posted_at': None,
-                'scraped_at': '2024-01-15T12:00:00Z'
-            }
-        ]
+        query = db.session.query(Property, PROPERTY_STATUS.label('status')).filter(
+            Property.is_active.is_(True)
+        )
         
         # Apply filters
-        filtered_properties = properties
-        
         if search:
-            filtered_properties = [p for p in filtered_properties 
-                                 if search.lower() in p['title'].lower() or 
-                                    search.lower() in p['location'].lower()]
+            pattern = f'%{search}%'
+            query = query.filter(or_(
+                Property.title.ilike(pattern),
+                Property.address.ilike(pattern),
+                Property.area.ilike(pattern)
+            ))
         
         if status != 'all':
-            filtered_properties = [p for p in filtered_properties if p['status'] == status]
+            query = query.filter(PROPERTY_STATUS == status)
             
         if source != 'all':
-            filtered_properties = [p for p in filtered_properties if p['source'] == source]
+            query = query.filter(Property.source == source)
+        
+        query = query.order_by(Property.id.desc())
+        
+        if cursor is not None:
+            # Keyset pagination: continue below the last id of the previous page
+            rows = query.filter(Property.id < cursor).limit(limit + 1).all()
+            has_next = len(rows) > limit
+            rows = rows[:limit]
+            
+            return jsonify({
+                'success': True,
+                'data': {
+                    'properties': [serialize_property(prop, prop_status) for prop, prop_status in rows],
+                    'limit': limit,
+                    'next_cursor': rows[-1][0].id if has_next else None
+                }
+            })
         
-        # Apply pagination
-        start = (page - 1) * limit
-        end = start + limit
-        paginated_properties = filtered_properties[start:end]
+        total = query.order_by(None).count()
+        rows = query.offset((page - 1) * limit).limit(limit).all()
         
         return jsonify({
             'success': True,
             'data': {
-                'properties': paginated_properties,
-                'total': len(filtered_properties),
+                'properties': [serialize_property(prop, prop_status) for prop, prop_status in rows],
+                'total': total,
                 'page': page,
                 'limit': limit,
-                'total_pages': (len(filtered_properties) + limit - 1) // limit
+                'total_pages': (total + limit - 1) // limit,
+                'next_cursor': rows[-1][0].id if rows and page * limit < total else None
             }
         })
     except Exception as e:
@@ -170,44 +128,19 @@ def get_properties():
 def get_property(property_id):
     """Get a specific property by ID"""
     try:
-        # Mock property detail - in production, this would query the database
-        property_detail = {
-            'id': property_id,
-            'title': 'Modern 2BR Apartment in Central',
-            'location': 'Central, Hong Kong Island',
-            'price': 45000,
-            'currency': 'HKD',
-            'period': 'month',
-            'bedrooms': 2,
-            'bathrooms': 2,
-            'area': 800,
-            'images': [
-                '/api/placeholder/800/600',
-                '/api/placeholder/800/600',
-                '/api/placeholder/800/600'
-            ],
-            'source': '28hse',
-            'status': 'published',
-            'description': 'Beautiful modern apartment with stunning city views...',
-            'amenities': ['Air Conditioning', 'Gym', 'Swimming Pool', 'Parking'],
-            'engagement': {
-                'views': 1250,
-                'likes': 89,
-                'comments': 12,
-                'shares': 5
-            },
-            'ai_generated': {
-                'caption': 'Stunning modern apartment in the heart of Central! ✨',
-                'hashtags': ['#CentralLiving', '#ModernApartment'],
-                'style': 'engaging'
-            },
-            'posted_at': '2024-01-15T10:30:00Z',
-            'scraped_at': '2024-01-15T09:15:00Z'
-        }
+        row = db.session.query(Property, PROPERTY_STATUS.label('status')).filter(
+            Property.id == property_id
+        ).first()
+        
+        if row is None:
+            return jsonify({
+                'success': False,
+                'error': 'Property not found'
+            }), 404
         
         return jsonify({
             'success': True,
-            'data': property_detail
+            'data': serialize_property(row[0], row[1], detail=True)
         })
     except Exception as e:
         return jsonify({
@@ -271,20 +204,39 @@ def generate_content(property_id):
 def get_property_stats():
     """Get property statistics"""
     try:
+        active = Property.is_active.is_(True)
+        
+        # Totals and status breakdown in one grouped query
+        by_status = dict(
+            db.session.query(PROPERTY_STATUS, func.count(Property.id))
+            .filter(active)
+            .group_by(PROPERTY_STATUS)
+            .all()
+        )
+        
+        by_source = dict(
+            db.session.query(Property.source, func.count(Property.id))
+            .filter(active)
+            .group_by(Property.source)
+            .all()
+        )
+        
+        avg_engagement = db.session.query(func.avg(Property.total_views)).filter(active).scalar()
+        
+        top_performing = db.session.query(
+            Property.id, Property.title, Property.total_views
+        ).filter(active).order_by(Property.total_views.desc()).limit(5).all()
+        
         stats = {
-            'total_properties': 342,
-            'published': 156,
-            'pending': 89,
-            'draft': 97,
-            'by_source': {
-                '28hse': 145,
-                'squarefoot': 112,
-                'centaline': 85
-            },
-            'avg_engagement': 8.7,
+            'total_properties': sum(by_status.values()),
+            'published': by_status.get('published', 0),
+            'pending': by_status.get('pending', 0),
+            'draft': by_status.get('draft', 0),
+            'by_source': by_source,
+            'avg_engagement': round(avg_engagement or 0, 2),
             'top_performing': [
-                {'id': 3, 'title': 'Luxury 3BR Penthouse', 'engagement': 2100},
-                {'id': 1, 'title': 'Modern 2BR Apartment', 'engagement': 1250}
+                {'id': prop_id, 'title': title, 'engagement': views or 0}
+                for prop_id, title, views in top_performing
             ]
         }
         
@@ -297,4 +249,3 @@ def get_property_stats():
             'success': False,
             'error': str(e)
         }), 500
-
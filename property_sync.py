@@ -0,0 +1,145 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import List, Dict, Any
+from sqlalchemy import or_
+from src.models.lead import db, Property
+from .listing_store import extract_price, extract_room_count
+
+# Property columns refreshed from the sheets on every sync
+SYNCED_FIELDS = [
+    'title', 'development', 'address', 'area', 'bedrooms', 'saleable_area', 'gross_area',
+    'floor', 'price', 'listing_url', 'images', 'agent_name', 'agent_phone', 'agent_agency'
+]
+
+def listing_source_id(listing: Dict[str, Any]) -> str:
+    """Stable identifier for a sheet row: its id or listing URL, else a hash of its identifying fields."""
+    for key in ('id', 'listing_id', 'listing_url', 'url'):
+        value = listing.get(key)
+        if value not in (None, ''):
+            return str(value)[:100]
+    identity = [str(listing.get(key, '')) for key in ('title', 'development', 'address', 'floor', 'price')]
+    return hashlib.sha1('|'.join(identity).encode('utf-8')).hexdigest()
+
+def listing_to_property_fields(source: str, listing: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a sheet row onto Property columns."""
+    images = [listing['image_url']] if listing.get('image_url') else []
+    images.extend(
+        value for key, value in sorted(listing.items())
+        if key.startswith('image_url') and key != 'image_url' and value
+    )
+    development = str(listing.get('development', '') or '')
+
+    return {
+        'source': source,
+        'source_id': listing_source_id(listing),
+        'title': str(listing.get('title', '') or development)[:200],
+        'development': development[:100] or None,
+        'address': str(listing.get('address', '') or '')[:200] or None,
+        'area': str(listing.get('area', '') or listing.get('district', '') or '')[:50] or None,
+        'bedrooms': extract_room_count(str(listing.get('rooms', '') or '')),
+        'saleable_area': str(listing.get('saleable_area', '') or '')[:20] or None,
+        'gross_area': str(listing.get('gross_area', '') or '')[:20] or None,
+        'floor': str(listing.get('floor', '') or '')[:20] or None,
+        'price': extract_price(listing.get('price', '0')),
+        'listing_url': str(listing.get('listing_url', '') or '')[:500] or None,
+        'images': json.dumps(images) if images else None,
+        'agent_name': str(listing.get('contact_person', '') or listing.get('agent_name', '') or '')[:100] or None,
+        'agent_phone': str(listing.get('agent_phone', '') or '')[:20] or None,
+        'agent_agency': str(listing.get('agency', '') or '')[:100] or None
+    }
+
+def sync_listings_to_db(listings_by_source: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Dict[str, int]]:
+    """
+    Upsert sheet rows into the properties table, keyed on (source, source_id).
+
+    Existing rows of each source are loaded with one query and compared in
+    memory, so only new or changed properties are written. Properties that no
+    longer appear in a source's sheet are marked inactive. Everything is
+    committed in one transaction. Must run inside an application context.
+
+    Args:
+        listings_by_source: Sheet rows keyed by source name; sources left out
+            (e.g. because their sheet failed to load) are not touched
+
+    Returns:
+        Dict[str, Dict[str, int]]: Inserted/updated/unchanged/deactivated counts per source
+    """
+    now = datetime.utcnow()
+    stats = {}
+
+    try:
+        for source, listings in listings_by_source.items():
+            existing = {prop.source_id: prop for prop in Property.query.filter_by(source=source)}
+            seen = set()
+            counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deactivated': 0}
+
+            for listing in listings:
+                fields = listing_to_property_fields(source, listing)
+                if fields['source_id'] in seen:
+                    continue
+                seen.add(fields['source_id'])
+
+                prop = existing.get(fields['source_id'])
+                if prop is None:
+                    prop = Property(**fields)
+                    prop.is_active = True
+                    prop.scraped_at = now
+                    db.session.add(prop)
+                    counts['inserted'] += 1
+                elif not prop.is_active or any(getattr(prop, field) != fields[field] for field in SYNCED_FIELDS):
+                    for field in SYNCED_FIELDS:
+                        setattr(prop, field, fields[field])
+                    prop.is_active = True
+                    prop.scraped_at = now
+                    counts['updated'] += 1
+                else:
+                    counts['unchanged'] += 1
+
+            for source_id, prop in existing.items():
+                if source_id not in seen and prop.is_active:
+                    prop.is_active = False
+                    counts['deactivated'] += 1
+
+            stats[source] = counts
+
+        db.session.commit()
+        return stats
+    except Exception:
+        db.session.rollback()
+        raise
+
+def search_local_properties(query: str = "", min_price: int = None, max_price: int = None,
+                            rooms: str = None, development: str = None) -> List[Dict[str, Any]]:
+    """
+    Search the local properties mirror with the same filters as search_properties.
+
+    Must run inside an application context.
+
+    Returns:
+        List[Dict[str, Any]]: Active properties as Property.to_dict() dictionaries
+    """
+    properties = Property.query.filter(Property.is_active.is_(True))
+
+    if query:
+        pattern = f'%{query}%'
+        properties = properties.filter(or_(
+            Property.title.ilike(pattern),
+            Property.address.ilike(pattern),
+            Property.development.ilike(pattern)
+        ))
+
+    if min_price is not None:
+        properties = properties.filter(Property.price >= min_price)
+    if max_price is not None:
+        properties = properties.filter(Property.price <= max_price)
+
+    if rooms:
+        room_count = extract_room_count(rooms)
+        if room_count is not None:
+            properties = properties.filter(Property.bedrooms == room_count)
+
+    if development:
+        properties = properties.filter(Property.development.ilike(f'%{development}%'))
+
+    return [prop.to_dict() for prop in properties.order_by(Property.source, Property.id)]
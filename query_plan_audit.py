@@ -0,0 +1,208 @@
+"""
+EXPLAIN QUERY PLAN audit for the CRM endpoints.
+
+Seeds a throwaway SQLite database, calls every endpoint in AUDITED_ENDPOINTS
+through the Flask test client and runs EXPLAIN QUERY PLAN on each SELECT
+they issue. A plan step that reads a whole table (a bare "SCAN <table>",
+rather than an index search or index scan) is reported, as is any endpoint
+that does not answer with a 2xx status. The exit status is non-zero when
+anything is reported, so the audit can gate CI:
+
+    python src/query_plan_audit.py
+"""
+import os
+import sys
+# DON'T CHANGE THIS !!!
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import re
+from datetime import datetime, timedelta
+from flask import Flask
+from sqlalchemy import event
+from src.models.lead import db, Lead, Agent, Interaction, Property
+
+# (method, path, JSON body) for every audited endpoint query path
+AUDITED_ENDPOINTS = [
+    ('GET', '/api/leads', None),
+    ('GET', '/api/leads?status=new', None),
+    ('GET', '/api/leads?priority=high', None),
+    ('GET', '/api/leads?agent_id=1', None),
+    ('GET', '/api/leads?source=instagram', None),
+    ('GET', '/api/leads?cursor=&include_total=true', None),
+    ('GET', '/api/leads?status=contacted&cursor=', None),
+    ('GET', '/api/leads?interested_property=P3', None),
+    ('GET', '/api/leads?preferred_area=Central', None),
+    ('GET', '/api/leads/1', None),
+    ('GET', '/api/leads/1/interactions', None),
+    ('POST', '/api/leads/bulk', [{'instagram_handle': 'ig_1', 'message': 'Still available?'},
+                                 {'whatsapp_number': '85290000999', 'message': 'Hello'}]),
+    ('GET', '/api/agents', None),
+    ('GET', '/api/agents?area=Central', None),
+    ('GET', '/api/agents/1', None),
+    ('GET', '/api/agents/1/leads', None),
+    ('GET', '/api/agents/1/leads?status=new&cursor=', None),
+    ('GET', '/api/agents/1/performance', None),
+    ('GET', '/api/agents/1/workload', None),
+    ('GET', '/api/agents/performance?fresh=true', None),
+    ('POST', '/api/agents/auto-assign', None),
+    ('GET', '/api/analytics/dashboard', None),
+    ('GET', '/api/analytics/leads-trend', None),
+    ('GET', '/api/analytics/source-performance', None),
+    ('GET', '/api/analytics/agent-comparison', None),
+    ('GET', '/api/analytics/property-performance', None),
+    ('GET', '/api/analytics/funnel', None),
+    ('GET', '/api/analytics/lead-scoring', None),
+    ('GET', '/api/analytics/export', None),
+    ('GET', '/api/analytics/export?format=csv', None),
+    ('GET', '/api/analytics/export?format=ndjson&dataset=interactions', None),
+    ('GET', '/api/properties/', None),
+    ('GET', '/api/properties/?source=28hse&min_price=5000000', None),
+    ('GET', '/api/properties/1', None),
+    ('GET', '/api/properties/stats', None),
+]
+
+# Tables an endpoint may legitimately read in full, with the reason
+ALLOWED_FULL_SCANS = {
+    'agents': 'small dimension table; agent lists and routing read every agent',
+    'lead_count_rollups': 'one row per source/agent/status, bounded by those dimensions rather than by history',
+}
+
+FULL_SCAN_PATTERN = re.compile(r'^SCAN (\w+)$')
+
+def create_audit_app():
+    """Flask app with the CRM blueprints on an in-memory SQLite database"""
+    from src.routes.leads import leads_bp
+    from src.routes.agents import agents_bp
+    from src.routes.analytics import analytics_bp
+    from src.routes.properties import properties_bp
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    for blueprint in (leads_bp, agents_bp, analytics_bp):
+        app.register_blueprint(blueprint, url_prefix='/api')
+    app.register_blueprint(properties_bp)
+    return app
+
+def seed_audit_data(leads=200):
+    """Insert a few agents, properties, leads and interactions so every endpoint has rows to plan against"""
+    now = datetime.utcnow()
+    statuses = ['new', 'contacted', 'qualified', 'viewing_scheduled', 'applied', 'converted', 'lost']
+
+    agents = [
+        Agent(name=f'Agent {number}', email=f'agent{number}@example.com', max_leads=100,
+              specialization_areas=['Central'] if number % 2 else None)
+        for number in range(1, 6)
+    ]
+    db.session.add_all(agents)
+
+    db.session.add_all([
+        Property(title=f'Property {number}', source='28hse' if number % 2 else 'squarefoot',
+                 source_id=f'P{number}', price=4000000 + number * 100000, bedrooms=number % 4,
+                 is_active=True)
+        for number in range(1, 21)
+    ])
+    db.session.flush()
+
+    for number in range(leads):
+        lead = Lead(
+            name=f'Lead {number}',
+            instagram_handle=f'ig_{number}' if number % 2 else None,
+            whatsapp_number=None if number % 2 else f'8529000{number:04d}',
+            source='instagram' if number % 2 else 'whatsapp',
+            source_property_id=f'P{number % 20 + 1}',
+            interested_properties=[f'P{number % 20 + 1}'],
+            preferred_areas=['Central'] if number % 3 else [],
+            status=statuses[number % len(statuses)],
+            priority=['low', 'medium', 'high'][number % 3],
+            score=number % 100,
+            assigned_agent_id=agents[number % len(agents)].id if number % 4 else None,
+            created_at=now - timedelta(hours=number)
+        )
+        db.session.add(lead)
+        db.session.flush()
+        db.session.add(Interaction(
+            lead_id=lead.id, type='message', channel=lead.source, direction='outbound',
+            agent_id=lead.assigned_agent_id, created_at=lead.created_at + timedelta(minutes=30)
+        ))
+
+    db.session.commit()
+
+def find_full_scans(plan_rows):
+    """Tables read in full by an EXPLAIN QUERY PLAN result, excluding ALLOWED_FULL_SCANS"""
+    tables = []
+    for row in plan_rows:
+        match = FULL_SCAN_PATTERN.match(row[-1])
+        if match and match.group(1) not in ALLOWED_FULL_SCANS:
+            tables.append(match.group(1))
+    return tables
+
+def audit_endpoints(app, endpoints=AUDITED_ENDPOINTS):
+    """
+    Call each endpoint and explain every SELECT it runs.
+
+    Returns:
+        list: One {"endpoint", "status"} or {"endpoint", "tables", "statement", "plan"}
+        dict per problem found
+    """
+    problems = []
+    with app.app_context():
+        captured = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith(('SELECT', 'WITH')) and not executemany:
+                captured.append((statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            client = app.test_client()
+            for method, path, body in endpoints:
+                captured.clear()
+                response = client.open(path, method=method, json=body)
+                response.get_data()  # Run streamed responses to the end
+                endpoint = f'{method} {path}'
+                if not 200 <= response.status_code < 300:
+                    problems.append({'endpoint': endpoint, 'status': response.status_code,
+                                     'error': (response.get_json(silent=True) or {}).get('error')})
+
+                statements = list(captured)
+                raw = db.engine.raw_connection()
+                try:
+                    for statement, parameters in statements:
+                        plan = raw.cursor().execute(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+                        tables = find_full_scans(plan)
+                        if tables:
+                            problems.append({
+                                'endpoint': endpoint,
+                                'tables': tables,
+                                'statement': ' '.join(statement.split()),
+                                'plan': [row[-1] for row in plan]
+                            })
+                finally:
+                    raw.close()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+    return problems
+
+def main():
+    app = create_audit_app()
+    with app.app_context():
+        db.create_all()
+        seed_audit_data()
+
+    problems = audit_endpoints(app)
+    for problem in problems:
+        if 'status' in problem:
+            print(f"{problem['endpoint']}: HTTP {problem['status']} {problem.get('error') or ''}")
+        else:
+            print(f"{problem['endpoint']}: full scan of {', '.join(problem['tables'])}")
+            print(f"    {problem['statement']}")
+            for step in problem['plan']:
+                print(f"      {step}")
+
+    print(f"{len(AUDITED_ENDPOINTS)} endpoints audited, {len(problems)} problem(s)")
+    return 1 if problems else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import threading
+from collections import deque
+from typing import List, Dict, Any, Optional
+
+# Number of deltas kept for consumers that have fallen behind
+DELTA_LOG_SIZE = 64
+
+def hash_row(row: Dict[str, Any]) -> str:
+    """Stable content hash for a sheet row."""
+    return hashlib.sha1(json.dumps(row, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+class SheetSyncState:
+    """
+    Remembers what has been seen of a worksheet so refreshes can be applied as deltas.
+
+    Tracks the header, the current rows and a content hash per row. Each
+    refresh that changes anything bumps the version and records a delta of
+    upserted and removed row indexes, which consumers such as the listing
+    store replay instead of reloading the whole sheet.
+    """
+
+    def __init__(self):
+        self.header: Optional[List[str]] = None
+        self.rows: List[Dict[str, Any]] = []
+        self.row_hashes: List[str] = []
+        self.version = 0
+        self.refreshes = 0
+        self.lock = threading.Lock()
+        self._deltas = deque(maxlen=DELTA_LOG_SIZE)
+
+    @property
+    def row_count(self) -> int:
+        return len(self.rows)
+
+    def apply_full(self, header: List[str], rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Diff a full download of the sheet against the known rows.
+
+        Args:
+            header (List[str]): Column names from the header row
+            rows (List[Dict[str, Any]]): Every data row in sheet order
+
+        Returns:
+            Dict[str, Any]: Delta with "upserted" {row_index: row} and "removed" [row_index]
+        """
+        with self.lock:
+            hashes = [hash_row(row) for row in rows]
+            upserted = {
+                index: row for index, row in enumerate(rows)
+                if index >= len(self.row_hashes) or self.row_hashes[index] != hashes[index]
+            }
+            removed = list(range(len(rows), len(self.rows)))
+
+            self.header = header
+            self.refreshes += 1
+            return self._commit(list(rows), hashes, upserted, removed)
+
+    def apply_appended(self, rows: List[Dict[str, Any]], start: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Append rows fetched from below the last known row.
+
+        The fetch happens outside the lock, so another refresh may have
+        moved the state on meanwhile: rows it already appended are skipped,
+        and if the rows no longer line up (a full resync removed rows) the
+        fetched rows are dropped until the next refresh.
+
+        Args:
+            rows (List[Dict[str, Any]]): New data rows in sheet order
+            start (int): Row index the fetch started at (default: the current row count)
+
+        Returns:
+            Dict[str, Any]: Delta with the appended rows as "upserted"
+        """
+        with self.lock:
+            if start is not None:
+                rows = rows[len(self.rows) - start:] if start <= len(self.rows) else []
+            start = len(self.rows)
+            upserted = {start + offset: row for offset, row in enumerate(rows)}
+
+            self.refreshes += 1
+            return self._commit(self.rows + list(rows), self.row_hashes + [hash_row(row) for row in rows],
+                                upserted, [])
+
+    def deltas_since(self, version: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Get the deltas a consumer at the given version still has to apply.
+
+        Returns None when the log no longer reaches back that far, in which
+        case the consumer should reload all rows. Caller must hold the lock.
+        """
+        if version == self.version:
+            return []
+        if not self._deltas or self._deltas[0][0] > version + 1:
+            return None
+        return [delta for delta_version, delta in self._deltas if delta_version > version]
+
+    def _commit(self, rows, hashes, upserted, removed) -> Dict[str, Any]:
+        delta = {'upserted': upserted, 'removed': removed}
+        if upserted or removed:
+            # Publish a new list so snapshot identity changes only when content does
+            self.rows = rows
+            self.row_hashes = hashes
+            self.version += 1
+            self._deltas.append((self.version, delta))
+        return delta
@@ -0,0 +1,162 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+class SnapshotCache:
+    """
+    Per-key snapshot cache with a TTL and stale-while-revalidate refreshes.
+
+    A key that has never been loaded is fetched synchronously, once: concurrent
+    callers wait for the same load. Once a snapshot exists it is always served
+    immediately; if it is older than the TTL a single background refresh is
+    started and the stale snapshot is returned until the refresh completes. A
+    failed refresh keeps the previous snapshot, and a load that was started
+    before invalidate() is not stored.
+    """
+
+    def __init__(self, ttl_seconds: float = 300):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._refreshing = set()
+        self._loading: Dict[str, Future] = {}
+        # Bumped by invalidate(); loads started under an older generation are not stored
+        self._generation = 0
+        self._key_generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'refreshes': 0,
+            'refresh_errors': 0
+        }
+
+    def get(self, key: str, loader: Callable[[], Any]) -> Any:
+        """
+        Return the snapshot for a key, loading or refreshing it as needed.
+
+        Args:
+            key (str): Cache key (e.g. the listing source name)
+            loader (callable): Zero-argument function that fetches fresh data
+
+        Returns:
+            Any: The cached (possibly stale) snapshot
+
+        Raises:
+            Exception: Whatever the loader raises when no snapshot exists yet
+                (also raised in callers that waited for that load)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if time.monotonic() - entry['fetched_at'] < self.ttl_seconds:
+                    self._counters['hits'] += 1
+                else:
+                    self._counters['stale_hits'] += 1
+                    self._start_refresh(key, loader)
+                return entry['data']
+            self._counters['misses'] += 1
+
+            loading = self._loading.get(key)
+            if loading is None:
+                loading = self._loading[key] = Future()
+                generation = self._generation_of(key)
+            else:
+                generation = None
+
+        if generation is None:
+            return loading.result()
+
+        try:
+            data = loader()
+        except Exception as e:
+            self._finish_load(key, loading)
+            loading.set_exception(e)
+            raise
+        self._store(key, data, generation)
+        self._finish_load(key, loading)
+        loading.set_result(data)
+        return data
+
+    def peek(self, key: str) -> Optional[Any]:
+        """Return the current snapshot for a key without loading or counting."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry['data'] if entry is not None else None
+
+    def invalidate(self, key: str = None):
+        """Drop one snapshot, or all snapshots when no key is given."""
+        with self._lock:
+            if key is None:
+                self._generation += 1
+                self._entries.clear()
+                self._loading.clear()
+            else:
+                self._key_generations[key] = self._key_generations.get(key, 0) + 1
+                self._entries.pop(key, None)
+                self._loading.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the age of every cached snapshot."""
+        now = time.monotonic()
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['stale_hits'] + self._counters['misses']
+            return {
+                **self._counters,
+                'hit_rate': (self._counters['hits'] + self._counters['stale_hits']) / lookups if lookups > 0 else 0,
+                'ttl_seconds': self.ttl_seconds,
+                'entries': {
+                    key: {
+                        'age_seconds': round(now - entry['fetched_at'], 2),
+                        'is_stale': now - entry['fetched_at'] >= self.ttl_seconds,
+                        'is_refreshing': key in self._refreshing,
+                        'size': len(entry['data']) if hasattr(entry['data'], '__len__') else None
+                    }
+                    for key, entry in self._entries.items()
+                }
+            }
+
+    def _generation_of(self, key: str) -> tuple:
+        """Current generation of a key. Caller must hold the lock."""
+        return self._generation, self._key_generations.get(key, 0)
+
+    def _store(self, key: str, data: Any, generation: tuple) -> bool:
+        """Store a loaded snapshot unless the key was invalidated since the load started."""
+        with self._lock:
+            if generation != self._generation_of(key):
+                return False
+            self._entries[key] = {'data': data, 'fetched_at': time.monotonic()}
+            return True
+
+    def _finish_load(self, key: str, loading: Future):
+        with self._lock:
+            if self._loading.get(key) is loading:
+                del self._loading[key]
+
+    def _start_refresh(self, key: str, loader: Callable[[], Any]):
+        """Start a background refresh for a key. Caller must hold the lock."""
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        thread = threading.Thread(
+            target=self._refresh,
+            args=(key, loader, self._generation_of(key)),
+            name=f'snapshot-refresh-{key}',
+            daemon=True
+        )
+        thread.start()
+
+    def _refresh(self, key: str, loader: Callable[[], Any], generation: tuple):
+        try:
+            data = loader()
+            if self._store(key, data, generation):
+                with self._lock:
+                    self._counters['refreshes'] += 1
+        except Exception as e:
+            print(f"Error refreshing snapshot '{key}': {e}")
+            with self._lock:
+                self._counters['refresh_errors'] += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
@@ -0,0 +1,54 @@
+import pytest
+from flask import Flask
+from sqlalchemy import event
+from src.models.lead import db
+from src.routes.agents import agents_bp
+from src.routes.analytics import analytics_bp
+from src.routes import leads as leads_routes
+from src.routes.leads import leads_bp
+from src.routes.properties import properties_bp
+from src.services import agent_metrics
+from src.services.agent_routing import routing_table
+from src.services.analytics_cache import analytics_cache
+
+@pytest.fixture
+def app():
+    """App with every CRM blueprint on an in-memory database, with the process-wide caches reset"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    for blueprint in (leads_bp, agents_bp, analytics_bp):
+        app.register_blueprint(blueprint, url_prefix='/api')
+    app.register_blueprint(properties_bp)
+
+    routing_table.invalidate()
+    analytics_cache.bump()
+    agent_metrics._cache.clear()
+    leads_routes._lead_count_cache.clear()
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+class QueryCounter:
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, connection, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __len__(self):
+        return len(self.statements)
+
+@pytest.fixture
+def count_queries(app):
+    """Record the SQL statements run against the test database"""
+    counter = QueryCounter()
+    event.listen(db.engine, 'before_cursor_execute', counter)
+    yield counter
+    event.remove(db.engine, 'before_cursor_execute', counter)
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+from src.models.lead import db, Agent, Interaction, Lead
+
+def test_agent_comparison_is_one_query_and_not_inflated_by_interactions(client, count_queries):
+    now = datetime.utcnow()
+    chan, lee = Agent(name='Chan', email='chan@example.com'), Agent(name='Lee', email='lee@example.com')
+    db.session.add_all([chan, lee])
+    db.session.flush()
+    leads = [Lead(name='A', source='instagram', status='converted', score=80, assigned_agent=chan,
+                  created_at=now - timedelta(hours=10)),
+             Lead(name='B', source='instagram', status='new', score=40, assigned_agent=chan,
+                  created_at=now - timedelta(hours=10))]
+    db.session.add_all(leads)
+    db.session.flush()
+    db.session.add_all([
+        # Automated assignment notices go out at once and are not responses
+        Interaction(lead_id=leads[0].id, agent_id=chan.id, type='assignment', direction='outbound',
+                    is_automated=True, created_at=leads[0].created_at),
+        Interaction(lead_id=leads[1].id, agent_id=chan.id, type='assignment', direction='outbound',
+                    is_automated=True, created_at=leads[1].created_at),
+        Interaction(lead_id=leads[0].id, agent_id=chan.id, type='message', direction='outbound',
+                    is_automated=False, created_at=leads[0].created_at + timedelta(hours=2)),
+        Interaction(lead_id=leads[0].id, agent_id=chan.id, type='message', direction='outbound',
+                    is_automated=False, created_at=leads[0].created_at + timedelta(hours=5)),
+        Interaction(lead_id=leads[1].id, agent_id=chan.id, type='call', direction='outbound',
+                    is_automated=False, created_at=leads[1].created_at + timedelta(hours=4)),
+    ])
+    db.session.commit()
+    count_queries.statements.clear()
+
+    agents = client.get('/api/analytics/agent-comparison').get_json()['agent_comparison']
+
+    assert len(count_queries) == 1
+    chan_data, lee_data = agents
+    assert (chan_data['total_leads'], chan_data['converted_leads'], chan_data['conversion_rate']) == (2, 1, 50)
+    assert chan_data['avg_lead_score'] == 60
+    assert chan_data['total_interactions'] == 5
+    assert chan_data['avg_first_response_hours'] == 3
+    assert (lee_data['name'], lee_data['total_leads'], lee_data['avg_first_response_hours']) == ('Lee', 0, 0)
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+import pytest
+from src.models.lead import db, Agent, Interaction, Lead
+from src.services import agent_metrics
+
+@pytest.fixture
+def team(app):
+    """Three agents with leads in several statuses, interactions and follow-ups"""
+    now = datetime.utcnow()
+    agents = [Agent(name=f'Agent {number}', email=f'agent{number}@example.com', max_leads=4) for number in range(3)]
+    db.session.add_all(agents)
+    db.session.flush()
+    statuses = ['new', 'contacted', 'converted', 'qualified', 'lost']
+    for number in range(10):
+        agent = agents[number % 2]
+        lead = Lead(name=f'Lead {number}', source='instagram', status=statuses[number % len(statuses)],
+                    priority='high' if number % 3 == 0 else 'medium', assigned_agent_id=agent.id,
+                    created_at=now - timedelta(hours=number + 2),
+                    next_follow_up_at=now - timedelta(hours=1) if number % 4 == 0 else None)
+        db.session.add(lead)
+        db.session.flush()
+        db.session.add_all([
+            Interaction(lead_id=lead.id, agent_id=agent.id, type='message', direction='outbound',
+                        created_at=lead.created_at + timedelta(minutes=30)),
+            Interaction(lead_id=lead.id, agent_id=agent.id, type='viewing', direction='outbound',
+                        scheduled_at=now.replace(hour=23, minute=0, second=0, microsecond=0),
+                        created_at=now - timedelta(minutes=5)),
+        ])
+    db.session.commit()
+    return [agent.id for agent in agents]
+
+def test_bulk_metrics_match_the_per_agent_endpoints(client, team):
+    bulk = client.get('/api/agents/performance?fresh=true').get_json()['agents']
+
+    assert [metrics['agent']['id'] for metrics in bulk] == team
+    for metrics in bulk:
+        agent_id = metrics['agent']['id']
+        performance = client.get(f'/api/agents/{agent_id}/performance').get_json()
+        workload = client.get(f'/api/agents/{agent_id}/workload').get_json()
+        assert metrics['performance'] == performance['performance']
+        assert metrics['workload'] == workload['workload']
+        assert metrics['agent'] == performance['agent']
+
+def test_metrics_are_counted_per_agent(client, team):
+    first, _, idle = client.get('/api/agents/performance?fresh=true').get_json()['agents']
+
+    assert first['performance']['leads_by_status'] == {'new': 1, 'converted': 1, 'lost': 1, 'contacted': 1,
+                                                         'qualified': 1}
+    assert first['performance']['interactions'] == 10
+    assert first['performance']['avg_response_time_minutes'] == pytest.approx(
+        (5 * 30 + sum((number + 2) * 60 - 5 for number in range(0, 10, 2))) / 10, abs=0.1)
+    assert first['workload']['active_leads'] == 3
+    assert first['workload']['scheduled_today'] == 5
+    assert first['workload']['overdue_followups'] == 2
+    assert first['workload']['can_take_more_leads'] is True
+    assert idle['performance']['leads_by_status'] == {}
+    assert idle['workload']['capacity_percentage'] == 0
+
+def test_query_count_does_not_grow_with_agents(client, team, count_queries):
+    client.get('/api/agents/performance?fresh=true')
+    three_agents = len(count_queries)
+
+    db.session.add_all([Agent(name=f'Extra {number}', email=f'extra{number}@example.com') for number in range(5)])
+    db.session.commit()
+    count_queries.statements.clear()
+    client.get('/api/agents/performance?fresh=true')
+
+    assert len(count_queries) == three_agents <= 5
+
+def test_results_are_cached_per_period_unless_fresh(client, team, count_queries):
+    client.get('/api/agents/performance')
+    count_queries.statements.clear()
+
+    client.get('/api/agents/performance')
+    assert len(count_queries) == 0
+
+    client.get('/api/agents/performance?days=7')
+    client.get('/api/agents/performance?fresh=true')
+    assert len(count_queries) > 0
+
+def test_cached_periods_are_bounded(client, team, monkeypatch):
+    monkeypatch.setattr(agent_metrics, 'AGENT_METRICS_CACHE_SIZE', 2)
+
+    for days in (7, 30, 7, 90):
+        client.get(f'/api/agents/performance?days={days}')
+
+    assert list(agent_metrics._cache) == [7, 90]
@@ -0,0 +1,64 @@
+import pytest
+from src.models.lead import db, Agent, Lead
+from src.services.agent_routing import routing_table
+
+@pytest.fixture
+def agents(app):
+    agents = [
+        Agent(name='Central', email='central@example.com', specialization_areas=['Central'], max_leads=2),
+        Agent(name='Kowloon', email='kowloon@example.com', specialization_areas=['Mong Kok'],
+              specialization_types=['studio'], max_leads=5)
+    ]
+    db.session.add_all(agents)
+    db.session.commit()
+    return agents
+
+def counters():
+    return {entry.name: (entry.assigned_leads, entry.active_leads) for entry in routing_table.entries().values()}
+
+def test_best_agent_prefers_specialization_then_capacity(agents):
+    assert routing_table.find_best_agent(Lead(preferred_areas=['Central'])).name == 'Central'
+    assert routing_table.find_best_agent(Lead(property_type='studio')).name == 'Kowloon'
+
+    db.session.add_all([Lead(source='instagram', assigned_agent_id=agents[0].id) for _ in range(2)])
+    db.session.commit()
+    assert routing_table.find_best_agent(Lead(preferred_areas=['Central'])).name == 'Kowloon'
+
+def test_counters_follow_flushed_lead_changes(agents, count_queries):
+    routing_table.entries()
+    count_queries.statements.clear()
+    lead = Lead(source='instagram', assigned_agent_id=agents[0].id)
+    db.session.add(lead)
+    db.session.commit()
+    assert counters() == {'Central': (1, 1), 'Kowloon': (0, 0)}
+
+    lead = db.session.get(Lead, lead.id)
+    lead.assigned_agent_id = agents[1].id
+    lead.status = 'converted'
+    db.session.commit()
+    assert counters() == {'Central': (0, 0), 'Kowloon': (1, 0)}
+
+    db.session.delete(lead)
+    db.session.commit()
+    assert counters() == {'Central': (0, 0), 'Kowloon': (0, 0)}
+    # Kept current in memory: nothing was rebuilt from the database
+    assert not any('GROUP BY leads.assigned_agent_id' in statement for statement in count_queries.statements)
+
+def test_agent_changes_and_rollbacks_rebuild_the_table(agents):
+    routing_table.entries()
+    agents[0].is_active = False
+    db.session.commit()
+    assert routing_table.find_best_agent(Lead(preferred_areas=['Central'])).name == 'Kowloon'
+
+    db.session.add(Lead(source='instagram', assigned_agent_id=agents[1].id))
+    db.session.flush()
+    db.session.rollback()
+    assert counters() == {'Central': (0, 0), 'Kowloon': (0, 0)}
+
+def test_plan_assignments_respects_capacity_without_touching_the_table(agents):
+    plan = routing_table.plan_assignments([(lead_id, ['Central'], None, 'new') for lead_id in range(4)])
+
+    assert [(lead_id, agent.name) for lead_id, agent in plan] == [
+        (0, 'Central'), (1, 'Central'), (2, 'Kowloon'), (3, 'Kowloon')
+    ]
+    assert counters() == {'Central': (0, 0), 'Kowloon': (0, 0)}
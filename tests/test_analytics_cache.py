@@ -0,0 +1,79 @@
+import pytest
+from src.models.lead import db, Agent, Lead, Property
+from src.services.analytics_cache import ResponseCache, analytics_cache
+
+@pytest.fixture
+def agent(app):
+    agent = Agent(name='Chan', email='chan@example.com')
+    db.session.add(agent)
+    db.session.commit()
+    return agent
+
+def agent_names(client):
+    return [agent['name'] for agent in client.get('/api/analytics/agent-comparison').get_json()['agent_comparison']]
+
+def test_repeated_requests_are_served_from_the_cache(client, agent, count_queries):
+    before = analytics_cache.stats()
+    first = client.get('/api/analytics/funnel?days=7')
+    count_queries.statements.clear()
+    second = client.get('/api/analytics/funnel?days=7')
+
+    assert second.get_data() == first.get_data()
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert len(count_queries) == 0
+    stats = client.get('/api/analytics/cache/stats').get_json()['cache']
+    assert (stats['hits'] - before['hits'], stats['misses'] - before['misses']) == (1, 1)
+    assert stats['keys']['/api/analytics/funnel?days=7']['hits'] >= 1
+
+def test_matching_etag_gets_304(client, agent):
+    not_modified = analytics_cache.stats()['not_modified']
+    etag = client.get('/api/analytics/funnel').headers['ETag']
+
+    response = client.get('/api/analytics/funnel', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert analytics_cache.stats()['not_modified'] == not_modified + 1
+
+def test_parameters_are_part_of_the_key(client, agent):
+    misses = analytics_cache.stats()['misses']
+    client.get('/api/analytics/funnel?days=7')
+    client.get('/api/analytics/funnel?days=30')
+
+    assert analytics_cache.stats()['misses'] == misses + 2
+
+def test_lead_writes_invalidate(client, agent):
+    before = client.get('/api/analytics/funnel').get_json()['funnel']['counts']['total_leads']
+    db.session.add(Lead(name='A', source='instagram'))
+    db.session.commit()
+
+    assert client.get('/api/analytics/funnel').get_json()['funnel']['counts']['total_leads'] == before + 1
+
+def test_agent_writes_invalidate(client, agent):
+    assert agent_names(client) == ['Chan']
+
+    agent.name = 'Chan Tai Man'
+    db.session.commit()
+
+    assert agent_names(client) == ['Chan Tai Man']
+
+def test_agent_list_and_property_writes_invalidate(client, agent):
+    db.session.add(Property(title='Flat', source='28hse', source_id='P1'))
+    db.session.commit()
+    version = analytics_cache.version
+
+    agent.languages = ['English']
+    db.session.commit()
+    assert analytics_cache.version == version + 1
+
+    Property.query.one().title = 'Sea view flat'
+    db.session.commit()
+    assert analytics_cache.version == version + 2
+
+def test_results_computed_before_a_write_are_not_stored():
+    cache = ResponseCache(ttl_seconds=60)
+    version = cache.version
+    cache.bump()
+
+    cache.put('/api/analytics/funnel?', version, b'{}', 0.01)
+
+    assert cache.get('/api/analytics/funnel?') is None
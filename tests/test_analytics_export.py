@@ -0,0 +1,83 @@
+import csv
+import io
+import json
+import pytest
+from src.models.lead import db, Agent, Interaction, Lead
+from src.services import analytics_export
+
+@pytest.fixture
+def leads(app):
+    agent = Agent(name='Chan', email='chan@example.com', languages=['English'])
+    db.session.add(agent)
+    db.session.flush()
+    leads = [Lead(name=f'Lead {number}', source='instagram', assigned_agent_id=agent.id if number % 2 else None,
+                  tags=['vip', 'investor'] if number == 0 else [], score=number)
+             for number in range(5)]
+    db.session.add_all(leads)
+    db.session.flush()
+    db.session.add(Interaction(lead_id=leads[0].id, type='message', direction='inbound', message='Hi'))
+    db.session.commit()
+    return leads
+
+def export(client, query):
+    response = client.get(f'/api/analytics/export?{query}')
+    assert response.status_code == 200
+    return response
+
+def test_csv_has_a_header_and_joined_list_fields(client, leads, monkeypatch):
+    monkeypatch.setattr(analytics_export, 'EXPORT_BATCH_SIZE', 2)
+
+    response = export(client, 'format=csv')
+
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'] == 'attachment; filename=leads-30d.csv'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [row['name'] for row in rows] == [f'Lead {number}' for number in range(5)]
+    assert rows[0]['tags'] == 'vip;investor'
+    assert rows[1]['assigned_agent_name'] == 'Chan'
+    assert list(rows[0]) == analytics_export.export_field_names('leads')
+
+def test_ndjson_streams_one_object_per_line(client, leads):
+    response = export(client, 'format=ndjson&dataset=interactions')
+
+    assert response.is_streamed
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(lines) == 1
+    assert (lines[0]['lead_id'], lines[0]['message']) == (leads[0].id, 'Hi')
+
+def test_batches_fetch_list_fields_once_each(app, leads, count_queries):
+    start_date = leads[0].created_at
+    count_queries.statements.clear()
+
+    batches = list(analytics_export.iter_export_batches('leads', start_date, batch_size=2))
+
+    assert [len(rows) for rows in batches] == [2, 2, 1]
+    assert sum('lead_list_values' in statement for statement in count_queries.statements) == 3
+
+@pytest.mark.parametrize('file_format', ['parquet', 'arrow'])
+def test_arrow_formats_round_trip(client, leads, file_format):
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    data = export(client, f'format={file_format}&dataset=agents').get_data()
+
+    if file_format == 'parquet':
+        table = pyarrow.parquet.read_table(pyarrow.BufferReader(data))
+    else:
+        table = pyarrow.ipc.open_stream(data).read_all()
+    assert table.schema == analytics_export.arrow_schema('agents')
+    assert table.to_pylist()[0]['languages'] == ['English']
+    assert table.column('name').to_pylist() == ['Chan']
+
+@pytest.mark.parametrize('query', ['format=xml', 'format=csv&dataset=properties'])
+def test_unknown_formats_and_datasets_are_rejected(client, query):
+    assert client.get(f'/api/analytics/export?{query}').status_code == 400
+
+def test_default_export_is_one_json_document(client, leads):
+    data = export(client, '').get_json()
+
+    assert data['success'] is True
+    assert len(data['export_data']['leads']) == 5
+    assert data['export_data']['leads'][0]['tags'] == ['vip', 'investor']
+    assert [agent['name'] for agent in data['export_data']['agents']] == ['Chan']
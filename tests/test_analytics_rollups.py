@@ -0,0 +1,185 @@
+from datetime import datetime, timedelta
+from src.models.lead import db, Agent, DailyInteractionRollup, DailyLeadRollup, Interaction, Lead, LeadCountRollup
+from src.services.analytics_rollups import rebuild_rollups
+
+def lead_rollups():
+    return {(row.source, row.agent_id, row.status):
+            (row.created, row.entered, row.exited, row.status_entered, row.score_total, row.high_priority)
+            for row in DailyLeadRollup.query}
+
+def lead_counts():
+    return {(row.source, row.agent_id, row.status): row.leads for row in LeadCountRollup.query if row.leads}
+
+def test_created_leads_are_counted_once(app):
+    db.session.add_all([Lead(name='A', source='instagram', score=40, priority='high'),
+                        Lead(name='B', source='instagram', score=20)])
+    db.session.commit()
+
+    assert lead_rollups() == {('instagram', 0, 'new'): (2, 2, 0, 2, 60, 1)}
+    assert lead_counts() == {('instagram', 0, 'new'): 2}
+    assert DailyLeadRollup.query.one().day == datetime.utcnow().date()
+
+def test_moves_update_both_keys_and_the_current_counts(app):
+    agent = Agent(name='Chan', email='chan@example.com')
+    lead = Lead(name='A', source='instagram')
+    db.session.add_all([agent, lead])
+    db.session.commit()
+    agent_id = agent.id
+
+    lead.status = 'contacted'
+    lead.assigned_agent_id = agent_id
+    db.session.commit()
+    # Assigned on an expired instance, so the old key has to be read back before the flush
+    db.session.expire_all()
+    db.session.get(Lead, lead.id).assigned_agent_id = None
+    db.session.commit()
+
+    assert lead_rollups() == {
+        ('instagram', 0, 'new'): (1, 1, 1, 1, 0, 0),
+        ('instagram', agent_id, 'contacted'): (0, 1, 1, 1, 0, 0),
+        ('instagram', 0, 'contacted'): (0, 1, 0, 0, 0, 0),
+    }
+    assert lead_counts() == {('instagram', 0, 'contacted'): 1}
+
+    db.session.delete(db.session.get(Lead, lead.id))
+    db.session.commit()
+    assert lead_counts() == {}
+
+def test_closed_days_are_not_touched(app):
+    yesterday = datetime.utcnow().date() - timedelta(days=1)
+    db.session.add(DailyLeadRollup(day=yesterday, source='instagram', agent_id=0, status='new',
+                                   created=1, entered=1, exited=0, status_entered=1, score_total=0,
+                                   high_priority=0))
+    lead = Lead(name='A', source='instagram')
+    db.session.add(lead)
+    db.session.commit()
+
+    lead.status = 'lost'
+    db.session.commit()
+
+    closed = DailyLeadRollup.query.filter_by(day=yesterday).one()
+    assert (closed.created, closed.entered, closed.exited) == (1, 1, 0)
+
+def test_outbound_interactions_record_response_days(app):
+    created_at = datetime.utcnow() - timedelta(hours=12)
+    lead = Lead(name='A', source='instagram', created_at=created_at)
+    db.session.add(lead)
+    db.session.flush()
+    db.session.add_all([Interaction(lead_id=lead.id, type='message', direction='inbound'),
+                        Interaction(lead_id=lead.id, type='message', direction='outbound',
+                                    created_at=created_at + timedelta(hours=6))])
+    db.session.commit()
+
+    rows = {row.direction: (row.interactions, row.response_days) for row in DailyInteractionRollup.query}
+    assert rows == {'inbound': (1, 0), 'outbound': (1, 0.25)}
+
+def test_bulk_ingest_writes_rollups_like_the_flush_hooks(client):
+    client.post('/api/leads/bulk', json=[{'instagram_handle': 'chan', 'message': 'Hi'},
+                                         {'instagram_handle': 'chan', 'message': 'Again'},
+                                         {'whatsapp_number': '85291234567', 'message': 'Hello'}])
+
+    assert lead_counts() == {('instagram', 0, 'new'): 1, ('whatsapp', 0, 'new'): 1}
+    assert sum(row.interactions for row in DailyInteractionRollup.query) == 3
+
+def test_rebuild_matches_incremental_counts(app):
+    agent = Agent(name='Chan', email='chan@example.com')
+    leads = [Lead(name=str(number), source='instagram' if number % 2 else 'whatsapp') for number in range(6)]
+    db.session.add(agent)
+    db.session.add_all(leads)
+    db.session.commit()
+    leads[0].status = 'converted'
+    leads[1].assigned_agent_id = agent.id
+    db.session.delete(leads[2])
+    db.session.commit()
+    incremental = lead_counts()
+
+    rebuild_rollups()
+    db.session.commit()
+
+    assert lead_counts() == incremental
+    assert sum(row.created for row in DailyLeadRollup.query) == 5
+
+def test_trend_and_source_performance_read_the_rollups(client, count_queries):
+    db.session.add_all([Lead(name='A', source='instagram', score=40, priority='high'),
+                        Lead(name='B', source='whatsapp', score=20, status='converted')])
+    db.session.commit()
+    count_queries.statements.clear()
+
+    trend = client.get('/api/analytics/leads-trend').get_json()['trend_data']
+    sources = client.get('/api/analytics/source-performance').get_json()['source_performance']
+
+    today = str(datetime.utcnow().date())
+    assert trend == {'leads': [{'date': today, 'leads': 2}], 'conversions': [{'date': today, 'conversions': 1}]}
+    assert {source['source']: (source['total_leads'], source['converted_leads'], source['avg_score'],
+                                source['high_priority_leads']) for source in sources} == {
+        'instagram': (1, 0, 40, 1), 'whatsapp': (1, 1, 20, 0)
+    }
+    assert all('daily_lead_rollups' in statement or 'lead_count_rollups' in statement
+               for statement in count_queries.statements)
+
+def current_counts_match_a_rebuild():
+    incremental = {(row.source, row.agent_id, row.status): (row.leads, row.score_total)
+                   for row in LeadCountRollup.query if row.leads}
+    rebuild_rollups()
+    rebuilt = {(row.source, row.agent_id, row.status): (row.leads, row.score_total)
+               for row in LeadCountRollup.query if row.leads}
+    db.session.rollback()
+    return incremental == rebuilt
+
+def source_scores(client):
+    sources = client.get('/api/analytics/source-performance').get_json()['source_performance']
+    return {source['source']: source['avg_score'] for source in sources}
+
+def test_source_scores_follow_leads_created_and_updated_through_the_api(client):
+    first = client.post('/api/leads', json={'name': 'Chan', 'source': 'instagram', 'email': 'chan@example.com',
+                                            'budget_min': 10000, 'preferred_areas': ['Central']}).get_json()['lead']
+    second = client.post('/api/leads', json={'name': 'Lee', 'source': 'instagram'}).get_json()['lead']
+
+    assert first['score'] > 0
+    assert source_scores(client) == {'instagram': (first['score'] + second['score']) / 2}
+
+    updated = client.put(f"/api/leads/{second['id']}", json={'phone': '91234567', 'budget_max': 20000,
+                                                             'property_type': 'apartment'}).get_json()['lead']
+
+    assert updated['score'] > second['score']
+    assert source_scores(client) == {'instagram': (first['score'] + updated['score']) / 2}
+    assert current_counts_match_a_rebuild()
+
+def test_bulk_rescore_and_auto_assign_keep_score_totals(client):
+    now = datetime.utcnow()
+    db.session.add(Agent(name='Chan', email='chan@example.com', max_leads=10))
+    for days in (0, 3, 6, 10):
+        # Scored as if contacted just now, so the rescore has recency points to decay
+        lead = Lead(name=f'Lead {days}', source='instagram', last_contact_at=now - timedelta(days=days),
+                    recency_score=15)
+        lead.update_profile_score()
+        lead.refresh_score()
+        db.session.add(lead)
+    db.session.commit()
+    scores_before = source_scores(client)
+
+    assert client.post('/api/leads/rescore').get_json()['rescored_count'] == 4
+    db.session.expire_all()
+    assert source_scores(client)['instagram'] < scores_before['instagram']
+    assert current_counts_match_a_rebuild()
+
+    assert client.post('/api/agents/auto-assign').get_json()['assigned_count'] == 4
+    assert current_counts_match_a_rebuild()
+    assert source_scores(client) == {'instagram': sum(lead.score for lead in Lead.query) / 4}
+
+def test_dashboard_current_counts_come_from_the_running_totals(client):
+    statuses = ('new', 'contacted', 'qualified', 'viewing_scheduled', 'applied', 'converted', 'lost')
+    agent = Agent(name='Chan', email='chan@example.com')
+    db.session.add(agent)
+    db.session.flush()
+    db.session.add_all([Lead(name=f'{status} {number}', source='instagram', status=status,
+                             assigned_agent_id=agent.id if number else None)
+                        for status in statuses for number in range(2)])
+    db.session.commit()
+
+    metrics = client.get('/api/analytics/dashboard').get_json()['metrics']
+
+    assert (metrics['total_leads'], metrics['new_leads']) == (14, 14)
+    assert metrics['leads_by_status'] == {status: 2 for status in statuses}
+    assert metrics['agent_performance'] == [{'name': 'Chan', 'total_leads': 7, 'converted_leads': 1,
+                                             'conversion_rate': 1 / 7 * 100}]
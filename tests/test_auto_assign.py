@@ -0,0 +1,53 @@
+import pytest
+from src.models.lead import db, Agent, DailyLeadRollup, Interaction, Lead
+from src.services.agent_routing import routing_table
+
+@pytest.fixture
+def backlog(app):
+    agents = [Agent(name='Central', email='central@example.com', specialization_areas=['Central'], max_leads=3),
+              Agent(name='Kowloon', email='kowloon@example.com', max_leads=10)]
+    db.session.add_all(agents)
+    db.session.flush()
+    leads = [Lead(name=f'Lead {index}', source='instagram', preferred_areas=['Central'], profile_score=10,
+                  interaction_count=4, score=30)
+             for index in range(5)]
+    leads.append(Lead(name='Closed', source='instagram', status='converted'))
+    db.session.add_all(leads)
+    db.session.commit()
+    return agents, leads
+
+def agent_names():
+    return {lead.name: lead.assigned_agent.name if lead.assigned_agent else None for lead in Lead.query}
+
+def test_backlog_is_assigned_with_scores_interactions_and_rollups(client, backlog, count_queries):
+    response = client.post('/api/agents/auto-assign').get_json()
+
+    assert response['assigned_count'] == 5
+    assert agent_names() == {'Lead 0': 'Central', 'Lead 1': 'Central', 'Lead 2': 'Central',
+                             'Lead 3': 'Kowloon', 'Lead 4': 'Kowloon', 'Closed': None}
+    assert {(lead.interaction_count, lead.score) for lead in Lead.query.filter(Lead.assigned_agent_id.isnot(None))} == {
+        (5, 35)
+    }
+    assert Interaction.query.filter_by(type='assignment').count() == 5
+    entered = {row.agent_id: row.entered - row.exited for row in DailyLeadRollup.query if row.agent_id}
+    assert entered == {backlog[0][0].id: 3, backlog[0][1].id: 2}
+    assert sum(statement.startswith('UPDATE leads') for statement in count_queries.statements) == 2
+
+def test_leads_assigned_concurrently_are_left_alone(client, backlog, monkeypatch):
+    agents, leads = backlog
+    plan = routing_table.plan_assignments
+
+    def plan_then_assign_elsewhere(rows):
+        assignments = plan(rows)
+        # Another request assigns Lead 0 between the read and the write
+        db.session.execute(db.update(Lead).where(Lead.id == leads[0].id).values(assigned_agent_id=agents[1].id))
+        return assignments
+
+    monkeypatch.setattr(routing_table, 'plan_assignments', plan_then_assign_elsewhere)
+    routing_table.entries()
+
+    assert client.post('/api/agents/auto-assign').get_json()['assigned_count'] == 4
+    assert agent_names()['Lead 0'] == 'Kowloon'
+    assert Interaction.query.filter_by(lead_id=leads[0].id).count() == 0
+    assert db.session.get(Lead, leads[0].id).interaction_count == 4
+    assert routing_table.entries()[agents[0].id].assigned_leads == 2
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+from src.models.lead import db, Lead
+
+def add_leads(*rows):
+    """Add leads from (status, score) pairs, plus an old converted lead outside the funnel window"""
+    now = datetime.utcnow()
+    db.session.add_all([Lead(name=f'Lead {number}', source='instagram', status=status, score=score, created_at=now)
+                        for number, (status, score) in enumerate(rows)])
+    db.session.add(Lead(name='Old', source='instagram', status='converted', score=95,
+                        created_at=now - timedelta(days=90)))
+    db.session.commit()
+
+def test_funnel_counts_every_stage_in_one_query(client, count_queries):
+    add_leads(('new', 10), ('contacted', 30), ('qualified', 50), ('viewing_scheduled', 50),
+              ('applied', 70), ('converted', 90), ('lost', 5), ('new', 15))
+    count_queries.statements.clear()
+
+    funnel = client.get('/api/analytics/funnel').get_json()['funnel']
+
+    assert funnel['counts'] == {'total_leads': 8, 'contacted_leads': 5, 'qualified_leads': 4,
+                                'viewing_leads': 3, 'applied_leads': 2, 'converted_leads': 1}
+    assert funnel['rates']['contact_rate'] == 62.5
+    assert funnel['rates']['conversion_rate'] == 12.5
+    assert len(count_queries) == 1
+
+def test_empty_funnel_has_no_rates(client):
+    assert client.get('/api/analytics/funnel').get_json()['funnel'] == {
+        'counts': {'total_leads': 0, 'contacted_leads': 0, 'qualified_leads': 0, 'viewing_leads': 0,
+                   'applied_leads': 0, 'converted_leads': 0},
+        'rates': {}
+    }
+
+def test_lead_scoring_buckets_bands_and_statuses_in_one_query(client, count_queries):
+    add_leads(('new', 10), ('new', 20), ('contacted', 21), ('converted', 55), ('converted', 60),
+              ('lost', 61), ('converted', 100))
+    count_queries.statements.clear()
+
+    analysis = client.get('/api/analytics/lead-scoring').get_json()['scoring_analysis']
+
+    bands = {band['label']: (band['count'], band['converted']) for band in analysis['score_distribution']}
+    assert bands == {'Very Low': (2, 0), 'Low': (1, 0), 'Medium': (2, 2), 'High': (1, 0), 'Very High': (2, 2)}
+    assert analysis['score_distribution'][2]['conversion_rate'] == 100
+    assert analysis['status_scores'] == [
+        {'status': 'contacted', 'avg_score': 21, 'count': 1},
+        {'status': 'converted', 'avg_score': 77.5, 'count': 4},
+        {'status': 'lost', 'avg_score': 61, 'count': 1},
+        {'status': 'new', 'avg_score': 15, 'count': 2},
+    ]
+    assert len(count_queries) == 1
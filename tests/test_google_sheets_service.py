@@ -0,0 +1,99 @@
+import threading
+from src.services.google_sheets_service import GoogleSheetsService, LISTING_SHEETS
+
+class FakeWorksheet:
+    def __init__(self, values):
+        self.values = values
+        self.requests = []
+
+    def get_all_records(self):
+        self.requests.append('records')
+        header = self.values[0]
+        return [dict(zip(header, row)) for row in self.values[1:]]
+
+    def get_all_values(self):
+        self.requests.append('all')
+        return [list(row) for row in self.values]
+
+    def get_values(self, cell_range):
+        self.requests.append(cell_range)
+        start_row = int(cell_range.split(':')[0][1:])
+        return [list(row) for row in self.values[start_row - 1:]]
+
+class FakeClient:
+    def __init__(self, worksheets, failing=()):
+        self.worksheets = worksheets
+        self.failing = set(failing)
+
+    def open_by_url(self, url):
+        source = next(name for name, sheet_url in LISTING_SHEETS.items() if sheet_url == url)
+        if source in self.failing:
+            raise RuntimeError(f'{source} unavailable')
+        worksheet = self.worksheets[source]
+        return type('Spreadsheet', (), {'get_worksheet': lambda self, index: worksheet})()
+
+def make_service(monkeypatch, worksheets, failing=(), **kwargs):
+    monkeypatch.setattr(GoogleSheetsService, '_initialize_client', lambda self: None)
+    service = GoogleSheetsService(**kwargs)
+    service.client = FakeClient(worksheets, failing)
+    return service
+
+def listing_sheets():
+    return {
+        source: FakeWorksheet([['Title', 'Price'], [f'{source} flat', 5000000]])
+        for source in LISTING_SHEETS
+    }
+
+def test_fetch_all_sources_reports_errors_per_source(monkeypatch):
+    service = make_service(monkeypatch, listing_sheets(), failing=['centaline'])
+
+    results = service.fetch_all_sources()
+
+    assert results['errors'] == {'centaline': 'centaline unavailable'}
+    assert results['listings']['centaline'] == []
+    assert results['listings']['28hse'] == [{'Title': '28hse flat', 'Price': 5000000}]
+    assert service.fetch_all_sources(concurrent=False) == results
+
+def test_sources_are_fetched_concurrently(monkeypatch):
+    worksheets = listing_sheets()
+    barrier = threading.Barrier(len(LISTING_SHEETS), timeout=5)
+    for worksheet in worksheets.values():
+        fetch = worksheet.get_all_records
+        worksheet.get_all_records = lambda fetch=fetch: (barrier.wait(), fetch())[1]
+    service = make_service(monkeypatch, worksheets)
+
+    # Every fetch waits for the others, so this only returns if they overlap
+    assert not service.fetch_all_sources()['errors']
+
+def incremental_service(monkeypatch, values, full_resync_every=3):
+    worksheet = FakeWorksheet(values)
+    worksheets = dict(listing_sheets(), **{'28hse': worksheet})
+    service = make_service(monkeypatch, worksheets, incremental_sync=True, full_resync_every=full_resync_every)
+    return service, worksheet
+
+def test_sync_fetches_only_appended_rows(monkeypatch):
+    service, worksheet = incremental_service(monkeypatch, [['title', 'price'], ['A', '1']])
+
+    assert service.sync_source('28hse') == [{'title': 'A', 'price': 1}]
+    worksheet.values.append(['B', '2'])
+    assert service.sync_source('28hse') == [{'title': 'A', 'price': 1}, {'title': 'B', 'price': 2}]
+    assert worksheet.requests == ['all', 'A3:B']
+
+def test_periodic_full_resync_picks_up_edits_and_deletes(monkeypatch):
+    service, worksheet = incremental_service(monkeypatch, [['title'], ['A'], ['B']], full_resync_every=2)
+    service.sync_source('28hse')
+    version = service.sync_states['28hse'].version
+
+    worksheet.values = [['title'], ['A2']]
+    service.sync_source('28hse')
+    assert service.sync_source('28hse') == [{'title': 'A2'}]
+    assert worksheet.requests == ['all', 'A4:A', 'all']
+    assert service.sync_states['28hse'].deltas_since(version) == [{'upserted': {0: {'title': 'A2'}}, 'removed': [1]}]
+
+def test_empty_sheet_is_read_again_until_it_has_a_header(monkeypatch):
+    service, worksheet = incremental_service(monkeypatch, [])
+
+    assert service.sync_source('28hse') == []
+    worksheet.values = [['title'], ['A']]
+    assert service.sync_source('28hse') == [{'title': 'A'}]
+    assert worksheet.requests == ['all', 'all']
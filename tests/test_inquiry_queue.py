@@ -0,0 +1,106 @@
+import pytest
+from src.models.lead import Interaction, Lead
+from src.routes import leads as leads_routes
+from src.services import inquiry_queue
+from src.services.inquiry_queue import MAX_ATTEMPTS, InquiryQueue, InquiryWorkerPool
+
+@pytest.fixture
+def queue(tmp_path):
+    return InquiryQueue(str(tmp_path / 'queue.db'))
+
+def statuses(queue):
+    return dict(queue._connection().execute('SELECT idempotency_key, status FROM inquiry_queue'))
+
+def test_enqueue_deduplicates_on_the_idempotency_key(queue):
+    first = queue.enqueue('instagram', 'chan', {'message': 'Hi'}, 'm1')
+    again = queue.enqueue('instagram', 'chan', {'message': 'Hi'}, 'm1')
+
+    assert first == (again[0], False)
+    assert again[1] is True
+
+def test_claim_skips_senders_already_in_flight(queue):
+    queue.enqueue('instagram', 'chan', {'message': 'Hi'}, 'm1')
+    queue.enqueue('instagram', 'chan', {'message': 'Again'}, 'm2')
+    queue.enqueue('instagram', 'lee', {'message': 'Hi'}, 'm3')
+
+    assert [entry['idempotency_key'] for entry in queue.claim(1)] == ['m1']
+    assert [entry['idempotency_key'] for entry in queue.claim(10)] == ['m3']
+    assert queue.claim(10) == []
+
+def test_failed_entries_are_retried_until_max_attempts(queue):
+    queue.enqueue('instagram', 'chan', {'message': 'Hi'}, 'm1')
+
+    for _ in range(MAX_ATTEMPTS):
+        entry, = queue.claim(10)
+        queue.fail({entry['id']: 'database is locked'})
+
+    assert statuses(queue) == {'m1': 'failed'}
+    assert queue.claim(10) == []
+
+def test_batch_is_applied_and_invalid_payloads_are_parked(app, queue):
+    queue.enqueue('instagram', 'chan', {'instagram_handle': 'chan', 'message': 'Hi'}, 'm1')
+    queue.enqueue('instagram', 'lee', {'instagram_handle': 'lee', 'message': {'text': 'Hi'}}, 'm2')
+    pool = InquiryWorkerPool(app, queue)
+
+    pool.process_batch(queue.claim(10))
+
+    assert statuses(queue) == {'m1': 'done', 'm2': 'failed'}
+    assert Lead.query.one().instagram_handle == 'chan'
+    assert pool.stats()['processed'] == 1
+    assert pool.stats()['rejected'] == 1
+
+def test_a_failing_entry_does_not_fail_its_batch(app, queue, monkeypatch):
+    ingest = inquiry_queue.ingest_inquiries
+
+    def fail_on_boom(inquiries):
+        if any(inquiry['message'] == 'boom' for inquiry in inquiries):
+            raise RuntimeError('boom')
+        return ingest(inquiries)
+
+    monkeypatch.setattr(inquiry_queue, 'ingest_inquiries', fail_on_boom)
+    for key, sender, message in (('m1', 'chan', 'Hi'), ('m2', 'lee', 'boom'), ('m3', 'wong', 'Hello')):
+        queue.enqueue('instagram', sender, {'instagram_handle': sender, 'message': message}, key)
+    pool = InquiryWorkerPool(app, queue)
+
+    pool.process_batch(queue.claim(10))
+
+    assert statuses(queue) == {'m1': 'done', 'm2': 'pending', 'm3': 'done'}
+    assert {lead.instagram_handle for lead in Lead.query} == {'chan', 'wong'}
+    assert pool.stats()['batch_errors'] == 1
+    assert pool.stats()['processed'] == 2
+
+    for _ in range(MAX_ATTEMPTS - 1):
+        pool.process_batch(queue.claim(10))
+    assert statuses(queue)['m2'] == 'failed'
+    assert Interaction.query.count() == 2
+
+def test_webhook_is_processed_inline_by_default(client):
+    response = client.post('/api/leads/instagram-inquiry', json={'instagram_handle': 'chan', 'message': 'Hi'})
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['is_new_lead'] is True
+    assert body['lead']['instagram_handle'] == 'chan'
+
+def test_webhook_is_queued_when_async_is_enabled(client, queue, monkeypatch):
+    monkeypatch.setattr(leads_routes, 'ASYNC_INQUIRIES', True)
+    monkeypatch.setattr(leads_routes, 'get_inquiry_queue', lambda: queue)
+
+    response = client.post('/api/leads/instagram-inquiry', json={'instagram_handle': 'chan', 'message': 'Hi'},
+                           headers={'Idempotency-Key': 'm1'})
+
+    assert response.status_code == 202
+    assert response.get_json()['queued'] is True
+    assert statuses(queue) == {'m1': 'pending'}
+    assert Lead.query.count() == 0
+
+def test_worker_pool_starts_when_the_blueprint_is_registered(monkeypatch):
+    from flask import Flask
+    started = []
+    monkeypatch.setattr(leads_routes, 'ASYNC_INQUIRIES', True)
+    monkeypatch.setattr(leads_routes, 'start_inquiry_workers', started.append)
+
+    app = Flask(__name__)
+    app.register_blueprint(leads_routes.leads_bp, url_prefix='/api')
+
+    assert started == [app]
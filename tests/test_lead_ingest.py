@@ -0,0 +1,81 @@
+from datetime import datetime
+import pytest
+from src.models.lead import db, Interaction, Lead
+from src.services.lead_ingest import normalize_inquiry
+
+def bulk(client, inquiries):
+    response = client.post('/api/leads/bulk', json=inquiries)
+    assert response.status_code == 200
+    return response.get_json()
+
+def test_channel_is_inferred_and_aware_timestamps_become_naive_utc():
+    inquiry = normalize_inquiry({'whatsapp_number': 85291234567, 'message': 'Hi',
+                                 'received_at': '2026-03-01T18:30:00+08:00'})
+
+    assert inquiry['channel'] == 'whatsapp'
+    assert inquiry['sender'] == '85291234567'
+    assert inquiry['received_at'] == datetime(2026, 3, 1, 10, 30)
+    assert normalize_inquiry({'instagram_handle': 'a', 'message': 'Hi',
+                              'received_at': '2026-03-01T10:30:00Z'})['received_at'] == datetime(2026, 3, 1, 10, 30)
+
+@pytest.mark.parametrize('overrides, error', [
+    ({'message': {'text': 'Hi'}}, 'message must be a string'),
+    ({'name': ['Chan']}, 'name must be a string'),
+    ({'received_at': 1772361000}, 'received_at must be an ISO 8601 timestamp'),
+    ({'received_at': 'yesterday'}, 'received_at must be an ISO 8601 timestamp'),
+    ({'property_id': {'id': 1}}, 'property_id must be a string'),
+])
+def test_malformed_fields_are_rejected(overrides, error):
+    with pytest.raises(ValueError, match=error):
+        normalize_inquiry(dict({'instagram_handle': 'chan', 'message': 'Hi'}, **overrides))
+
+def test_bad_items_are_skipped_without_failing_the_batch(client):
+    result = bulk(client, [
+        {'instagram_handle': 'chan', 'message': 'Hi', 'property_id': 'P1'},
+        {'instagram_handle': 'lee', 'message': {'text': 'Hi'}},
+        {'whatsapp_number': '85291234567', 'message': 'Hello', 'name': 'Wong'},
+        {'message': 'Nobody'},
+    ])
+
+    assert result['accepted'] == 2
+    assert result['created_leads'] == 2
+    assert [error['index'] for error in result['errors']] == [1, 3]
+    assert {lead.instagram_handle or lead.whatsapp_number for lead in Lead.query} == {'chan', '85291234567'}
+
+def test_messages_from_one_sender_become_one_lead(client):
+    result = bulk(client, [
+        {'instagram_handle': 'chan', 'message': 'Hi', 'property_id': 'P1'},
+        {'instagram_handle': 'chan', 'message': 'Still there?', 'property_id': 'P2', 'name': 'Chan'},
+    ])
+
+    lead = Lead.query.one()
+    assert result['created_leads'] == 1
+    assert result['interactions'] == 2
+    assert lead.name == 'Chan'
+    assert list(lead.interested_properties) == ['P1', 'P2']
+    assert lead.interaction_count == 2
+    assert Interaction.query.filter_by(lead_id=lead.id).count() == 2
+
+def test_existing_sender_is_updated_with_an_aware_timestamp(client):
+    bulk(client, [{'instagram_handle': 'chan', 'message': 'Hi', 'property_id': 'P1'}])
+
+    result = bulk(client, [{'instagram_handle': 'chan', 'message': 'Any update?', 'property_id': 'P2',
+                            'received_at': '2030-01-01T08:00:00+08:00'}])
+
+    lead = Lead.query.one()
+    assert result['updated_leads'] == 1
+    assert list(lead.interested_properties) == ['P1', 'P2']
+    assert lead.last_contact_at == datetime(2030, 1, 1, 0, 0)
+    assert lead.interaction_count == 2
+
+def test_idempotency_keys_are_applied_once(client):
+    first = bulk(client, [{'instagram_handle': 'chan', 'message': 'Hi', 'idempotency_key': 'm1'},
+                          {'instagram_handle': 'chan', 'message': 'Hi', 'idempotency_key': 'm1'}])
+    again = bulk(client, [{'instagram_handle': 'chan', 'message': 'Hi', 'idempotency_key': 'm1'}])
+
+    lead_id = Lead.query.one().id
+    assert [result['duplicate'] for result in first['results']] == [False, True]
+    assert first['results'][1]['lead_id'] == lead_id
+    assert again['duplicates'] == 1
+    assert again['results'] == [{'index': 0, 'lead_id': lead_id, 'is_new_lead': False, 'duplicate': True}]
+    assert Interaction.query.count() == 1
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+from src.models.lead import db, Lead, compute_lead_score, recency_score, rescore_leads
+
+def test_score_components_combine_and_cap():
+    assert compute_lead_score(20, 2, 15) == 45
+    assert compute_lead_score(60, 9, 15) == 100
+    assert compute_lead_score(None, None, None) == 0
+
+def test_recency_points_decay_by_whole_days():
+    now = datetime(2026, 10, 17, 12)
+    assert [recency_score(now - timedelta(days=days), now) for days in (0, 1, 2, 3, 5, 7, 8)] == [
+        15, 15, 10, 10, 5, 5, 0
+    ]
+    assert recency_score(None) == 0
+
+def test_profile_and_interactions_update_the_score_without_queries(count_queries):
+    lead = Lead(name='A', phone='1', email='a@example.com', source='instagram',
+                budget_min=1, budget_max=2, interested_properties=['p1', 'p2'])
+    assert lead.update_score() == 29
+
+    lead.record_interaction()
+    assert (lead.interaction_count, lead.score) == (1, 34)
+    lead.record_interaction(contacted_at=datetime.utcnow())
+    assert (lead.interaction_count, lead.recency_score, lead.score) == (2, 15, 54)
+    assert len(count_queries) == 0
+
+def test_rescore_applies_recency_decay_in_bulk(app):
+    now = datetime.utcnow()
+    leads = [Lead(source='instagram', profile_score=20, interaction_count=1, recency_score=15,
+                  last_contact_at=now - timedelta(days=days)) for days in (0, 3, 10)]
+    leads.append(Lead(source='instagram', profile_score=20, interaction_count=1, recency_score=0))
+    for lead in leads:
+        lead.refresh_score()
+    db.session.add_all(leads)
+    db.session.commit()
+
+    assert rescore_leads(now) == 3
+    assert [(lead.recency_score, lead.score) for lead in Lead.query.order_by(Lead.id)] == [
+        (15, 40), (10, 35), (0, 25), (0, 25)
+    ]
+    assert all(lead.score == compute_lead_score(lead.profile_score, lead.interaction_count, lead.recency_score)
+               for lead in Lead.query)
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+import pytest
+from src.models.lead import db, Agent, Lead
+from src.routes import leads as leads_routes
+
+@pytest.fixture
+def leads(app):
+    agent = Agent(name='Agent', email='agent@example.com')
+    db.session.add(agent)
+    db.session.flush()
+    now = datetime.utcnow()
+    rows = [
+        Lead(name=f'Lead {index}', source='instagram' if index % 3 else 'whatsapp',
+             priority=('high', 'medium', 'low')[index % 3], created_at=now - timedelta(hours=index % 4),
+             assigned_agent_id=agent.id if index % 2 else None)
+        for index in range(25)
+    ]
+    db.session.add_all(rows)
+    db.session.commit()
+    return rows
+
+def walk(client, url):
+    """Follow next_cursor until the last page, returning every lead name in order"""
+    names, cursor = [], ''
+    while cursor is not None:
+        response = client.get(f'{url}&cursor={cursor}').get_json()
+        names += [lead['name'] for lead in response['leads']]
+        cursor = response['pagination']['next_cursor']
+    return names
+
+def test_cursor_pages_cover_every_lead_once_in_order(client, leads):
+    expected = [lead.name for lead in sorted(
+        leads, key=lambda lead: (lead.priority, lead.created_at, lead.id), reverse=True
+    )]
+
+    assert walk(client, '/api/leads?per_page=7') == expected
+    assert walk(client, '/api/leads?per_page=4&source=whatsapp') == [
+        name for name in expected if int(name.split()[1]) % 3 == 0
+    ]
+
+def test_agent_lead_list_uses_cursors(client, leads):
+    agent_id = leads[1].assigned_agent_id
+
+    assert sorted(walk(client, f'/api/agents/{agent_id}/leads?per_page=5')) == sorted(
+        lead.name for lead in leads if lead.assigned_agent_id
+    )
+
+def test_invalid_cursor_is_a_400(client, leads):
+    assert client.get('/api/leads?cursor=bogus').status_code == 400
+
+def test_total_is_counted_once_and_reused(client, leads):
+    first = client.get('/api/leads?cursor=&include_total=true&per_page=5').get_json()['pagination']
+    db.session.add(Lead(name='New', source='instagram'))
+    db.session.commit()
+    second = client.get('/api/leads?cursor=&include_total=true&per_page=5').get_json()['pagination']
+
+    assert first['total'] == second['total'] == 25
+
+def test_count_cache_keeps_only_recent_filter_combinations(client, leads, monkeypatch):
+    monkeypatch.setattr(leads_routes, 'LEAD_COUNT_CACHE_SIZE', 2)
+
+    for source in ('instagram', 'whatsapp', 'direct'):
+        client.get(f'/api/leads?cursor=&include_total=true&source={source}')
+
+    assert [key[4] for key in leads_routes._lead_count_cache] == ['whatsapp', 'direct']
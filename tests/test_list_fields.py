@@ -0,0 +1,31 @@
+import pytest
+from src.models.lead import db, Agent, Lead
+
+def test_list_fields_read_back_in_order_without_duplicates(app):
+    lead = Lead(name='Chan', source='instagram', tags=['vip', 'investor', 'vip'], preferred_areas='Central')
+    db.session.add(lead)
+    db.session.commit()
+    db.session.expire_all()
+
+    lead = db.session.get(Lead, lead.id)
+    assert lead.tags == ('vip', 'investor')
+    assert lead.preferred_areas == ('Central',)
+    assert lead.to_dict()['tags'] == ['vip', 'investor']
+
+def test_in_place_edits_fail_instead_of_being_lost(app):
+    lead = Lead(name='Chan', tags=['vip'])
+
+    with pytest.raises(AttributeError):
+        lead.tags.append('investor')
+
+    lead.tags = list(lead.tags) + ['investor']
+    assert lead.tags == ('vip', 'investor')
+
+def test_contains_filters_through_the_list_value_index(app):
+    db.session.add_all([Lead(name='Chan', source='instagram', tags=['vip']),
+                        Lead(name='Lee', source='whatsapp', tags=['investor']),
+                        Agent(name='Wong', email='wong@example.com', languages=['Cantonese', 'English'])])
+    db.session.commit()
+
+    assert [lead.name for lead in Lead.query.filter(Lead.tags.contains('vip'))] == ['Chan']
+    assert Agent.query.filter(Agent.languages.contains('English')).one().name == 'Wong'
@@ -0,0 +1,73 @@
+from src.services.listing_dedup import AREA_TOLERANCE, area_bucket, deduplicate_listings, normalize_text, parse_area
+
+def flat(floor='', price='', area='650呎', development='太古城 (第1期)', **fields):
+    return dict({'development': development, 'floor': floor, 'price': price, 'saleable_area': area}, **fields)
+
+def groups(result):
+    return sorted(sorted((variant['source'], variant.get('title')) for variant in listing['variants'])
+                  for listing in result)
+
+def test_parsing_and_normalization():
+    assert normalize_text('太古城 (第1期)') == normalize_text('太古城第１期') == '太古城第1期'
+    assert parse_area('1,200呎') == 1200.0
+    assert parse_area('n/a') is None
+
+def test_same_flat_on_two_sources_is_merged():
+    result = deduplicate_listings({
+        '28hse': [flat('12', '$8,000,000', title='A', bedrooms='3')],
+        'centaline': [flat('12', '$8,100,000', area='655 sq ft', title='B')]
+    })
+
+    assert len(result) == 1
+    assert result[0]['sources'] == ['28hse', 'centaline']
+    assert result[0]['title'] == 'A'
+
+def test_floor_or_price_must_actually_match():
+    result = deduplicate_listings({
+        '28hse': [flat('12', title='floor only')],
+        'centaline': [flat('', '$8,000,000', title='price only')]
+    })
+
+    assert len(result) == 2
+
+def test_disagreeing_floor_or_price_is_not_merged():
+    result = deduplicate_listings({
+        '28hse': [flat('12', '$8,000,000', title='A'), flat('10', '$8,000,000', title='B')],
+        'centaline': [flat('15', '$8,000,000', title='C'), flat('', '$9,000,000', title='D')]
+    })
+
+    assert groups(result) == [[('28hse', 'A')], [('28hse', 'B')], [('centaline', 'C')], [('centaline', 'D')]]
+
+def test_listings_from_one_source_are_never_merged():
+    result = deduplicate_listings({'28hse': [flat('12', '$8,000,000', title='A'), flat('12', '$8,000,000', title='B')]})
+
+    assert len(result) == 2
+
+def test_near_matches_do_not_chain_across_an_estate():
+    # B sits between A and C; without the one-listing-per-source rule all three would merge
+    result = deduplicate_listings({
+        '28hse': [flat('', '$8,000,000', title='A'), flat('', '$8,700,000', title='C')],
+        'centaline': [flat('', '$8,350,000', title='B')]
+    })
+
+    assert groups(result) == [[('28hse', 'A')], [('28hse', 'C'), ('centaline', 'B')]]
+
+def test_areas_straddling_a_bucket_boundary_are_compared():
+    low = 1000.0
+    high = low / (1 - AREA_TOLERANCE)
+    assert area_bucket(high) - area_bucket(low) <= 1
+
+    for area in (500.0, 777.7, 1000.0, 1234.5):
+        result = deduplicate_listings({
+            '28hse': [flat('3', area=area)],
+            'centaline': [flat('3', area=area / (1 - AREA_TOLERANCE) * 0.9999)]
+        })
+        assert len(result) == 1, area
+
+def test_listings_without_development_or_area_pass_through():
+    result = deduplicate_listings({
+        '28hse': [flat('3', development='', title='A')],
+        'centaline': [flat('3', area='', title='B')]
+    })
+
+    assert len(result) == 2
@@ -0,0 +1,52 @@
+from src.services.listing_search_index import ListingSearchIndex, tokenize
+
+def test_tokenize_uses_words_and_han_bigrams():
+    assert tokenize('Taikoo Shing 太古城 3房') == ['taikoo', 'shing', '太古', '古城', '3', '房']
+
+def test_query_must_match_every_term():
+    index = ListingSearchIndex()
+    index.add(1, 'taikoo shing sea view')
+    index.add(2, 'taikoo place office')
+
+    assert [doc_id for doc_id, _ in index.search('taikoo shing')] == [1]
+    assert index.search('taikoo mei foo') == []
+    assert index.search('!!!') is None
+
+def test_rarer_and_denser_matches_rank_first():
+    index = ListingSearchIndex()
+    index.add(1, 'sea view sea view')
+    index.add(2, 'sea view flat with a very long description of the garden and the club house')
+    index.add(3, 'garden flat')
+
+    assert [doc_id for doc_id, _ in index.search('sea view')] == [1, 2]
+
+def test_bigram_queries_do_not_match_single_characters():
+    index = ListingSearchIndex()
+    index.add(1, '太古城 海景')
+    index.add(2, '城市花園 古典')
+
+    # "太古" only matches where those characters are adjacent
+    assert [doc_id for doc_id, _ in index.search('太古')] == [1]
+    assert index._doc_lengths == {1: 3, 2: 4}
+
+def test_single_character_query_matches_through_bigrams():
+    index = ListingSearchIndex()
+    index.add(1, '太古城')
+    index.add(2, '城')
+    index.add(3, '美孚新邨')
+
+    assert sorted(doc_id for doc_id, _ in index.search('城')) == [1, 2]
+    index.remove(1)
+    assert [doc_id for doc_id, _ in index.search('城')] == [2]
+    assert index.search('古') == []
+
+def test_remove_and_replace_documents():
+    index = ListingSearchIndex()
+    index.add(1, 'mei foo')
+    index.add(1, 'tai koo')
+    index.remove(2)
+
+    assert index.search('mei') == []
+    assert [doc_id for doc_id, _ in index.search('koo')] == [1]
+    index.remove(1)
+    assert len(index) == 0 and index._total_length == 0
@@ -0,0 +1,95 @@
+from src.services.listing_store import ListingStore, extract_price, extract_room_count
+
+LISTINGS = [
+    {'title': 'Taikoo Shing sea view', 'price': '$8,800,000', 'rooms': '3房2廳', 'development': 'Taikoo Shing'},
+    {'title': 'Mei Foo family flat', 'price': '$5,200,000', 'rooms': '2', 'development': 'Mei Foo Sun Chuen'},
+    {'title': 'Studio near MTR, B&B', 'price': 'call', 'rooms': 'studio', 'development': ''},
+    {'title': 'Taikoo Shing high floor', 'price': 12000000, 'rooms': '3 bedrooms', 'development': 'Taikoo Shing'}
+]
+
+def make_store():
+    store = ListingStore()
+    store.load_source('28hse', LISTINGS[:2])
+    store.load_source('centaline', LISTINGS[2:])
+    return store
+
+def titles(results):
+    return [listing['title'] for listing in results]
+
+def test_extract_price_and_room_count():
+    assert extract_price('$18,000') == 18000
+    assert extract_price(7500000.0) == 7500000
+    assert extract_price('call') == 0
+    assert extract_room_count('3房2廳') == 3
+    assert extract_room_count('studio') is None
+
+def test_filters_use_parsed_fields():
+    store = make_store()
+
+    assert titles(store.search(min_price=5000000, max_price=9000000)) == [
+        'Taikoo Shing sea view', 'Mei Foo family flat'
+    ]
+    assert titles(store.search(development='taikoo', room_count=3)) == [
+        'Taikoo Shing sea view', 'Taikoo Shing high floor'
+    ]
+    assert titles(store.search(rooms='studio')) == ['Studio near MTR, B&B']
+    assert store.search(min_price=1, development='mei foo', rooms='3') == []
+
+def test_results_carry_their_source_in_source_order():
+    results = make_store().search()
+
+    assert [listing['source'] for listing in results] == ['28hse', '28hse', 'centaline', 'centaline']
+
+def test_reloading_and_row_updates_replace_rows():
+    store = make_store()
+    store.load_source('28hse', [LISTINGS[1]])
+    store.upsert_row('centaline', 0, dict(LISTINGS[2], price='$3,000,000'))
+    store.remove_row('centaline', 1)
+
+    assert len(store) == 2
+    assert titles(store.search(max_price=4000000)) == ['Studio near MTR, B&B']
+    assert store.search(development='taikoo') == []
+
+def test_query_without_search_terms_falls_back_to_substring():
+    store = make_store()
+
+    assert titles(store.search(query='!!!')) == []
+    assert titles(store.search(query='&')) == ['Studio near MTR, B&B']
+
+def test_cursor_resumes_after_last_result():
+    store = make_store()
+    first_page = list(store.iter_search(query='taikoo shing'))[:1]
+    cursor = first_page[0][0]
+
+    rest = [listing for _, listing in store.iter_search(query='taikoo shing', cursor=cursor)]
+
+    assert [first_page[0][1]] + rest == store.search(query='taikoo shing')
+    assert len(rest) == 1
+
+def test_ranked_cursor_is_rejected_after_the_listings_change():
+    store = make_store()
+    cursor, _ = next(store.iter_search(query='taikoo'))
+    ordered_cursor, _ = next(store.iter_search(development='taikoo'))
+    store.upsert_row('28hse', 5, {'title': 'Taikoo garden', 'price': '1'})
+
+    try:
+        store.iter_search(query='taikoo', cursor=cursor)
+    except ValueError as e:
+        assert 'restart' in str(e)
+    else:
+        raise AssertionError('expected a stale cursor error')
+    # Source/row order does not depend on the other listings
+    assert titles(l for _, l in store.iter_search(development='taikoo', cursor=ordered_cursor)) == [
+        'Taikoo Shing high floor'
+    ]
+
+def test_malformed_or_mismatched_cursor_is_rejected():
+    store = make_store()
+    ranked_cursor, _ = next(store.iter_search(query='taikoo'))
+
+    for cursor, kwargs in (('not-a-cursor', {}), (ranked_cursor, {'development': 'taikoo'})):
+        try:
+            list(store.iter_search(cursor=cursor, **kwargs))
+        except ValueError:
+            continue
+        raise AssertionError(f'expected {cursor!r} to be rejected')
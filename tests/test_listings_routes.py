@@ -0,0 +1,38 @@
+import json
+import pytest
+from flask import Flask
+from src.routes import listings
+from src.services.listing_store import ListingStore
+
+@pytest.fixture
+def client(monkeypatch):
+    store = ListingStore()
+    store.load_source('28hse', [
+        {'title': f'Flat {index}', 'price': 1000000 + index, 'development': 'Taikoo Shing'} for index in range(5)
+    ])
+    service = type('Service', (), {'iter_search_properties': lambda self, **kwargs: store.iter_search(**kwargs)})()
+    monkeypatch.setattr(listings, 'get_sheets_service', lambda: service)
+
+    app = Flask(__name__)
+    app.register_blueprint(listings.listings_bp)
+    return app.test_client()
+
+def test_json_pages_follow_next_cursor(client):
+    first = client.get('/api/listings/search?limit=3').get_json()
+    second = client.get(f"/api/listings/search?limit=3&cursor={first['next_cursor']}").get_json()
+
+    assert [listing['title'] for listing in first['listings']] == ['Flat 0', 'Flat 1', 'Flat 2']
+    assert [listing['title'] for listing in second['listings']] == ['Flat 3', 'Flat 4']
+    assert second['count'] == 2 and second['next_cursor'] is None
+
+def test_ndjson_ends_with_a_summary_line(client):
+    response = client.get('/api/listings/search?limit=2&format=ndjson&query=flat')
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.mimetype == 'application/x-ndjson'
+    assert [line['type'] for line in lines] == ['listing', 'listing', 'end']
+    assert lines[-1]['count'] == 2 and lines[-1]['next_cursor']
+
+def test_bad_cursor_or_format_is_a_400(client):
+    assert client.get('/api/listings/search?cursor=nope').status_code == 400
+    assert client.get('/api/listings/search?format=xml').status_code == 400
@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from src.models.lead import db, Property
+from src.models.migrations import MIGRATIONS, migrate_property_source_key, run_migrations
+
+def unique_keys(table):
+    inspector = inspect(db.session.connection())
+    return ([constraint['column_names'] for constraint in inspector.get_unique_constraints(table)] +
+            [index['column_names'] for index in inspector.get_indexes(table) if index['unique']])
+
+@pytest.fixture
+def legacy_properties(app):
+    """A properties table created before (source, source_id) was unique"""
+    Property.__table__.drop(db.engine)
+    legacy = Property.__table__.to_metadata(db.MetaData())
+    legacy.constraints = {constraint for constraint in legacy.constraints
+                          if constraint.name != 'uq_properties_source_source_id'}
+    legacy.create(db.engine)
+    yield
+    Property.__table__.drop(db.engine)
+    Property.__table__.create(db.engine)
+
+def test_migrations_run_on_a_fresh_schema(app):
+    assert run_migrations() == [name for name, _ in MIGRATIONS]
+    assert run_migrations() == []
+    assert unique_keys('properties').count(['source', 'source_id']) == 1
+
+def test_property_source_key_is_added_after_dropping_duplicates(app, legacy_properties):
+    for title, source, source_id in [('First', '28hse', 'P1'), ('Copy', '28hse', 'P1'), ('Other', 'squarefoot', 'P1'),
+                                     ('No id', '28hse', None), ('No id again', '28hse', None)]:
+        db.session.execute(text('INSERT INTO properties (title, source, source_id) VALUES (:title, :source, :id)'),
+                           {'title': title, 'source': source, 'id': source_id})
+
+    migrate_property_source_key()
+    db.session.commit()
+
+    assert sorted(title for title, in db.session.execute(text('SELECT title FROM properties'))) == [
+        'First', 'No id', 'No id again', 'Other'
+    ]
+    assert ['source', 'source_id'] in unique_keys('properties')
+    with pytest.raises(IntegrityError):
+        db.session.execute(text("INSERT INTO properties (title, source, source_id) VALUES ('Copy', '28hse', 'P1')"))
@@ -0,0 +1,45 @@
+import pytest
+from src.models.lead import db, Property
+
+@pytest.fixture
+def properties(app):
+    rows = [
+        Property(title=f'Flat {index}', source='28hse' if index % 2 else 'centaline', source_id=str(index),
+                 price=1000000 * index, total_views=index, is_active=index != 5)
+        for index in range(1, 8)
+    ]
+    rows[0].instagram_posts = '["post"]'
+    rows[1].enriched_images = '["image"]'
+    db.session.add_all(rows)
+    db.session.commit()
+    return rows
+
+def titles(response):
+    return [prop['title'] for prop in response.get_json()['data']['properties']]
+
+def test_page_listing_excludes_inactive_properties(client, properties):
+    data = client.get('/api/properties/?limit=4').get_json()['data']
+
+    assert [prop['title'] for prop in data['properties']] == ['Flat 7', 'Flat 6', 'Flat 4', 'Flat 3']
+    assert (data['total'], data['total_pages'], data['next_cursor']) == (6, 2, properties[2].id)
+
+def test_cursor_pages_continue_below_the_last_id(client, properties):
+    first = client.get('/api/properties/?limit=4&cursor=1000').get_json()['data']
+    second = client.get(f"/api/properties/?limit=4&cursor={first['next_cursor']}")
+
+    assert titles(second) == ['Flat 2', 'Flat 1']
+    assert second.get_json()['data']['next_cursor'] is None
+
+def test_filters(client, properties):
+    assert titles(client.get('/api/properties/?source=28hse')) == ['Flat 7', 'Flat 3', 'Flat 1']
+    assert titles(client.get('/api/properties/?status=published')) == ['Flat 1']
+    assert titles(client.get('/api/properties/?status=pending&search=flat')) == ['Flat 2']
+
+def test_detail_and_stats(client, properties):
+    assert client.get(f'/api/properties/{properties[1].id}').get_json()['data']['status'] == 'pending'
+    assert client.get('/api/properties/999').status_code == 404
+
+    stats = client.get('/api/properties/stats').get_json()['data']
+    assert (stats['total_properties'], stats['published'], stats['pending'], stats['draft']) == (6, 1, 1, 4)
+    assert stats['by_source'] == {'28hse': 3, 'centaline': 3}
+    assert [prop['title'] for prop in stats['top_performing']] == ['Flat 7', 'Flat 6', 'Flat 4', 'Flat 3', 'Flat 2']
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+from src.models.lead import db, Lead, Property
+
+def add_inquiries(counts, old=0):
+    """Leads inquiring about each source property id, count times; plus old ones outside the window"""
+    now = datetime.utcnow()
+    for property_id, (count, converted) in counts.items():
+        db.session.add_all([
+            Lead(name=f'{property_id} {number}', source='instagram', source_property_id=property_id,
+                 status='converted' if number < converted else 'new', score=40, created_at=now)
+            for number in range(count)
+        ])
+    db.session.add_all([Lead(name=f'Old {number}', source='instagram', source_property_id='P9',
+                             created_at=now - timedelta(days=90)) for number in range(old)])
+    db.session.commit()
+
+def test_top_properties_come_with_details_in_two_queries(client, count_queries):
+    db.session.add_all([Property(title='Taikoo Shing', source='28hse', source_id='P1', price=5000000, area='500'),
+                        Property(title='Duplicate', source='squarefoot', source_id='P1', price=1, area=1)])
+    add_inquiries({'P1': (3, 1), 'P2': (2, 0), 'P3': (1, 1)}, old=5)
+    count_queries.statements.clear()
+
+    rows = client.get('/api/analytics/property-performance').get_json()['property_performance']
+
+    assert len(count_queries) == 2
+    assert [(row['property_id'], row['inquiries'], row['conversions']) for row in rows] == [
+        ('P1', 3, 1), ('P2', 2, 0), ('P3', 1, 1)
+    ]
+    assert (rows[0]['title'], rows[0]['price'], rows[0]['area']) == ('Taikoo Shing', 5000000, '500')
+    assert (rows[1]['title'], rows[1]['price']) == ('Property P2', None)
+    assert rows[2]['conversion_rate'] == 100
+
+def test_limit_is_clamped(client):
+    add_inquiries({f'P{number}': (1, 0) for number in range(5)})
+
+    def count(query):
+        return len(client.get(f'/api/analytics/property-performance?{query}').get_json()['property_performance'])
+
+    assert count('limit=2') == 2
+    assert count('limit=0') == 1
+    assert count('limit=1000') == 5
+
+def test_no_inquiries_skips_the_property_lookup(client, count_queries):
+    assert client.get('/api/analytics/property-performance').get_json()['property_performance'] == []
+    assert len(count_queries) == 1
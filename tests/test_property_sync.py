@@ -0,0 +1,45 @@
+from src.models.lead import Property
+from src.services.property_sync import listing_source_id, search_local_properties, sync_listings_to_db
+
+def listing(title, price, **fields):
+    return dict({'title': title, 'price': price, 'development': 'Taikoo Shing', 'rooms': '3房'}, **fields)
+
+def test_sync_inserts_updates_and_deactivates(app):
+    sync_listings_to_db({'28hse': [
+        listing('A', '$8,000,000', listing_url='https://28hse/a'),
+        listing('B', '$9,000,000', listing_url='https://28hse/b')
+    ]})
+
+    stats = sync_listings_to_db({'28hse': [
+        listing('A', '$8,000,000', listing_url='https://28hse/a'),
+        listing('C', '$7,000,000', listing_url='https://28hse/b'),
+        listing('D', '$6,000,000', listing_url='https://28hse/d')
+    ]})
+
+    assert stats == {'28hse': {'inserted': 1, 'updated': 1, 'unchanged': 1, 'deactivated': 0}}
+    assert sync_listings_to_db({'28hse': [listing('D', '$6,000,000', listing_url='https://28hse/d')]})['28hse'] == {
+        'inserted': 0, 'updated': 0, 'unchanged': 1, 'deactivated': 2
+    }
+    assert Property.query.count() == 3
+    assert Property.query.filter_by(source_id='https://28hse/b').one().title == 'C'
+
+def test_sources_left_out_are_not_touched(app):
+    sync_listings_to_db({'28hse': [listing('A', 1)], 'centaline': [listing('B', 2)]})
+    sync_listings_to_db({'28hse': []})
+
+    assert [prop.source for prop in Property.query.filter_by(is_active=True)] == ['centaline']
+
+def test_rows_without_an_id_are_keyed_by_their_content():
+    assert listing_source_id({'id': 42}) == '42'
+    assert listing_source_id(listing('A', 1)) == listing_source_id(listing('A', 1))
+    assert listing_source_id(listing('A', 1)) != listing_source_id(listing('A', 2))
+
+def test_local_search_applies_the_listing_filters(app):
+    sync_listings_to_db({'28hse': [
+        listing('Sea view', '$8,000,000'),
+        listing('Garden', '$5,000,000', rooms='2', development='Mei Foo')
+    ]})
+
+    assert [prop['title'] for prop in search_local_properties(query='sea')] == ['Sea view']
+    assert [prop['title'] for prop in search_local_properties(max_price=6000000, rooms='2房')] == ['Garden']
+    assert search_local_properties(development='mei foo', min_price=6000000) == []
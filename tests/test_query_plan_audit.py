@@ -0,0 +1,9 @@
+from src.query_plan_audit import AUDITED_ENDPOINTS, audit_endpoints, seed_audit_data
+
+def test_audited_endpoints_answer_without_full_table_scans(app):
+    seed_audit_data()
+
+    problems = audit_endpoints(app)
+
+    assert problems == []
+    assert len(AUDITED_ENDPOINTS) >= 35
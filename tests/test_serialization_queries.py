@@ -0,0 +1,34 @@
+import pytest
+from src.models.lead import db, Agent, Interaction, Lead
+
+@pytest.fixture
+def crm(app):
+    agents = [Agent(name=f'Agent {index}', email=f'agent{index}@example.com',
+                    specialization_areas=['Central', 'Wan Chai'], languages=['en'])
+              for index in range(4)]
+    db.session.add_all(agents)
+    db.session.flush()
+    for index in range(40):
+        lead = Lead(name=f'Lead {index}', source='instagram', assigned_agent_id=agents[index % 4].id,
+                    tags=['vip'] if index % 2 else [], preferred_areas=['Central'])
+        db.session.add(lead)
+        db.session.flush()
+        db.session.add(Interaction(lead_id=lead.id, type='message', agent_id=lead.assigned_agent_id))
+    db.session.commit()
+    db.session.expunge_all()
+    return agents
+
+@pytest.mark.parametrize('url', ['/api/leads?per_page=40', '/api/leads?per_page=40&cursor=',
+                                 '/api/agents', '/api/leads/1/interactions'])
+def test_list_queries_do_not_grow_with_rows(client, crm, count_queries, url):
+    response = client.get(url)
+
+    assert response.status_code == 200
+    assert len(count_queries) <= 5, count_queries.statements
+
+def test_embedded_agents_carry_their_lead_counts(client, crm):
+    leads = client.get('/api/leads?per_page=40').get_json()['leads']
+
+    assert {lead['assigned_agent']['current_leads'] for lead in leads} == {10}
+    assert leads[0]['preferred_areas'] == ['Central']
+    assert {tuple(lead['tags']) for lead in leads} == {('vip',), ()}
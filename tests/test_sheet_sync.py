@@ -0,0 +1,40 @@
+from src.services.sheet_sync import SheetSyncState
+
+def test_full_download_records_only_changed_rows():
+    state = SheetSyncState()
+    state.apply_full(['title'], [{'title': 'A'}, {'title': 'B'}, {'title': 'C'}])
+
+    delta = state.apply_full(['title'], [{'title': 'A'}, {'title': 'B2'}])
+
+    assert delta == {'upserted': {1: {'title': 'B2'}}, 'removed': [2]}
+    assert state.version == 2
+    assert state.apply_full(['title'], [{'title': 'A'}, {'title': 'B2'}]) == {'upserted': {}, 'removed': []}
+    assert state.version == 2
+
+def test_overlapping_appends_are_applied_once():
+    state = SheetSyncState()
+    state.apply_full(['title'], [{'title': 'A'}])
+
+    # Two refreshes fetched from row 1; the second one to finish only adds what is new
+    state.apply_appended([{'title': 'B'}], start=1)
+    delta = state.apply_appended([{'title': 'B'}, {'title': 'C'}], start=1)
+
+    assert delta['upserted'] == {2: {'title': 'C'}}
+    assert state.rows == [{'title': 'A'}, {'title': 'B'}, {'title': 'C'}]
+
+def test_append_fetched_before_rows_were_removed_is_dropped():
+    state = SheetSyncState()
+    state.apply_full(['title'], [{'title': 'A'}, {'title': 'B'}])
+    state.apply_full(['title'], [{'title': 'A'}])
+
+    assert state.apply_appended([{'title': 'C'}], start=2) == {'upserted': {}, 'removed': []}
+    assert state.rows == [{'title': 'A'}]
+
+def test_consumers_too_far_behind_reload():
+    state = SheetSyncState()
+    for index in range(70):
+        state.apply_appended([{'title': str(index)}])
+
+    assert state.deltas_since(state.version) == []
+    assert len(state.deltas_since(state.version - 2)) == 2
+    assert state.deltas_since(0) is None
@@ -0,0 +1,87 @@
+import threading
+import time
+from src.services.snapshot_cache import SnapshotCache
+
+def test_cold_miss_loads_once_for_concurrent_callers():
+    cache = SnapshotCache(ttl_seconds=60)
+    calls = []
+    release = threading.Event()
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return ['listing']
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('28hse', loader))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [['listing']] * 8
+    assert cache.stats()['misses'] == 8
+
+def test_failed_load_is_raised_and_retried():
+    cache = SnapshotCache(ttl_seconds=60)
+
+    def failing():
+        raise RuntimeError('sheet unavailable')
+
+    try:
+        cache.get('28hse', failing)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError('expected the loader error')
+    assert cache.get('28hse', lambda: ['listing']) == ['listing']
+
+def test_stale_snapshot_is_served_while_refreshing():
+    cache = SnapshotCache(ttl_seconds=0)
+    cache.get('28hse', lambda: ['old'])
+    release = threading.Event()
+
+    def loader():
+        release.wait(5)
+        return ['new']
+
+    assert cache.get('28hse', loader) == ['old']
+    release.set()
+    for _ in range(100):
+        if cache.stats()['refreshes']:
+            break
+        time.sleep(0.01)
+    assert cache.peek('28hse') == ['new']
+
+def test_refresh_started_before_invalidate_is_dropped():
+    cache = SnapshotCache(ttl_seconds=0)
+    cache.get('28hse', lambda: ['old'])
+    release = threading.Event()
+    finished = threading.Event()
+
+    def loader():
+        release.wait(5)
+        finished.set()
+        return ['refreshed before invalidate']
+
+    cache.get('28hse', loader)
+    cache.invalidate('28hse')
+    release.set()
+    finished.wait(5)
+    time.sleep(0.05)
+
+    assert cache.peek('28hse') is None
+    assert cache.get('28hse', lambda: ['reloaded']) == ['reloaded']
+
+def test_cold_load_started_before_invalidate_is_not_stored():
+    cache = SnapshotCache(ttl_seconds=60)
+
+    def loader():
+        cache.invalidate()
+        return ['loaded before invalidate']
+
+    assert cache.get('28hse', loader) == ['loaded before invalidate']
+    assert cache.peek('28hse') is None